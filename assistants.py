@@ -1,22 +1,17 @@
 """Main page."""
-from streamlit.runtime.scriptrunner import get_script_run_ctx
 import streamlit as st
 
 import utilities.page_content as content
-from utilities.observability_helper import ObservabilityHelper
-from manager import Manager
+from utilities.run_poller import RunFailedError
+from utilities.session_helper import SessionHelper
 
 VERBOSE = True
 
-if 'session_id' not in st.session_state:
-    ctx = get_script_run_ctx()
-    st.session_state['session_id'] = ctx.session_id
-    st.session_state['manager'] = Manager(st.session_state['session_id'])
+SessionHelper.init_session("MAIN", VERBOSE)
 
-    st.session_state['logger'] = ObservabilityHelper()
-    st.session_state['logger'].log(f"MAIN - New session {st.session_state['session_id']}", verbose=VERBOSE)
-
-st.session_state['logger'].log(f"MAIN - Session id is {st.session_state['session_id']}", verbose=VERBOSE)
+st.session_state['logger'].log("MAIN - Session id is %s", VERBOSE, st.session_state['session_id'], level="DEBUG")
+# Endpoint status from the shared health cache. Does not block the render
+st.sidebar.caption(content.get_health_status_text(st.session_state['manager'].llm_helper.get_endpoint_health()))
 
 st.title(content.MAIN_TITLE_TEXT)
 
@@ -24,12 +19,12 @@ st.title(content.MAIN_TITLE_TEXT)
 assistant_data_list = st.session_state['manager'].get_assistant_data_tuple_list()
 # Since calls to OpenAI API is slow, make a single one with all assistant data
 openai_status = assistant_data_list is not None
-st.session_state['logger'].log(f"MAIN - OpenAI status is OK: {openai_status}", verbose=VERBOSE)
+st.session_state['logger'].log("MAIN - OpenAI status is OK: %s", VERBOSE, openai_status, level="DEBUG")
 if openai_status:
     
     if len(assistant_data_list) > 0:
         # GET ASSISTANT INFO
-        st.session_state['logger'].log(f"MAIN - Num of assistants is {len(assistant_data_list)}", verbose=VERBOSE)
+        st.session_state['logger'].log("MAIN - Num of assistants is %s", VERBOSE, len(assistant_data_list), level="DEBUG")
         assistant_ids, assistant_names, assistant_descriptions, assistant_created_at = zip(*assistant_data_list)
         #The user will select the assistant and from there we retrieve data
         assistant_name = st.selectbox(content.MAIN_ASSISTANT_SELECT_TEXT,  assistant_names)
@@ -37,14 +32,14 @@ if openai_status:
         assistant_description = assistant_descriptions[assistant_names.index(assistant_name)]
         assistant_created_at  = assistant_created_at[assistant_names.index(assistant_name)]
 
-        st.session_state['logger'].log(f"MAIN - Rendering assistant_id {assistant_id}", verbose=VERBOSE)
+        st.session_state['logger'].log("MAIN - Rendering assistant_id %s", VERBOSE, assistant_id, level="DEBUG")
     # DISPLAY - Assistant description
         st.write(assistant_description)
 
     # DISPLAY - Chat messages from history on app rerun
         for message in st.session_state['manager'].get_message_list(assistant_id):
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
+            with st.chat_message(message["message_role"]):
+                st.markdown(message["message_value"])
 
     # DISPLAY - GET FILE INFO
         # Code interpreter dependant
@@ -56,7 +51,7 @@ if openai_status:
                     st.write(content.MAIN_FILE_UPLOAD_OK)
                 else:
                     st.write(content.MAIN_FILE_UPLOAD_KO)
-        st.session_state['logger'].log(f"MAIN - Code Interpreter checked", verbose=VERBOSE)
+        st.session_state['logger'].log("MAIN - Code Interpreter checked", VERBOSE, level="DEBUG")
 
         conv_starters = st.session_state['manager'].llm_helper.get_assistant_conversation_starter_values(None, assistant_id=assistant_id)
     # DISPLAY - CONVERSATION STARTERS
@@ -64,19 +59,37 @@ if openai_status:
             st.markdown(f"<DIV style='text-align: center;'><H4>{content.MAIN_ASSISTANT_CONV_STARTERS}</H4></DIV>", unsafe_allow_html=True)
             for index, conv_starter in enumerate(conv_starters):
                 st.markdown(f"<DIV><H5> - {conv_starter}</H5></DIV>", unsafe_allow_html=True)
-        st.session_state['logger'].log(f"MAIN - Conv Starters checked", verbose=VERBOSE)
+        st.session_state['logger'].log("MAIN - Conv Starters checked", VERBOSE, level="DEBUG")
         st.divider() 
     # DISPLAY - USER PROMPT
-        st.session_state['logger'].log(f"MAIN - Awaiting Input", verbose=VERBOSE)
+        st.session_state['logger'].log("MAIN - Awaiting Input", VERBOSE, level="DEBUG")
         if user_prompt := st.chat_input(content.MAIN_ASSISTANT_CHAT_WELCOME):
             #We store if there has been user input for conv starters
             st.session_state['has_user_input'] = assistant_id
             # USER PROMPT
             st.chat_message("user").markdown(user_prompt)
             # THREAD COMPLETION
-            thread_run_messages = st.session_state['manager'].run_thread(user_prompt, assistant_id)
-            st.session_state['logger'].log(f"MAIN - Thread messages {thread_run_messages}", verbose=VERBOSE)
-            st.chat_message("assistant").markdown(thread_run_messages[0]['message_value'])
+            if st.session_state['manager'].is_streaming_enabled():
+                # Render tokens as they arrive
+                with st.chat_message("assistant"):
+                    response_placeholder = st.empty()
+                    response_text = ""
+                    try:
+                        for text_delta in st.session_state['manager'].run_thread_stream(user_prompt, assistant_id):
+                            response_text += text_delta
+                            response_placeholder.markdown(response_text)
+                    except RunFailedError as e:
+                        st.session_state['logger'].log(f"MAIN - {e}", VERBOSE, level="WARNING")
+                        st.error(content.get_run_failed_text(e))
+                st.session_state['logger'].log("MAIN - Streamed response %s", VERBOSE, response_text)
+            else:
+                try:
+                    thread_run_messages = st.session_state['manager'].run_thread(user_prompt, assistant_id)
+                    st.session_state['logger'].log("MAIN - Thread messages %s", VERBOSE, thread_run_messages)
+                    st.chat_message("assistant").markdown(thread_run_messages[0]['message_value'])
+                except RunFailedError as e:
+                    st.session_state['logger'].log(f"MAIN - {e}", VERBOSE, level="WARNING")
+                    st.chat_message("assistant").error(content.get_run_failed_text(e))
 
     # DISPLAY - NO ASSISTANTS CREATED
     else:
@@ -0,0 +1,201 @@
+"""Load generator simulating many concurrent Streamlit sessions.
+
+Each simulated user has its own Manager, as a browser session does in the app, and goes through
+conversations against the local stand-in servers: page renders, thread creation, messages,
+tool calls and file uploads, with think time between turns. All sessions share the process,
+like a single `streamlit run assistants.py`.
+    python -m benchmarks.load_test --sessions 50 --turns 5 --think-time 2 --output load.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# pylint: disable=wrong-import-position
+from benchmarks.run_benchmarks import BenchmarkEnvironment, BenchmarkUploadedFile, get_git_commit, summarize
+
+
+class SimulatedSession:
+    """A user chatting with the assistants in one browser session."""
+
+    def __init__(self, session_index, assistants, args, start_barrier):
+        self.session_index = session_index
+        self.assistants = assistants
+        self.args = args
+        self.start_barrier = start_barrier
+        self.random = random.Random(args.seed + session_index)
+
+        self.samples = {'turn': [], 'render': [], 'upload': []}
+        self.errors = []
+
+    def render(self, manager, assistant_id):
+        """Calls made by a rerun of the main page."""
+        manager.get_assistant_data_tuple_list()
+        manager.get_message_list(assistant_id)
+        manager.llm_helper.assistant_has_code_interpreter(assistant_id)
+        manager.llm_helper.get_assistant_conversation_starter_values(None, assistant_id=assistant_id)
+
+    def _timed(self, sample_name, function, *args):
+        start_time = time.perf_counter()
+        try:
+            function(*args)
+        except Exception as e:
+            self.errors.append(f"{sample_name}: {type(e).__name__}: {e}")
+            return
+        self.samples[sample_name].append(time.perf_counter() - start_time)
+
+    def run(self):
+        """Run the conversation of the session."""
+        from manager import Manager
+
+        self.start_barrier.wait()
+        # Sessions do not all arrive at once
+        time.sleep(self.random.uniform(0, self.args.ramp_up))
+
+        manager = Manager(f"load_session_{self.session_index}")
+        for turn_index in range(self.args.turns):
+            use_tools = self.random.random() < self.args.tool_call_ratio
+            assistant_id = self.assistants['tools' if use_tools else 'plain'].id
+
+            self._timed('render', self.render, manager, assistant_id)
+
+            if not use_tools and self.random.random() < self.args.upload_ratio:
+                file_data = os.urandom(int(self.args.upload_size_mb * 1024 * 1024))
+                uploaded_file = BenchmarkUploadedFile(f"load_{self.session_index}_{turn_index}.csv", file_data)
+                self._timed('upload', manager.upload_file_for_assistant_messages, assistant_id, uploaded_file, False)
+
+            self._timed('turn', manager.run_thread, f"Question {turn_index} of session {self.session_index}", assistant_id, False)
+            # Reply rendered after the turn
+            self._timed('render', self.render, manager, assistant_id)
+
+            if turn_index + 1 < self.args.turns:
+                time.sleep(self.random.expovariate(1 / self.args.think_time) if self.args.think_time > 0 else 0)
+
+
+def run_load_test(args):
+    """Run all sessions and collect the results."""
+    with BenchmarkEnvironment(args.run_mode, queue_time=args.queue_time, run_time=args.run_time, tool_latency=args.tool_latency) as environment:
+        environment.mock_server.default_latency = args.api_latency
+        environment.mock_server.error_rate = args.error_rate
+
+        from manager import Manager
+        setup_manager = Manager("load_setup")
+        assistants = {
+            'plain': environment.create_assistant(setup_manager, code_interpreter=True),
+            'tools': environment.create_assistant(setup_manager, tool_call_count=args.tool_calls)
+        }
+        environment.mock_server.reset_request_counts()
+
+        start_barrier = threading.Barrier(args.sessions + 1)
+        sessions = [SimulatedSession(session_index, assistants, args, start_barrier) for session_index in range(args.sessions)]
+        session_threads = [threading.Thread(target=session.run, name=f"load_session_{session.session_index}") for session in sessions]
+        for session_thread in session_threads:
+            session_thread.start()
+
+        start_barrier.wait()
+        start_time = time.perf_counter()
+        for session_thread in session_threads:
+            session_thread.join()
+        duration = time.perf_counter() - start_time
+
+        request_counts = environment.mock_server.get_request_counts()
+        tool_request_count = environment.fake_backend.request_count
+
+        from utilities.metrics_helper import MetricsHelper
+        component_stats = MetricsHelper.get_stats()
+
+    results = {'duration': duration}
+    for sample_name in ['turn', 'render', 'upload']:
+        samples = [sample for session in sessions for sample in session.samples[sample_name]]
+        results[sample_name] = summarize(samples) if len(samples) > 0 else None
+
+    turn_count = results['turn']['count'] if results['turn'] is not None else 0
+    errors = [error for session in sessions for error in session.errors]
+    results['throughput_turns_per_second'] = turn_count / duration
+    results['errors'] = len(errors)
+    results['error_samples'] = errors[:20]
+    results['api_calls_per_turn'] = sum(request_counts.values()) / max(1, turn_count)
+    results['api_calls_per_turn_by_operation'] = {operation: count / max(1, turn_count) for operation, count in sorted(request_counts.items())}
+    results['tool_calls_per_turn'] = tool_request_count / max(1, turn_count)
+    # Caches, connection pools and servers
+    results['component_stats'] = component_stats
+    # Linux reports kilobytes
+    results['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return results
+
+
+def format_stats(stats):
+    """Format the numbers of a stats dictionary on one line."""
+    return "  ".join(f"{stat_name}={value:.2f}" if isinstance(value, float) else f"{stat_name}={value}" for stat_name, value in stats.items())
+
+
+def print_report(args, results):
+    """Print a summary of the results."""
+    print(f"{args.sessions} sessions x {args.turns} turns in {results['duration']:.1f}s, {args.run_mode} mode")
+    print(f"Throughput: {results['throughput_turns_per_second']:.2f} turns/s, errors: {results['errors']}")
+    for sample_name in ['turn', 'render', 'upload']:
+        stats = results[sample_name]
+        if stats is not None:
+            print(f"{sample_name:8} n={stats['count']:5}  p50={stats['p50']:.3f}s  p95={stats['p95']:.3f}s  p99={stats['p99']:.3f}s  max={stats['max']:.3f}s")
+    print(f"API calls per turn: {results['api_calls_per_turn']:.1f}")
+    for operation, count in results['api_calls_per_turn_by_operation'].items():
+        print(f"    {operation:40} {count:.2f}")
+    for name, stats in results['component_stats'].items():
+        if stats is None:
+            print(f"{name}: disabled")
+        elif all(isinstance(key_stats, dict) for key_stats in stats.values()):
+            # Stats per key, e.g. per host
+            print(f"{name}:")
+            for key, key_stats in stats.items():
+                print(f"    {key:40} {format_stats(key_stats)}")
+        else:
+            print(f"{name:24} {format_stats(stats)}")
+    print(f"Max RSS: {results['max_rss_mb']:.0f} MB")
+
+
+def main():
+    """Run the load test and write the results."""
+    parser = argparse.ArgumentParser(description="Concurrent sessions against local stand-in servers.")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5, help="Turns per session.")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean seconds between turns of a session.")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Seconds over which sessions start.")
+    parser.add_argument("--run-mode", default="polling", choices=["polling", "streaming"])
+    parser.add_argument("--tool-call-ratio", type=float, default=0.5, help="Fraction of turns to the assistant with tools.")
+    parser.add_argument("--tool-calls", type=int, default=2, help="Tool calls per turn of the assistant with tools.")
+    parser.add_argument("--upload-ratio", type=float, default=0.1, help="Fraction of other turns uploading a file first.")
+    parser.add_argument("--upload-size-mb", type=float, default=1.0)
+    parser.add_argument("--queue-time", type=float, default=0.1, help="Seconds the stand-in keeps runs queued.")
+    parser.add_argument("--run-time", type=float, default=0.5, help="Seconds the stand-in takes per run phase.")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Seconds the stand-in takes per request.")
+    parser.add_argument("--tool-latency", type=float, default=0.05, help="Seconds the fake backend takes per call.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stand-in requests failing.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON file for the results.")
+    args = parser.parse_args()
+
+    results = run_load_test(args)
+    print_report(args, results)
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding="utf-8") as file:
+            json.dump({
+                'commit': get_git_commit(),
+                'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                'parameters': vars(args),
+                'results': results
+            }, file, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
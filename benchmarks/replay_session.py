@@ -0,0 +1,97 @@
+"""Replay a recorded session as a performance test of Manager.
+
+Record Azure OpenAI traffic of the app with AZURE_OPENAI_TRAFFIC_MODE=record, then replay its turns
+without network access:
+    python -m benchmarks.replay_session azure_openai_cassette.jsonl.gz --timing-scale 1
+
+Turns are the user messages of the cassette, run again with Manager.run_thread on their recorded
+threads. Tool calls use the OpenAPI specs of the working directory, if any.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# pylint: disable=wrong-import-position
+from benchmarks.run_benchmarks import summarize
+from utilities.traffic_recorder import Cassette
+
+
+def get_recorded_turns(cassette_path):
+    """Get (thread id, assistant id, prompt) of each recorded turn, in order."""
+    prompts = {}
+    turns = []
+    with Cassette.open(cassette_path, "r") as file:
+        for line in file:
+            if line.strip() == "":
+                continue
+            request_data = json.loads(line)['request']
+            path_parts = request_data['path'].strip("/").split("/")
+            # /openai/threads/{thread_id}/messages and /openai/threads/{thread_id}/runs
+            if request_data['method'] != "POST" or len(path_parts) != 4 or path_parts[1] != "threads":
+                continue
+            thread_id = path_parts[2]
+            if path_parts[3] == "messages" and request_data['body'].get('role', None) == "user":
+                prompts[thread_id] = request_data['body']['content']
+            elif path_parts[3] == "runs" and thread_id in prompts:
+                turns.append((thread_id, request_data['body']['assistant_id'], prompts.pop(thread_id)))
+
+    return turns
+
+
+def main():
+    """Replay the turns of a cassette and report their latency."""
+    parser = argparse.ArgumentParser(description="Replay a recorded session against Manager.")
+    parser.add_argument("cassette", help="Cassette recorded with AZURE_OPENAI_TRAFFIC_MODE=record.")
+    parser.add_argument("--timing-scale", type=float, default=1.0, help="1 replays recorded latencies, 0 answers immediately.")
+    parser.add_argument("--run-mode", default="polling", choices=["polling", "streaming"], help="Run mode the cassette was recorded with.")
+    args = parser.parse_args()
+
+    os.environ.update({
+        'AZURE_OPENAI_TRAFFIC_MODE': "replay",
+        'AZURE_OPENAI_CASSETTE_FILE': os.path.abspath(args.cassette),
+        'AZURE_OPENAI_REPLAY_TIMING_SCALE': str(args.timing_scale),
+        'AZURE_OPENAI_RUN_MODE': args.run_mode,
+        'RUN_PROFILING_ENABLED': "false"
+    })
+    # Not used to connect, but required by the client
+    os.environ.setdefault('AZURE_OPENAI_ENDPOINT', "http://replay.invalid")
+    os.environ.setdefault('AZURE_OPENAI_KEY', "replay")
+    os.environ.setdefault('AZURE_OPENAI_API_VERSION', "2024-02-15-preview")
+
+    from manager import Manager
+    from utilities.client_registry import LLMClientRegistry
+    from utilities.run_poller import RunFailedError
+
+    managers = {}
+    samples = []
+    for thread_id, assistant_id, prompt in get_recorded_turns(args.cassette):
+        # One session per recorded thread, resuming it without creating a new one
+        if thread_id not in managers:
+            managers[thread_id] = Manager(f"replay_{thread_id}")
+            managers[thread_id].thread_container[assistant_id] = {'thread_id': thread_id, 'files': set()}
+
+        start_time = time.perf_counter()
+        try:
+            managers[thread_id].run_thread(prompt, assistant_id, False)
+        except RunFailedError as e:
+            # Failed as recorded
+            print(e)
+        samples.append(time.perf_counter() - start_time)
+
+    if len(samples) == 0:
+        print("No turns recorded in the cassette")
+        return
+
+    stats = summarize(samples)
+    replay_stats = LLMClientRegistry.get_transport(next(iter(managers.values())).env_helper).get_stats()
+    print(f"{stats['count']} turns in {len(managers)} threads: mean={stats['mean']:.3f}s p50={stats['p50']:.3f}s p95={stats['p95']:.3f}s max={stats['max']:.3f}s")
+    print(f"Requests matched: {replay_stats['matched']}, repeated: {replay_stats['repeated']}, derived: {replay_stats['derived']}, not recorded: {replay_stats['unmatched']}")
+
+
+if __name__ == "__main__":
+    main()
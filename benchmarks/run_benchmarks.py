@@ -0,0 +1,318 @@
+"""Benchmarks of the main app paths against the local stand-in servers.
+
+Measures Manager.run_thread with 0, 1 or N tool calls, Azure OpenAI round trips per page render,
+OpenAPIHelper.call_function overhead and Manager.upload_file throughput. No network is used.
+Results are written as JSON, so runs of different commits can be compared:
+    python -m benchmarks.run_benchmarks --output baseline.json
+    python -m benchmarks.run_benchmarks --output current.json --compare baseline.json
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# pylint: disable=wrong-import-position
+from testing.fake_openapi_backend import FakeOpenAPIBackend
+from testing.mock_azure_openai import MockAzureOpenAIServer
+
+PAGES = ["assistants.py", "pages/01_Configure_your_Assistants.py"]
+
+
+class BenchmarkUploadedFile(io.BytesIO):
+    """In-memory file with the attributes of a Streamlit UploadedFile."""
+
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name    = name
+        self.file_id = name
+        self.size    = len(data)
+
+
+class BenchmarkEnvironment:
+    """Stand-in servers, environment variables and a scratch working directory for the app."""
+
+    ENV_VARIABLES = {
+        'AZURE_OPENAI_KEY': "benchmark",
+        'AZURE_OPENAI_API_VERSION': "2024-02-15-preview",
+        'AZURE_OPENAI_MODEL_DEPLOYMENT_NAME': "benchmark",
+        'LOG_LEVEL': "WARNING",
+        'METRICS_PORT': "0",
+        'METRICS_DUMP_FILE': "",
+        'RUN_PROFILING_ENABLED': "false"
+    }
+
+    def __init__(self, run_mode, queue_time=0.0, run_time=0.0, tool_latency=0.0):
+        self.mock_server  = MockAzureOpenAIServer(queue_time=queue_time, run_time=run_time)
+        self.fake_backend = FakeOpenAPIBackend(latency=tool_latency)
+        self.env_variables = dict(BenchmarkEnvironment.ENV_VARIABLES, AZURE_OPENAI_ENDPOINT=self.mock_server.url, AZURE_OPENAI_RUN_MODE=run_mode)
+
+        self.working_directory = tempfile.TemporaryDirectory(prefix="assistants_benchmark_")
+        self.previous_directory = None
+        self.previous_env_variables = {}
+
+    def __enter__(self):
+        self.mock_server.start()
+        self.fake_backend.start()
+
+        for variable_name, variable_value in self.env_variables.items():
+            self.previous_env_variables[variable_name] = os.environ.get(variable_name, None)
+            os.environ[variable_name] = variable_value
+
+        # The app reads .env and writes OpenAPI specs relative to the working directory
+        self.previous_directory = os.getcwd()
+        os.chdir(self.working_directory.name)
+        os.makedirs("assistant_data", exist_ok=True)
+
+        return self
+
+    def __exit__(self, *args):
+        os.chdir(self.previous_directory)
+        for variable_name, variable_value in self.previous_env_variables.items():
+            if variable_value is None:
+                os.environ.pop(variable_name, None)
+            else:
+                os.environ[variable_name] = variable_value
+
+        self.mock_server.stop()
+        self.fake_backend.stop()
+        from utilities.http_helper import HTTPHelper
+        HTTPHelper.close_all()
+        self.working_directory.cleanup()
+
+    def create_assistant(self, manager, tool_call_count=0, code_interpreter=False):
+        """Create an assistant with the fake backend spec, calling getItem tool_call_count times per run."""
+        from utilities.openapi_helper import OpenAPIHelper
+
+        openapi_spec = json.dumps(self.fake_backend.get_openapi_spec())
+        tools = [{"type": "function", "function": function_data} for function_data in OpenAPIHelper.extract_openai_functions_from_spec(openapi_spec)]
+        if code_interpreter:
+            tools.append({"type": "code_interpreter"})
+
+        assistant = manager.llm_helper._create_assistant(f"Benchmark {tool_call_count}", "Benchmark assistant", "Answer briefly.", tools)
+        OpenAPIHelper.save_openapi_spec(assistant.id, openapi_spec)
+        if tool_call_count > 0:
+            self.mock_server.set_tool_calls(assistant.id, [[{"name": "getItem", "arguments": {"itemId": str(index)}}
+                                                            for index in range(tool_call_count)]])
+
+        return assistant
+
+
+def _percentile(sorted_samples, percentile):
+    index = min(len(sorted_samples) - 1, max(0, round(percentile / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def summarize(samples, unit="s"):
+    """Summary statistics of samples."""
+    sorted_samples = sorted(samples)
+    return {
+        'unit': unit,
+        'count': len(samples),
+        'mean': sum(samples) / len(samples),
+        'min': sorted_samples[0],
+        'p50': _percentile(sorted_samples, 50),
+        'p95': _percentile(sorted_samples, 95),
+        'p99': _percentile(sorted_samples, 99),
+        'max': sorted_samples[-1]
+    }
+
+
+def benchmark_run_thread(environment, tool_call_count, iterations):
+    """End to end latency of a turn, and Azure OpenAI calls per turn."""
+    from manager import Manager
+
+    manager = Manager(f"benchmark_run_thread_{tool_call_count}")
+    assistant = environment.create_assistant(manager, tool_call_count)
+    # Warm up connections, caches and the thread
+    manager.run_thread("Warm up", assistant.id)
+
+    environment.mock_server.reset_request_counts()
+    samples = []
+    for index in range(iterations):
+        start_time = time.perf_counter()
+        manager.run_thread(f"Question {index}", assistant.id)
+        samples.append(time.perf_counter() - start_time)
+
+    result = summarize(samples)
+    result['api_calls_per_turn'] = sum(environment.mock_server.get_request_counts().values()) / iterations
+
+    return result
+
+
+def benchmark_page_renders(environment, iterations):
+    """Azure OpenAI calls and time per render of the pages, first render of a session and reruns."""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {page: {'skipped': "streamlit.testing is not available"} for page in PAGES}
+
+    from manager import Manager
+    from utilities.llm_helper import LLMHelper
+
+    manager = Manager("benchmark_page_setup")
+    environment.create_assistant(manager, code_interpreter=True)
+
+    results = {}
+    for page in PAGES:
+        LLMHelper.assistant_cache.clear()
+        LLMHelper.catalog_cache.clear()
+        app_test = AppTest.from_file(os.path.join(REPO_ROOT, page), default_timeout=60)
+
+        environment.mock_server.reset_request_counts()
+        start_time = time.perf_counter()
+        app_test.run()
+        first_render_time = time.perf_counter() - start_time
+        first_render_calls = environment.mock_server.get_request_counts()
+
+        environment.mock_server.reset_request_counts()
+        samples = []
+        for _ in range(iterations):
+            start_time = time.perf_counter()
+            app_test.run()
+            samples.append(time.perf_counter() - start_time)
+        rerun_calls = environment.mock_server.get_request_counts()
+
+        result = summarize(samples)
+        result['first_render_time'] = first_render_time
+        result['first_render_api_calls'] = sum(first_render_calls.values())
+        result['first_render_api_calls_by_operation'] = first_render_calls
+        result['api_calls_per_rerun'] = sum(rerun_calls.values()) / iterations
+        result['api_calls_per_rerun_by_operation'] = {operation: count / iterations for operation, count in rerun_calls.items()}
+        result['exceptions'] = [str(exception.value) for exception in app_test.exception]
+        results[page] = result
+
+    return results
+
+
+def benchmark_call_function(environment, iterations):
+    """Time of OpenAPIHelper.call_function against the same request made directly."""
+    from utilities.http_helper import HTTPHelper
+    from utilities.openapi_helper import OpenAPIHelper
+    from utilities.openapi_registry import CompiledOpenAPISpec
+
+    compiled_spec = CompiledOpenAPISpec(environment.fake_backend.get_openapi_spec())
+    function_args = json.dumps({"itemId": "1", "detail": "full"})
+    direct_url = environment.fake_backend.url + "/items/1?detail=full"
+    # Warm up connections
+    HTTPHelper.request('get', direct_url)
+    OpenAPIHelper.call_function("getItem", function_args, compiled_spec)
+
+    direct_samples, call_function_samples = [], []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        HTTPHelper.request('get', direct_url)
+        direct_samples.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        OpenAPIHelper.call_function("getItem", function_args, compiled_spec)
+        call_function_samples.append(time.perf_counter() - start_time)
+
+    result = summarize(call_function_samples)
+    result['direct_request'] = summarize(direct_samples)
+    result['overhead_mean'] = result['mean'] - result['direct_request']['mean']
+
+    return result
+
+
+def benchmark_upload_file(environment, size_mb, iterations):
+    """Throughput of Manager.upload_file in MB/s."""
+    from manager import Manager
+
+    manager = Manager("benchmark_upload")
+    file_data = os.urandom(int(size_mb * 1024 * 1024))
+
+    samples = []
+    for index in range(iterations):
+        # Distinct contents, the same content would be reused instead of uploaded
+        uploaded_file = BenchmarkUploadedFile(f"benchmark_{index}.bin", index.to_bytes(8, "big") + file_data[8:])
+        start_time = time.perf_counter()
+        manager.upload_file(uploaded_file)
+        samples.append(size_mb / (time.perf_counter() - start_time))
+
+    return summarize(samples, unit="MB/s")
+
+
+def get_git_commit():
+    """Commit of the tree benchmarked. None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, baseline_results, threshold):
+    """Print mean changes against a baseline. Return the names of benchmarks slower than the threshold."""
+    regressions = []
+    for benchmark_name, result in results['benchmarks'].items():
+        baseline_result = baseline_results['benchmarks'].get(benchmark_name, None)
+        if baseline_result is None or 'mean' not in result or 'mean' not in baseline_result:
+            continue
+
+        ratio = result['mean'] / baseline_result['mean'] if baseline_result['mean'] > 0 else float("inf")
+        # Higher throughput is better
+        is_regression = ratio < 1 / threshold if result['unit'] == "MB/s" else ratio > threshold
+        if is_regression:
+            regressions.append(benchmark_name)
+        print(f"{benchmark_name:55} {baseline_result['mean']:12.5f} -> {result['mean']:12.5f} {result['unit']:5} x{ratio:6.3f}{'  REGRESSION' if is_regression else ''}")
+
+    return regressions
+
+
+def main():
+    """Run the benchmarks and write the results."""
+    parser = argparse.ArgumentParser(description="Benchmarks against local stand-in servers.")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file for the results.")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run to compare with.")
+    parser.add_argument("--threshold", type=float, default=1.1, help="Slowdown ratio reported as a regression.")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--run-mode", default="polling", choices=["polling", "streaming"])
+    parser.add_argument("--tool-calls", default="0,1,4", help="Comma separated tool calls per turn.")
+    parser.add_argument("--upload-sizes-mb", default="1,10", help="Comma separated upload sizes in MB.")
+    parser.add_argument("--run-time", type=float, default=0.0, help="Seconds the stand-in takes per run phase.")
+    parser.add_argument("--tool-latency", type=float, default=0.0, help="Seconds the fake backend takes per call.")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    benchmarks = {}
+    with BenchmarkEnvironment(args.run_mode, run_time=args.run_time, tool_latency=args.tool_latency) as environment:
+        for tool_call_count in [int(value) for value in args.tool_calls.split(",")]:
+            benchmarks[f"run_thread.{args.run_mode}.tool_calls_{tool_call_count}"] = benchmark_run_thread(environment, tool_call_count, args.iterations)
+
+        for page, result in benchmark_page_renders(environment, args.iterations).items():
+            benchmarks[f"page_render.{page}"] = result
+
+        benchmarks["openapi.call_function"] = benchmark_call_function(environment, args.iterations * 10)
+
+        for size_mb in [float(value) for value in args.upload_sizes_mb.split(",")]:
+            benchmarks[f"upload_file.{size_mb:g}mb"] = benchmark_upload_file(environment, size_mb, max(1, args.iterations // 4))
+
+    results = {
+        'commit': get_git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'benchmarks': benchmarks
+    }
+    with open(output_path, 'w', encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output_path}")
+
+    if args.compare is not None:
+        with open(args.compare, 'r', encoding="utf-8") as file:
+            baseline_results = json.load(file)
+        if len(compare_results(results, baseline_results, args.threshold)) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,155 @@
-from dotenv import load_dotenv
-from openai import AzureOpenAI
-from pathlib import Path
+"""Bulk provisioning of an assistant with the files of a folder.
+
+Files are hashed, uploaded and attached concurrently, streamed from disk. Contents uploaded before
+are not sent again. Usage:
+    python create_assistant.py --data-folder assistant_data/ --workers 8
+    python create_assistant.py --reset        # Delete all assistants and files first
+"""
+import argparse
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+
+from utilities.client_registry import LLMClientRegistry
+from utilities.env_helper import EnvHelper
+from utilities.file_hash_index import FileHashIndex
+
+DEFAULT_API_VERSION = "2024-02-15-preview"
+TRANSIENT_ERRORS = (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError, openai.InternalServerError)
+
+
+def with_retries(function, retries, description):
+    """Call a function, retrying transient failures with exponential backoff and jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return function()
+        except TRANSIENT_ERRORS as e:
+            if attempt == retries:
+                raise
+            backoff_time = 0.5 * 2 ** attempt * random.uniform(0.5, 1.5)
+            print(f"{description} failed with {type(e).__name__}, retrying in {backoff_time:.1f}s")
+            time.sleep(backoff_time)
+
+
+def reset(llm_client, executor, retries):
+    """Delete all assistants and files, concurrently."""
+    assistant_ids = with_retries(lambda: [assistant.id for assistant in llm_client.beta.assistants.list(limit=100)], retries, "Listing assistants")
+    file_ids = with_retries(lambda: [file.id for file in llm_client.files.list()], retries, "Listing files")
+    print(f"Deleting {len(assistant_ids)} assistants and {len(file_ids)} files")
+
+    futures = [executor.submit(with_retries, lambda assistant_id=assistant_id: llm_client.beta.assistants.delete(assistant_id), retries,
+                               f"Deleting assistant {assistant_id}") for assistant_id in assistant_ids]
+    futures += [executor.submit(with_retries, lambda file_id=file_id: llm_client.files.delete(file_id), retries,
+                                f"Deleting file {file_id}") for file_id in file_ids]
+    for future in as_completed(futures):
+        try:
+            future.result()
+        except openai.NotFoundError:
+            pass
+
+
+def provision_file(llm_client, file_path, assistant_id, attached_file_ids, file_hash_index, scope, retries):
+    """Upload a file unless its content is already uploaded, and attach it. Return its timings."""
+    timings = {'file': os.path.basename(file_path), 'size': os.path.getsize(file_path), 'skipped': False}
+
+    start_time = time.perf_counter()
+    content_hash = FileHashIndex.hash_file(file_path)
+    timings['hash_time'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    file_id = file_hash_index.get(content_hash, scope)
+    if file_id is None:
+        def upload():
+            # Reopened on every attempt. The file is streamed, never loaded whole
+            with open(file_path, 'rb') as file:
+                return llm_client.files.create(file=file, purpose="assistants")
+        file_id = with_retries(upload, retries, f"Uploading {file_path}").id
+        file_hash_index.set(content_hash, file_id, timings['size'], scope)
+    else:
+        timings['skipped'] = True
+    timings['upload_time'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    if file_id not in attached_file_ids:
+        with_retries(lambda: llm_client.beta.assistants.files.create(assistant_id, file_id=file_id), retries, f"Attaching {file_path}")
+    timings['attach_time'] = time.perf_counter() - start_time
+    timings['file_id'] = file_id
+
+    return timings
+
+
+def main():
+    """Provision the assistant."""
+    parser = argparse.ArgumentParser(description="Create an assistant and attach the files of a folder.")
+    parser.add_argument("--name", default="file_eater_assistant")
+    parser.add_argument("--instructions", default="Respond based on the files provided")
+    parser.add_argument("--description", default=None, help="Defaults to the instructions.")
+    parser.add_argument("--assistant-id", default=None, help="Attach files to an existing assistant instead of creating one.")
+    parser.add_argument("--data-folder", default="assistant_data/")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent uploads.")
+    parser.add_argument("--retries", type=int, default=3, help="Retries of transient failures per request.")
+    parser.add_argument("--index-file", default=None, help="Content hashes of uploaded files. Defaults to FILE_HASH_INDEX_FILE, shared with the app.")
+    parser.add_argument("--reset", action="store_true", help="Delete all assistants and files first.")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", DEFAULT_API_VERSION)
+    env_helper = EnvHelper()
+    # Retries are done here. Uploads must reopen their file
+    llm_client = LLMClientRegistry.get_client(env_helper).with_options(max_retries=0)
+    file_hash_index = FileHashIndex(args.index_file or env_helper.FILE_HASH_INDEX_FILE)
+    # File ids belong to an endpoint
+    scope = env_helper.OPENAI_API_BASE
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="provisioning") as executor:
+        if args.reset:
+            reset(llm_client, executor, args.retries)
+
+        # Uploads by other tools or deleted files make index entries stale
+        file_hash_index.remove_missing(with_retries(lambda: [file.id for file in llm_client.files.list()], args.retries, "Listing files"), scope)
+
+        if args.assistant_id is None:
+            assistant = with_retries(lambda: llm_client.beta.assistants.create(
+                name=args.name,
+                description=args.description or args.instructions,
+                instructions=args.instructions,
+                tools=[{"type": "code_interpreter"}],
+                model=env_helper.AZURE_OPENAI_MODEL_DEPLOYMENT_NAME
+            ), args.retries, "Creating assistant")
+        else:
+            assistant = with_retries(lambda: llm_client.beta.assistants.retrieve(args.assistant_id), args.retries, "Retrieving assistant")
+
+        file_paths = sorted(os.path.join(args.data_folder, file_name) for file_name in os.listdir(args.data_folder)
+                            if os.path.isfile(os.path.join(args.data_folder, file_name)))
+        print(f"Provisioning {len(file_paths)} files to assistant {assistant.id} with {args.workers} workers")
+
+        futures = {executor.submit(provision_file, llm_client, file_path, assistant.id, set(assistant.file_ids), file_hash_index, scope, args.retries): file_path
+                   for file_path in file_paths}
+        file_timings, failed_files = [], []
+        for future in as_completed(futures):
+            try:
+                timings = future.result()
+            except openai.OpenAIError as e:
+                failed_files.append(futures[future])
+                print(f"FAILED {futures[future]}: {e}")
+                continue
+            file_timings.append(timings)
+            print(f"{'SKIPPED ' if timings['skipped'] else 'UPLOADED'} {timings['file']:40} {timings['size'] / 1024 / 1024:8.2f} MB  "
+                  f"hash {timings['hash_time']:6.2f}s  upload {timings['upload_time']:6.2f}s  attach {timings['attach_time']:6.2f}s  {timings['file_id']}")
+
+    file_hash_index.evict(env_helper.FILE_HASH_INDEX_MAX_ENTRIES, env_helper.FILE_HASH_INDEX_MAX_AGE_DAYS * 24 * 3600)
+    file_hash_index.save()
+    wall_time = time.perf_counter() - start_time
+
+    uploaded_bytes = sum(timings['size'] for timings in file_timings if not timings['skipped'])
+    print(f"Assistant {assistant.id} with name {assistant.name}: {len(file_timings)} files attached, "
+          f"{sum(timings['skipped'] for timings in file_timings)} already uploaded, {len(failed_files)} failed")
+    print(f"{uploaded_bytes / 1024 / 1024:.2f} MB uploaded in {wall_time:.2f}s, "
+          f"{uploaded_bytes / 1024 / 1024 / wall_time:.2f} MB/s, {len(file_timings) / wall_time:.2f} files/s")
+
 
-load_dotenv()    
-
-assistant_name = "file_eater_assistant"
-assistant_instructions = "Respond based on the files provided"
-assistant_description = assistant_instructions
-
-assistant_tool_list = [
-    {"type": "code_interpreter"},
-]
-
-DATA_FOLDER = "assistant_data/"
-
-llm_client = AzureOpenAI(
-  azure_endpoint=f"https://{os.getenv('AZURE_OPENAI_RESOURCE_NAME')}.openai.azure.com/",
-  api_key=os.getenv("AZURE_OPENAI_KEY"),
-  api_version="2024-02-15-preview"
-)
-
-print ("Deleting Assistants")
-try:
-  for assistant in llm_client.beta.assistants.list():
-      print (f"Deleting Assistant {assistant.id}")
-      llm_client.beta.assistants.delete(assistant.id)
-except:
-    pass
-
-print ("Deleting Files")
-for assistant_file in llm_client.files.list():
-    print (f"Deleting File {assistant_file.id}")
-    llm_client.files.delete(assistant_file.id)
-
-created_assistant = llm_client.beta.assistants.create(
-    name=assistant_name,
-    description=assistant_description,
-    instructions=assistant_instructions,
-    tools=assistant_tool_list,
-    model=os.getenv("AZURE_OPENAI_MODEL_DEPLOYMENT_NAME")
-)
-
-def upload_file(client: AzureOpenAI, path: str) :
-    with Path(path).open("rb") as f:
-        return client.files.create(file=f, purpose="assistants")
-
-arr = os.listdir(DATA_FOLDER)
-for file in arr:
-    file_path = DATA_FOLDER + file
-    print(f"Adding file {file_path} to assistant {created_assistant.id}")
-    uploaded_file = upload_file(llm_client, file_path)
-    llm_client.beta.assistants.files.create(created_assistant.id, file_id=uploaded_file.id)
-
-print(f"Created Assistant with id {created_assistant.id} and name {created_assistant.name}")
-for assistant_file in llm_client.beta.assistants.files.list(created_assistant.id):
-    print(f"Assistant id {created_assistant.id} has file {assistant_file.id}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,78 @@
 """Manages Assistant flows."""
+import io
+import math
+import sqlite3
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 
-from utilities.env_helper           import EnvHelper
 from utilities.llm_helper           import LLMHelper
+from utilities.message_store        import ThreadMessageStore
+from utilities.metrics_helper       import MetricsHelper
 from utilities.observability_helper import ObservabilityHelper
 from utilities.openapi_helper       import OpenAPIHelper
+from utilities.run_poller           import RunFailedError, RunPoller
+from utilities.run_profiler         import RunProfiler
+from utilities.thread_store         import ThreadStore
 
 class Manager:
     """App manager class."""
 
-    def __init__(self, session_id):
-        """Initialize a manager for a given session. It has a container for threads."""
+    RUN_MODE_POLLING   = "polling"
+    RUN_MODE_STREAMING = "streaming"
+    RUN_TERMINAL_FAILURE_EVENTS = ["thread.run.failed", "thread.run.cancelled", "thread.run.expired"]
+
+    # Caps tool calls in flight across all sessions in the process
+    tool_call_process_semaphore = None
+    tool_call_process_semaphore_lock = threading.Lock()
+
+    # Bytes of user files being uploaded, per session. Their buffers are held until the upload ends
+    upload_bytes_in_flight = {}
+    upload_bytes_in_flight_lock = threading.Lock()
+
+    def __init__(self, session_id, user_key=None):
+        """Initialize a manager for a given session. It has a container for threads.
+
+        Threads of a user key are persisted in the thread store, and resumed by later sessions with the same key.
+        """
         self.session_id = session_id
+        self.user_key = user_key
         self.thread_container = {}
 
         self.llm_helper = LLMHelper()
-        self.env_helper = EnvHelper()
+        # Same configuration as the LLM helper. Updated together
+        self.env_helper = self.llm_helper.env_helper
         self.observability_helper = ObservabilityHelper()
 
-        self.api_response_sleep_time = 1
+        self.thread_store = None
+        if user_key is not None:
+            try:
+                self.thread_store = ThreadStore.get_shared(self.env_helper)
+            except sqlite3.Error as e:
+                self.observability_helper.log(f"MANAGER - Thread store not available, threads are not persisted: {e}", True, level="WARNING")
+        self.message_store = ThreadMessageStore(self.llm_helper, self.thread_store)
+
+        self.run_poller = RunPoller(verbose=True)
+        self.run_profiler = RunProfiler(self.llm_helper, verbose=True)
+
+        MetricsHelper.start_exporters(self.env_helper)
+
+        self.tool_call_session_concurrency = self.env_helper.TOOL_CALL_SESSION_CONCURRENCY
+        self.tool_call_timeout = self.env_helper.TOOL_CALL_TIMEOUT
+        with Manager.tool_call_process_semaphore_lock:
+            if Manager.tool_call_process_semaphore is None:
+                Manager.tool_call_process_semaphore = threading.BoundedSemaphore(self.env_helper.TOOL_CALL_PROCESS_CONCURRENCY)
 
     def update_env_variable(self, env_variable_name, env_variable_value):
         self.env_helper.update_env_variable(env_variable_name, env_variable_value)
         self.llm_helper.update_env_related_attributes()
 
     def get_message_list(self, assistant_id):
-        """Get messages for current thread in assistant. Exposed to pages."""
-        if assistant_id in self.thread_container:
-            thread_id = self.thread_container[assistant_id]
-            return self.get_thread_messages(thread_id)
+        """Get messages for current thread in assistant, oldest first. Exposed to pages. Served from the local store."""
+        if self._resume_thread(assistant_id):
+            thread_id = self.thread_container[assistant_id]['thread_id']
+            return self.message_store.get_messages(thread_id)
 
         return []
 
@@ -54,10 +97,7 @@ class Manager:
 
     def get_assistant_name_list(self):
         """Get Assistant names."""
-        assistant_list = self.get_assistant_list()
-        assistant_name_list = [assistant.name for assistant in assistant_list]
-
-        return assistant_name_list
+        return self.llm_helper.get_assistant_catalog().get_names()
 
     def get_assistant(self, assistant_id):
         """Get Assistant by id."""
@@ -67,28 +107,42 @@ class Manager:
 
     def get_assistant_field(self, assistant_name, assistant_field):
         """Get a field of a given assistance."""
-        assistant_list = self.get_assistant_list()
-        assistant_field = [getattr(assistant, assistant_field, "") for assistant in assistant_list if assistant.name == assistant_name][0]
+        return self.llm_helper.get_assistant_catalog().get_field(assistant_name, assistant_field)
 
-        return assistant_field
+    def _resume_thread(self, assistant_id):
+        """Load the stored thread of the user with an assistant, if not loaded yet. True if the session has a thread."""
+        if assistant_id in self.thread_container:
+            return True
+        if self.thread_store is None:
+            return False
+
+        stored_thread = self.thread_store.get_thread(self.user_key, assistant_id)
+        if stored_thread is None:
+            return False
+
+        self.observability_helper.log(f"MANAGER - Resuming thread {stored_thread['thread_id']} of assistant id {assistant_id}", True)
+        self.thread_container[assistant_id] = stored_thread
+        return True
 
     def get_thread_id_for_assistant(self, assistant_id):
-        """Get a thread id for a given assistant. Create if not existing."""
-        if assistant_id not in self.thread_container:
+        """Get a thread id for a given assistant. Create if not existing nor stored."""
+        if not self._resume_thread(assistant_id):
             thread_id = self.llm_helper.create_assistant_thread()
             # Single thread per assistant. All files to be sent
             self.thread_container[assistant_id] = {}
             self.thread_container[assistant_id]['thread_id'] = thread_id
             self.thread_container[assistant_id]['files'] = set()
+            if self.thread_store is not None:
+                self.thread_store.set_thread(self.user_key, assistant_id, thread_id)
 
         return self.thread_container[assistant_id]['thread_id']
 
     def get_thread_messages(self, thread_id, verbose=False):
-        """Initialize a manager for a given session. It has a container for threads."""
-        raw_messages = self.llm_helper.get_assistant_thread_messages(thread_id)
-        if len(raw_messages) > 0:
-            message_list = [{'message_value': message.content[0].text.value, 'message_role': message.role} for message in raw_messages]
-            self.observability_helper.log(f"MANAGER - Message received is {message_list[0]}", verbose)
+        """Get thread messages, newest first. Only messages not seen before are fetched."""
+        message_list = self.message_store.sync(thread_id)
+        if len(message_list) > 0:
+            message_list.reverse()
+            self.observability_helper.log("MANAGER - Message received is %s", verbose, message_list[0])
             return message_list
 
         return []
@@ -97,54 +151,225 @@ class Manager:
         """Get az_oai_assistant uploaded files id by the user for current thread in assistant."""
         return [file_tuple[1] for file_tuple in self.thread_container[assistant_id]['files']]
 
-    def run_thread(self, prompt, assistant_id, verbose=True):
-        """Run a thread with the assistant."""
+    def is_streaming_enabled(self):
+        """Check if runs are executed in streaming mode."""
+        return self.env_helper.AZURE_OPENAI_RUN_MODE == Manager.RUN_MODE_STREAMING
+
+    def _execute_tool_call(self, tool_call, openapi_spec, assistant_id=None, verbose=True):
+        """Execute a tool call with the OpenAPI spec."""
+        function_name = tool_call.function.name
+        function_args = tool_call.function.arguments
+        self.observability_helper.log("MANAGER - Required calling function %s with args %s", False, function_name, function_args)
+        # The call stops at its timeout, so that calls given up on do not keep holding the process-wide slots
+        deadline = time.monotonic() + self.tool_call_timeout
+        if not Manager.tool_call_process_semaphore.acquire(timeout=self.tool_call_timeout):
+            self.observability_helper.log(f"MANAGER - Function {function_name} not called. No tool call slot free for {self.tool_call_timeout}s", True)
+            return None
+        try:
+            with MetricsHelper.timed("tool_call", assistant_id=assistant_id, function=function_name):
+                function_call_result = OpenAPIHelper.call_function(function_name, function_args, openapi_spec, deadline)
+        finally:
+            Manager.tool_call_process_semaphore.release()
+        self.observability_helper.log("MANAGER - Function result is %s", verbose, function_call_result)
+
+        return function_call_result
+
+    def _execute_tool_calls(self, tool_calls, openapi_spec, assistant_id=None, verbose=True):
+        """Execute the tool calls required by a run with the OpenAPI spec. Calls run concurrently."""
+        # A single call too, so that its timeout and failures are handled the same way
+        max_workers = max(1, min(len(tool_calls), self.tool_call_session_concurrency))
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"tool_calls_{self.session_id}")
+        futures = [executor.submit(self._execute_tool_call, tool_call, openapi_spec, assistant_id, verbose) for tool_call in tool_calls]
+
+        start_time = time.monotonic()
+        function_call_results = []
+        for index, (tool_call, future) in enumerate(zip(tool_calls, futures)):
+            # A call starts at the latest when the calls before it in its worker are done
+            call_deadline = start_time + self.tool_call_timeout * math.ceil((index + 1) / max_workers)
+            try:
+                function_call_results.append(future.result(timeout=max(0, call_deadline - time.monotonic())))
+            except FutureTimeoutError:
+                self.observability_helper.log(f"MANAGER - Function {tool_call.function.name} timed out after {self.tool_call_timeout}s", True)
+                function_call_results.append(None)
+            except Exception as e:
+                self.observability_helper.log(f"MANAGER - Function {tool_call.function.name} failed with {e}", True)
+                function_call_results.append(None)
+
+        # Do not block the run on calls that timed out
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        tool_output_list = [{
+                "tool_call_id": tool_call.id,
+                "output": str(function_call_result)
+            } for tool_call, function_call_result in zip(tool_calls, function_call_results)]
+
+        return tool_output_list
+
+    def _profile_run(self, thread_id, run, start_time, tool_time, assistant_id):
+        """Break down the time of a finished run turn, if enabled. Done in the background."""
+        if run is None or not self.env_helper.RUN_PROFILING_ENABLED:
+            return
+
+        self.run_profiler.profile_in_background(thread_id, run, time.monotonic() - start_time, tool_time, self.session_id, assistant_id)
+
+    def _prepare_thread_run(self, prompt, assistant_id):
+        """Add the user prompt to the assistant thread. Return thread id and OpenAPI spec."""
         # Get or create a thread
         thread_id = self.get_thread_id_for_assistant(assistant_id)
         # Get files in thread
         file_ids = self.get_uploaded_files(assistant_id)
-        openapi_spec = OpenAPIHelper.get_openapi_spec(assistant_id)
+        openapi_spec = OpenAPIHelper.get_compiled_openapi_spec(assistant_id)
         # Add message to thread (llm)
         self.llm_helper.add_message_to_assistant_thread(thread_id, "user", prompt, file_ids)
 
-        run = self.llm_helper.create_assistant_thread_run(thread_id, assistant_id)
+        return thread_id, openapi_spec
+
+    def run_thread_stream(self, prompt, assistant_id, verbose=True):
+        """Run a thread with the assistant. Yield text deltas as they arrive."""
+        thread_id, openapi_spec = self._prepare_thread_run(prompt, assistant_id)
+
+        start_time = time.monotonic()
+        tool_time = 0
+        run = None
+        run_stream = self.llm_helper.create_assistant_thread_run_stream(thread_id, assistant_id)
+
+        # Tool outputs resume the run in a new stream
+        while run_stream is not None:
+            next_run_stream = None
+            for event in run_stream:
+                if event.event == "thread.message.delta":
+                    for content in event.data.delta.content or []:
+                        if content.type == "text" and content.text is not None and content.text.value:
+                            yield content.text.value
+                elif event.event == "thread.run.created":
+                    self.observability_helper.log(f"MANAGER - Run {event.data.id} created", verbose)
+                elif event.event == "thread.run.requires_action":
+                    run = event.data
+                    self.observability_helper.log(f"MANAGER - Next action type: {run.required_action.type}", verbose)
+                    if run.required_action.type == 'submit_tool_outputs':
+                        tool_start_time = time.monotonic()
+                        tool_output_list = self._execute_tool_calls(run.required_action.submit_tool_outputs.tool_calls, openapi_spec, assistant_id, verbose)
+                        tool_time += time.monotonic() - tool_start_time
+                        run_stream.close()
+                        next_run_stream = self.llm_helper.submit_tool_outputs_to_assistant_thread_run_stream(thread_id, run.id, tool_output_list)
+                        break
+                elif event.event == "thread.run.completed":
+                    run = event.data
+                    self.observability_helper.log(f"MANAGER - Run {run.id} completed", verbose)
+                    MetricsHelper.add_token_usage(run.usage, assistant_id=assistant_id, source="run")
+                elif event.event in Manager.RUN_TERMINAL_FAILURE_EVENTS:
+                    run = event.data
+                    self.observability_helper.log(f"MANAGER - Run {run.id} finished with status {run.status}", verbose)
+
+            run_stream = next_run_stream
+
+        self._profile_run(thread_id, run, start_time, tool_time, assistant_id)
+
+        # History is served from the local store. Keep it up to date with the streamed messages
+        self.message_store.sync(thread_id)
+
+        if run is None:
+            raise RunFailedError(None, "incomplete")
+        if run.status != "completed":
+            raise RunFailedError(run.id, run.status, run.last_error)
+
+    def run_thread(self, prompt, assistant_id, verbose=True):
+        """Run a thread with the assistant. Return the messages, newest first. Raise RunFailedError if the run did not complete."""
+        if self.is_streaming_enabled():
+            for _ in self.run_thread_stream(prompt, assistant_id, verbose):
+                pass
+
+            # Synced at the end of the stream
+            message_list = self.message_store.get_messages(self.get_thread_id_for_assistant(assistant_id))
+            message_list.reverse()
+            return message_list
+
+        thread_id, openapi_spec = self._prepare_thread_run(prompt, assistant_id)
 
-        while run.status != "completed":
-            self.observability_helper.log(f"MANAGER - Run status is {run.status}", verbose)
-            if run.status == 'requires_action':
-                self.observability_helper.log(f"MANAGER - Next action type: {run.required_action.type}", verbose)
-                if run.required_action.type == 'submit_tool_outputs':
-                    tool_output_list = []
-                    for tool_call in run.required_action.submit_tool_outputs.tool_calls:
-                        tool_id       = tool_call.id
-                        function_name = tool_call.function.name
-                        function_args = tool_call.function.arguments
-                        self.observability_helper.log(f"MANAGER - Required calling function {function_name} with args {function_args}")
-                        function_call_result = OpenAPIHelper.call_function(function_name, function_args, openapi_spec)
-                        self.observability_helper.log(f"MANAGER - Function result is {function_call_result}", verbose)
+        start_time = time.monotonic()
+        tool_time = 0
+        run = self.llm_helper.create_assistant_thread_run(thread_id, assistant_id)
 
-                        tool_call_output = {
-                            "tool_call_id": tool_id,
-                            "output": str(function_call_result)
-                        }
+        def submit_tool_outputs(run):
+            nonlocal tool_time
+            self.observability_helper.log(f"MANAGER - Next action type: {run.required_action.type}", verbose)
+            if run.required_action.type == 'submit_tool_outputs':
+                tool_start_time = time.monotonic()
+                tool_output_list = self._execute_tool_calls(run.required_action.submit_tool_outputs.tool_calls, openapi_spec, assistant_id, verbose)
+                tool_time += time.monotonic() - tool_start_time
+                self.llm_helper.submit_tool_outputs_to_assistant_thread_run(thread_id, run.id, tool_output_list)
 
-                        tool_output_list.append(tool_call_output)
+        run = self.run_poller.poll(lambda: self.llm_helper.get_assistant_thread_run(thread_id, run.id), submit_tool_outputs, run)
 
-                    self.llm_helper.submit_tool_outputs_to_assistant_thread_run(thread_id, run.id, tool_output_list)
+        if run.status == "completed":
+            MetricsHelper.add_token_usage(run.usage, assistant_id=assistant_id, source="run")
+        else:
+            self.observability_helper.log(f"MANAGER - Run {run.id} not completed. Status is {run.status}", True)
+            if not RunPoller.is_terminal(run):
+                self.llm_helper.cancel_assistant_thread_runs(thread_id, run.id)
 
-            time.sleep(self.api_response_sleep_time)
+        self._profile_run(thread_id, run, start_time, tool_time, assistant_id)
 
-            run = self.llm_helper.get_assistant_thread_run(thread_id, run.id)
+        if run.status != "completed":
+            # The newest message would be the prompt, not an answer. Runs given up on were cancelled above
+            raise RunFailedError(run.id, run.status if RunPoller.is_terminal(run) else "timed_out", run.last_error)
 
         message_list = self.get_thread_messages(thread_id)
 
         return message_list
 
+    @staticmethod
+    def _get_file_size(uploaded_file):
+        """Size of an uploaded file without reading it. Streamlit uploaded files know theirs."""
+        if hasattr(uploaded_file, 'size'):
+            return uploaded_file.size
+
+        position = uploaded_file.tell()
+        file_size = uploaded_file.seek(0, io.SEEK_END)
+        uploaded_file.seek(position)
+        return file_size
+
+    def _reserve_upload_bytes(self, file_size):
+        """Account for an upload of the session. False if it would exceed the session limit."""
+        with Manager.upload_bytes_in_flight_lock:
+            bytes_in_flight = Manager.upload_bytes_in_flight.get(self.session_id, 0)
+            # A single upload is always accepted. The file size limit applies to it
+            if bytes_in_flight > 0 and bytes_in_flight + file_size > self.env_helper.UPLOAD_SESSION_MAX_IN_FLIGHT_MB * 1024 * 1024:
+                return False
+            Manager.upload_bytes_in_flight[self.session_id] = bytes_in_flight + file_size
+
+        return True
+
+    def _release_upload_bytes(self, file_size):
+        with Manager.upload_bytes_in_flight_lock:
+            bytes_in_flight = Manager.upload_bytes_in_flight.get(self.session_id, 0) - file_size
+            if bytes_in_flight > 0:
+                Manager.upload_bytes_in_flight[self.session_id] = bytes_in_flight
+            else:
+                Manager.upload_bytes_in_flight.pop(self.session_id, None)
+
+    @staticmethod
+    def get_upload_bytes_in_flight():
+        """Get the bytes being uploaded per session id."""
+        with Manager.upload_bytes_in_flight_lock:
+            return dict(Manager.upload_bytes_in_flight)
+
     def upload_file(self, uploaded_file, verbose=False):
-        """Upload a file."""
-        bytes_data = uploaded_file.getvalue()
-        self.observability_helper.log(f"MANAGER - Uploading file {uploaded_file.name}", verbose)
-        upload_success, file_id = self.llm_helper.upload_file(bytes_data)
+        """Upload a file, unless the same content was uploaded before. Its buffer is streamed to the API as is, never copied."""
+        file_size = self._get_file_size(uploaded_file)
+        if file_size > self.env_helper.UPLOAD_MAX_FILE_SIZE_MB * 1024 * 1024:
+            self.observability_helper.log(f"MANAGER - File {uploaded_file.name} of {file_size} bytes is over the {self.env_helper.UPLOAD_MAX_FILE_SIZE_MB} MB limit", True)
+            return False, None
+        if not self._reserve_upload_bytes(file_size):
+            self.observability_helper.log(f"MANAGER - File {uploaded_file.name} not uploaded. Session {self.session_id} is over its {self.env_helper.UPLOAD_SESSION_MAX_IN_FLIGHT_MB} MB of uploads in flight", True)
+            return False, None
+
+        self.observability_helper.log(f"MANAGER - Uploading file {uploaded_file.name} of {file_size} bytes", verbose)
+        try:
+            uploaded_file.seek(0)
+            upload_success, file_id = self.llm_helper.upload_file_once(uploaded_file, file_name=uploaded_file.name, file_size=file_size)
+        finally:
+            self._release_upload_bytes(file_size)
 
         if upload_success:
             self.observability_helper.log(f"MANAGER - Uploading success. File id {file_id}", verbose)
@@ -155,13 +380,15 @@ class Manager:
 
     def track_assistant_file_for_messages(self, assistant_id, local_file_id, az_oai_assistants_file_id, verbose=False):
         """Add assistant to file."""
-        _ = self.get_thread_id_for_assistant(assistant_id)
+        thread_id = self.get_thread_id_for_assistant(assistant_id)
         self.thread_container[assistant_id]['files'].add((local_file_id, az_oai_assistants_file_id))
+        if self.thread_store is not None:
+            self.thread_store.add_file(thread_id, local_file_id, az_oai_assistants_file_id)
         self.observability_helper.log(f"MANAGER - File {az_oai_assistants_file_id} to assistant id {assistant_id} OK", verbose)
 
     def is_file_already_uploaded(self, assistant_id, local_file_id):
         """Check if a file has already been uploaded. Streamlit duplicates file uploads."""
-        if assistant_id not in self.thread_container:
+        if not self._resume_thread(assistant_id):
             return False
 
         uploaded_local_file_ids = [file_tuple[0] for file_tuple in self.thread_container[assistant_id]['files']]
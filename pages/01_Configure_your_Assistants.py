@@ -1,14 +1,12 @@
 """Page for managing Assistants in a page."""
 import datetime
 import json
-from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 import streamlit as st
 
 import utilities.page_content as content
-from utilities.observability_helper import ObservabilityHelper
 from utilities.openapi_helper import OpenAPIHelper
-from manager import Manager
+from utilities.session_helper import SessionHelper
 
 VERBOSE = True
 
@@ -36,7 +34,7 @@ def get_file_data(file_list):
     """Get file data."""
     filtered_file_data = [{
                             'name': file.filename,
-                            'size': f"{round(file.bytes/1024,1)} MB",
+                            'size': f"{round(file.bytes/1024/1024,1)} MB",
                             'created': datetime.datetime.utcfromtimestamp(file.created_at).strftime('%Y-%m-%d %H:%M:%S')
                         } for file in file_list]
 
@@ -67,8 +65,8 @@ def update_instructions(assistant_data):
     """Update instructions."""
     assistant_id, previous_instructions = assistant_data
     if previous_instructions != st.session_state['updated_instructions']:
-        st.session_state['logger'].log(f'''CONF ASSIST - For assistant {assistant_id} update instructions {st.session_state['updated_instructions']} 
-                                       from {previous_instructions}''', verbose=VERBOSE)
+        st.session_state['logger'].log("CONF ASSIST - For assistant %s update instructions %s from %s", VERBOSE,
+                                       assistant_id, st.session_state['updated_instructions'], previous_instructions)
         st.session_state['manager'].llm_helper.update_assistant_instructions(assistant_id, st.session_state['updated_instructions'])
     else:
         st.session_state['logger'].log(f"CONF ASSIST - No updated instructions for assistant {assistant_id}", verbose=VERBOSE)
@@ -102,23 +100,19 @@ def update_conv_starters(assistant_id, conv_starter_id):
 
     st.session_state['manager'].llm_helper.update_conv_starter(assistant_id, conv_starter_id, conv_starter_text)
 
-if 'session_id' not in st.session_state:
-    ctx = get_script_run_ctx()
-    st.session_state['session_id'] = ctx.session_id
-    st.session_state['manager'] = Manager(st.session_state['session_id'])
+SessionHelper.init_session("CONF ASSIST", VERBOSE)
 
-    st.session_state['logger'] = ObservabilityHelper()
-    st.session_state['logger'].log(f"CONF ASSIST - New session created with id {st.session_state['session_id']}", verbose=VERBOSE)
-
-st.session_state['logger'].log(f"CONF ASSIST - Session id is {st.session_state['session_id']}", verbose=VERBOSE)
-st.session_state['logger'].log("CONF ASSIST - Configuring assistants", verbose=VERBOSE)
+st.session_state['logger'].log("CONF ASSIST - Session id is %s", VERBOSE, st.session_state['session_id'], level="DEBUG")
+# Endpoint status from the shared health cache. Does not block the render
+st.sidebar.caption(content.get_health_status_text(st.session_state['manager'].llm_helper.get_endpoint_health()))
+st.session_state['logger'].log("CONF ASSIST - Configuring assistants", VERBOSE, level="DEBUG")
 
 # DISPLAY - TITLE
 st.title(content.MANAGE_TITLE_TEXT)
 # We had a specific method for checking OpenAI Status, but calling the API is too slow. 
 # Better tune the API data retrieval to return None if the credentials are not working
-assistant_list = st.session_state['manager'].llm_helper.get_assistants()
-openai_status = assistant_list is not None
+assistant_catalog = st.session_state['manager'].llm_helper.get_assistant_catalog()
+openai_status = assistant_catalog is not None
 if openai_status:
     # DISPLAY - CREATE ASSISTANT FORM
     with st.form("add_assistant_form"):
@@ -145,19 +139,15 @@ if openai_status:
 
     # DISPLAY - ASSISTANT PANEL
 
-    if len(assistant_list) > 0:
+    if len(assistant_catalog) > 0:
         # All Assitants
-        assistant_id_name_list = [(assistant.id, assistant.name) for assistant in assistant_list]
-        assistant_id_list   = [assistant[0] for assistant in assistant_id_name_list]
-        assistant_name_list = [assistant[1] for assistant in assistant_id_name_list]
+        assistant_name_list = assistant_catalog.get_names()
     # Selected Assistant
         this_assistant_name  = st.selectbox(content.MANAGE_ASSISTANT_SELECT_TEXT, assistant_name_list)
-        this_assistant_index = assistant_name_list.index(this_assistant_name)
-        this_assistant_id = assistant_id_list[this_assistant_index]
+        this_assistant_id = assistant_catalog.get_by_name(this_assistant_name).id
         this_assistant = st.session_state['manager'].llm_helper.get_assistant(this_assistant_id)
 
         this_assistant_conv_starters = st.session_state['manager'].llm_helper.get_assistant_conversation_starter_values(this_assistant)
-        this_assistant_files = st.session_state['manager'].llm_helper.get_files_from_assistant(this_assistant)
 
         # Selected Assistant info
         assistant_description  = this_assistant.description
@@ -187,16 +177,15 @@ if openai_status:
                 st.session_state['logger'].log("CONF ASSIST - Valid Spec", verbose=VERBOSE)
                 OpenAPIHelper.save_openapi_spec(this_assistant_id, new_spec_body)
                 openai_functions = OpenAPIHelper.extract_openai_functions_from_spec(new_spec_body)
-                st.session_state['logger'].log(f"CONF ASSIST - Extracted functions {openai_functions}", verbose=VERBOSE)
-                for openai_function in openai_functions:
-                    st.session_state['manager'].llm_helper.create_assistant_function(this_assistant_id, openai_function)
-                    st.session_state['logger'].log("CONF ASSIST - New function added - refreshing", verbose=VERBOSE)
+                st.session_state['logger'].log("CONF ASSIST - Extracted functions %s", VERBOSE, openai_functions)
+                st.session_state['manager'].llm_helper.upsert_assistant_functions(this_assistant_id, openai_functions)
+                st.session_state['logger'].log("CONF ASSIST - New functions added - refreshing", verbose=VERBOSE)
                 st.rerun()
             else:
                 st.error(content.MANAGE_ASSISTANT_NEW_SPEC_NOT_VALID)
                 st.session_state['logger'].log("CONF ASSIST - Not a valid OpenAPI Spec", verbose=VERBOSE)
 
-        st.session_state['logger'].log("CONF ASSIST - Listing functions", verbose=VERBOSE)
+        st.session_state['logger'].log("CONF ASSIST - Listing functions", VERBOSE, level="DEBUG")
         # Listing function fro API
         this_assistant_functions = st.session_state['manager'].llm_helper.get_functions_from_assistant(this_assistant)
         functions_data_list = get_assistant_function_data(this_assistant_functions)
@@ -241,15 +230,15 @@ if openai_status:
                                 on_change=update_conv_starters,
                                 args=(this_assistant_id, index))
     # DISPLAY - ASSISTANT files
-
-        # st.markdown(f"<DIV style='text-align: center;'><H3>{content.MANAGE_SELECTED_ASSISTANT_FILES}</H3></DIV>", unsafe_allow_html=True)
-
-        # if len(this_assistant_files) > 0:
-        #     file_data_list = get_file_data(this_assistant_files)
-        #     st.write(file_data_list)
-        # else:
-        #     st.write(content.MANAGE_NO_FILE_MESSAGE)
-        #
+        # File metadata is only fetched when shown
+        if st.toggle(content.MANAGE_SELECTED_ASSISTANT_SHOW_FILES, key="show_assistant_files"):
+            st.markdown(f"<DIV style='text-align: center;'><H3>{content.MANAGE_SELECTED_ASSISTANT_FILES}</H3></DIV>", unsafe_allow_html=True)
+            this_assistant_files = st.session_state['manager'].llm_helper.get_files_from_assistant(this_assistant)
+            if len(this_assistant_files) > 0:
+                file_data_list = get_file_data(this_assistant_files)
+                st.write(file_data_list)
+            else:
+                st.write(content.MANAGE_NO_FILE_MESSAGE)
     else:
         st.markdown(f"<DIV style='text-align: center;'><H3>{content.MAIN_NO_ASSISTANT_TEXT}</H3></DIV>", unsafe_allow_html=True)
 else:
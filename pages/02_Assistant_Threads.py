@@ -1,22 +1,16 @@
 """Main page."""
-from streamlit.runtime.scriptrunner import get_script_run_ctx
 import streamlit as st
 
 import utilities.page_content as content
-from utilities.observability_helper import ObservabilityHelper
-from manager import Manager
+from utilities.session_helper import SessionHelper
 
 VERBOSE = True
 
-if 'session_id' not in st.session_state:
-    ctx = get_script_run_ctx()
-    st.session_state['session_id'] = ctx.session_id
-    st.session_state['manager'] = Manager(st.session_state['session_id'])
+SessionHelper.init_session("THREADS", VERBOSE)
 
-    st.session_state['logger'] = ObservabilityHelper()
-    st.session_state['logger'].log(f"THREADS - New session {st.session_state['session_id']}", verbose=VERBOSE)
-
-st.session_state['logger'].log(f"THREADS - Session id is {st.session_state['session_id']}", verbose=VERBOSE)
+st.session_state['logger'].log("THREADS - Session id is %s", VERBOSE, st.session_state['session_id'], level="DEBUG")
+# Endpoint status from the shared health cache. Does not block the render
+st.sidebar.caption(content.get_health_status_text(st.session_state['manager'].llm_helper.get_endpoint_health()))
 
 st.title(content.MAIN_TITLE_TEXT)
 
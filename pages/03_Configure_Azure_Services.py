@@ -1,65 +1,53 @@
 """Page for Configuring Azure services."""
-from streamlit.runtime.scriptrunner import get_script_run_ctx
 import streamlit as st
 
-from manager import Manager
-from utilities.observability_helper import ObservabilityHelper
+from utilities.session_helper import SessionHelper
 import utilities.page_content as content
 
 VERBOSE = True
 
 
-def check_openai_config():
-    """Check OpenAI Config."""
-    try:
-        st.session_state['manager'].llm_helper.check_openai_endpoint(
-            st.session_state['manager'].env_helper.OPENAI_API_BASE,
-            st.session_state['manager'].env_helper.OPENAI_API_KEY,
-            st.session_state['manager'].env_helper.AZURE_OPENAI_MODEL_DEPLOYMENT_NAME,
-            st.session_state['manager'].env_helper.AZURE_OPENAI_API_VERSION
-        )
-        return True
-    except Exception:
-        return False
+def check_openai_config(refresh=False):
+    """Check OpenAI Config. Cached unless refreshed after a config change."""
+    return st.session_state['manager'].llm_helper.get_endpoint_health(refresh)['ok']
 
 
 def on_change_aoai_resource_name():
     """Change OpenAI Config. API Endopint."""
     st.session_state['logger'].log(f"CONF AZURE - Updating AOAI RES NAME TO  {st.session_state['aoai_resource_name']}", verbose=VERBOSE)
     st.session_state['manager'].update_env_variable("AZURE_OPENAI_RESOURCE_NAME", st.session_state['aoai_resource_name'])
+    st.session_state['status'] = check_openai_config(refresh=True)
     
 
 def on_change_aoai_key():
     """Change OpenAI Config. API key."""
     st.session_state['logger'].log(f"CONF AZURE - Updating AOAI KEY TO  {st.session_state['aoai_key']}", verbose=VERBOSE)
     st.session_state['manager'].update_env_variable("AZURE_OPENAI_KEY", st.session_state['aoai_key'])
-    st.session_state['status'] = check_openai_config()
+    st.session_state['status'] = check_openai_config(refresh=True)
     
 
 def on_change_aoai_deployment_name():
     """Change OpenAI Config. Deployment."""
     st.session_state['logger'].log(f"CONF AZURE - Updating AOAI DEP NAME TO  {st.session_state['aoai_deployment_name']}", verbose=VERBOSE)
     st.session_state['manager'].update_env_variable("AZURE_OPENAI_MODEL_DEPLOYMENT_NAME", st.session_state['aoai_deployment_name'])
+    st.session_state['status'] = check_openai_config(refresh=True)
     
 
 def on_change_aoai_api_version():
     """Change OpenAI Config. API VERSION."""
     st.session_state['logger'].log(f"CONF AZURE - Updating AOAI API VER TO  {st.session_state['aoai_api_version']}", verbose=VERBOSE)
     st.session_state['manager'].update_env_variable("AZURE_OPENAI_API_VERSION", st.session_state['aoai_api_version'])
+    st.session_state['status'] = check_openai_config(refresh=True)
 
 
-if 'session_id' not in st.session_state:
-    ctx = get_script_run_ctx()
-    st.session_state['session_id'] = ctx.session_id
-    st.session_state['manager'] = Manager(st.session_state['session_id'])
+SessionHelper.init_session("CONF AZURE", VERBOSE)
 
-    st.session_state['logger'] = ObservabilityHelper()
-    st.session_state['logger'].log(f"CONF AZURE - New session created with id {st.session_state['session_id']}", verbose=VERBOSE)
+# Cheap. Served from the shared health cache
+st.session_state['status'] = check_openai_config()
 
-if 'status' not in st.session_state:
-    st.session_state['status'] = check_openai_config()
-
-st.session_state['logger'].log(f"CONF AZURE - Session id is {st.session_state['session_id']}", verbose=VERBOSE)
+st.session_state['logger'].log("CONF AZURE - Session id is %s", VERBOSE, st.session_state['session_id'], level="DEBUG")
+# Endpoint status from the shared health cache. Does not block the render
+st.sidebar.caption(content.get_health_status_text(st.session_state['manager'].llm_helper.get_endpoint_health()))
 
 # GUI
 
@@ -0,0 +1,137 @@
+"""Local fake backend for the OpenAPI functions of assistants.
+
+Answers every request with a JSON echo of method, path, query and body, after a configurable
+latency, and can fail a fraction of requests. get_openapi_spec returns a spec pointing at it,
+to pass to OpenAPIHelper.call_function, or to save as JSON with OpenAPIHelper.save_openapi_spec.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+from testing.mock_azure_openai import StandInHTTPServer
+
+class FakeOpenAPIBackend:
+    """Echo server for tool calls."""
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, error_status=500, seed=0):
+        """Configure the backend. Port 0 picks a free port. Latency in seconds."""
+        self.latency      = latency
+        self.error_rate   = error_rate
+        self.error_status = error_status
+        self.random       = random.Random(seed)
+
+        self.request_count = 0
+        self.lock = threading.Lock()
+
+        self.http_server = StandInHTTPServer(("127.0.0.1", port), FakeOpenAPIRequestHandler)
+        self.http_server.backend = self
+        self.port = self.http_server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        """Serve in a background thread. Return the backend."""
+        threading.Thread(target=self.http_server.serve_forever, daemon=True, name="fake_openapi_backend").start()
+
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self.http_server.shutdown()
+        self.http_server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def handle(self, method, path, query, body):
+        """Serve a request. Return status and JSON body."""
+        with self.lock:
+            self.request_count += 1
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        if failed:
+            return self.error_status, {'error': "Injected error"}
+
+        return 200, {'method': method, 'path': path, 'query': query, 'body': body}
+
+    def get_openapi_spec(self):
+        """Get an OpenAPI spec with a GET and a POST operation served by this backend."""
+        return {
+            'openapi': "3.0.0",
+            'info': {'title': "Fake backend", 'version': "1.0.0"},
+            'servers': [{'url': self.url}],
+            'paths': {
+                '/items/{itemId}': {
+                    'get': {
+                        'operationId': "getItem",
+                        'summary': "Get an item by id",
+                        'parameters': [
+                            {'name': "itemId", 'in': "path", 'required': True, 'description': "Item id", 'schema': {'type': "string"}},
+                            {'name': "detail", 'in': "query", 'required': False, 'description': "Detail level", 'schema': {'type': "string"}}
+                        ]
+                    }
+                },
+                '/orders': {
+                    'post': {
+                        'operationId': "createOrder",
+                        'summary': "Create an order",
+                        'requestBody': {'content': {'application/json': {'schema': {'type': "object"}}}}
+                    }
+                }
+            }
+        }
+
+
+class FakeOpenAPIRequestHandler(BaseHTTPRequestHandler):
+    """Translate HTTP requests to backend calls."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately. Do not let the second write wait for an ACK
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        content_length = int(self.headers.get("Content-Length", 0))
+        raw_body = self.rfile.read(content_length) if content_length > 0 else b""
+        body = json.loads(raw_body) if len(raw_body) > 0 else None
+
+        status, response_body = self.server.backend.handle(self.command, url.path, query, body)
+        response_bytes = json.dumps(response_body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response_bytes)))
+        self.end_headers()
+        self.wfile.write(response_bytes)
+
+    do_GET    = _handle
+    do_POST   = _handle
+    do_PUT    = _handle
+    do_DELETE = _handle
+    do_PATCH  = _handle
+
+    def log_message(self, format, *args):
+        """Do not log requests."""
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake backend for OpenAPI functions.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with HTTP 500.")
+    args = parser.parse_args()
+
+    fake_backend = FakeOpenAPIBackend(port=args.port, latency=args.latency, error_rate=args.error_rate)
+    print(f"Fake OpenAPI backend listening on {fake_backend.url}")
+    print(json.dumps(fake_backend.get_openapi_spec(), indent=2))
+    fake_backend.http_server.serve_forever()
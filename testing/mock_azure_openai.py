@@ -0,0 +1,613 @@
+"""Local stand-in for the Azure OpenAI Assistants API.
+
+Implements the subset used by LLMHelper: assistants, assistant files, files, threads, messages,
+runs with run steps and streaming, and chat completions. Runs follow scripted tool calls, latencies
+are configurable per operation and errors can be injected, so Manager.run_thread runs offline
+and deterministically.
+
+Point the app at it with AZURE_OPENAI_ENDPOINT=http://127.0.0.1:<port>. From the command line:
+    python -m testing.mock_azure_openai --port 8765
+"""
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+class StandInHTTPServer(ThreadingHTTPServer):
+    """Threaded server accepting bursts of connections from many simulated sessions."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class MockAzureOpenAIServer:
+    """In-memory Assistants API served over HTTP on localhost.
+
+    Runs are queued for queue_time, then in progress for run_time. After that they require
+    the next batch of scripted tool calls, or complete with an assistant reply. Tool call batches
+    are lists of {"name": ..., "arguments": {...}} dicts, set for all assistants or per assistant.
+    Latencies and forced errors use the operation names of the metrics, e.g. "threads.runs.create".
+    """
+
+    STREAM_CHUNK_SIZE = 20
+
+    def __init__(self, port=0, queue_time=0.0, run_time=0.0, tool_calls=None, reply=None,
+                 latencies=None, default_latency=0.0, error_rate=0.0, error_status=500, seed=0):
+        """Configure the server. Port 0 picks a free port. Times in seconds."""
+        self.queue_time      = queue_time
+        self.run_time        = run_time
+        self.tool_calls      = tool_calls or []
+        self.reply           = reply or (lambda prompt, tool_outputs: f"Mock reply to: {prompt}")
+        self.latencies       = latencies or {}
+        self.default_latency = default_latency
+        self.error_rate      = error_rate
+        self.error_status    = error_status
+        self.random          = random.Random(seed)
+
+        self.assistant_tool_calls = {}
+        self.forced_errors = {}
+        self.request_counts = {}
+
+        self.assistants = {}
+        self.files = {}
+        self.threads = {}
+        self.messages = {}
+        self.runs = {}
+        self.run_steps = {}
+        self.lock = threading.RLock()
+        self.id_counter = itertools.count(1)
+
+        self.http_server = StandInHTTPServer(("127.0.0.1", port), MockAzureOpenAIRequestHandler)
+        self.http_server.mock = self
+        self.port = self.http_server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.server_thread = None
+
+    def start(self):
+        """Serve in a background thread. Return the server."""
+        self.server_thread = threading.Thread(target=self.http_server.serve_forever, daemon=True, name="mock_azure_openai")
+        self.server_thread.start()
+
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self.http_server.shutdown()
+        self.http_server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    # SCRIPTING ##############################################
+    def set_tool_calls(self, assistant_id, tool_calls):
+        """Set the tool call batches of the runs of an assistant."""
+        with self.lock:
+            self.assistant_tool_calls[assistant_id] = tool_calls
+
+    def inject_errors(self, operation, count=1, status=500):
+        """Fail the next calls of an operation with an HTTP status."""
+        with self.lock:
+            self.forced_errors.setdefault(operation, []).extend([status] * count)
+
+    def get_request_counts(self):
+        """Get the number of requests received per operation."""
+        with self.lock:
+            return dict(self.request_counts)
+
+    def reset_request_counts(self):
+        """Reset request counters."""
+        with self.lock:
+            self.request_counts = {}
+
+    # HELPERS ################################################
+    def _new_id(self, prefix):
+        return f"{prefix}_mock{next(self.id_counter):08d}"
+
+    @staticmethod
+    def _now():
+        return int(time.time())
+
+    def _before_request(self, operation):
+        """Count, delay and maybe fail a request. Return an error status or None."""
+        with self.lock:
+            self.request_counts[operation] = self.request_counts.get(operation, 0) + 1
+            forced_errors = self.forced_errors.get(operation, [])
+            error_status = forced_errors.pop(0) if len(forced_errors) > 0 else None
+            if error_status is None and self.error_rate > 0 and self.random.random() < self.error_rate:
+                error_status = self.error_status
+
+        latency = self.latencies.get(operation, self.default_latency)
+        if latency > 0:
+            time.sleep(latency)
+
+        return error_status
+
+    @staticmethod
+    def _paginate(items, query):
+        """Cursor page of a list sorted oldest first, as the API returns it."""
+        order = query.get('order', 'desc')
+        limit = int(query.get('limit', 20))
+        items = list(items) if order == "asc" else list(reversed(items))
+
+        ids = [item['id'] for item in items]
+        if 'after' in query and query['after'] in ids:
+            items = items[ids.index(query['after']) + 1:]
+        if 'before' in query and query['before'] in ids:
+            items = items[:ids.index(query['before'])]
+
+        page = items[:limit]
+        return {
+            'object': "list",
+            'data': page,
+            'first_id': page[0]['id'] if len(page) > 0 else None,
+            'last_id': page[-1]['id'] if len(page) > 0 else None,
+            'has_more': len(items) > limit
+        }
+
+    @staticmethod
+    def _count_tokens(text):
+        return len(text.split())
+
+    def _create_message(self, thread_id, role, text, file_ids=None, assistant_id=None, run_id=None):
+        message = {
+            'id': self._new_id("msg"),
+            'object': "thread.message",
+            'created_at': self._now(),
+            'thread_id': thread_id,
+            'role': role,
+            'content': [{'type': "text", 'text': {'value': text, 'annotations': []}}],
+            'file_ids': file_ids or [],
+            'assistant_id': assistant_id,
+            'run_id': run_id,
+            'metadata': {},
+            'status': "completed",
+            'completed_at': self._now(),
+            'incomplete_at': None,
+            'incomplete_details': None
+        }
+        self.messages[thread_id].append(message)
+
+        return message
+
+    def _create_run_step(self, run, step_type, step_details, status):
+        run_step = {
+            'id': self._new_id("step"),
+            'object': "thread.run.step",
+            'created_at': self._now(),
+            'assistant_id': run['assistant_id'],
+            'thread_id': run['thread_id'],
+            'run_id': run['id'],
+            'type': step_type,
+            'status': status,
+            'step_details': step_details,
+            'last_error': None,
+            'expired_at': None,
+            'cancelled_at': None,
+            'failed_at': None,
+            'completed_at': self._now() if status == "completed" else None,
+            'metadata': {},
+            'usage': None
+        }
+        self.run_steps[run['id']].append(run_step)
+
+        return run_step
+
+    # RUN STATE MACHINE ######################################
+    def _advance_run(self, run_id):
+        """Move a run forward to its state at the current time. Return the events it went through."""
+        events = []
+        run_state = self.runs[run_id]
+        run = run_state['run']
+        now = time.monotonic()
+
+        while now >= run_state['phase_end']:
+            if run['status'] == "queued":
+                run['status'] = "in_progress"
+                run['started_at'] = self._now()
+                run_state['phase_end'] += self.run_time
+                events.append(("thread.run.in_progress", run))
+            elif run['status'] == "in_progress" and len(run_state['tool_calls']) > 0:
+                tool_calls = [{
+                    'id': self._new_id("call"),
+                    'type': "function",
+                    'function': {
+                        'name': tool_call['name'],
+                        'arguments': tool_call['arguments'] if isinstance(tool_call['arguments'], str) else json.dumps(tool_call['arguments'])
+                    }
+                } for tool_call in run_state['tool_calls'].pop(0)]
+                run_state['tool_call_step'] = self._create_run_step(run, "tool_calls",
+                                                                    {'type': "tool_calls", 'tool_calls': tool_calls}, "in_progress")
+                run['status'] = "requires_action"
+                run['required_action'] = {'type': "submit_tool_outputs", 'submit_tool_outputs': {'tool_calls': tool_calls}}
+                events.append(("thread.run.step.created", run_state['tool_call_step']))
+                events.append(("thread.run.requires_action", run))
+            elif run['status'] == "in_progress":
+                reply_text = self.reply(run_state['prompt'], run_state['tool_outputs'])
+                message = self._create_message(run['thread_id'], "assistant", reply_text, assistant_id=run['assistant_id'], run_id=run['id'])
+                run_step = self._create_run_step(run, "message_creation",
+                                                 {'type': "message_creation", 'message_creation': {'message_id': message['id']}}, "completed")
+                run['status'] = "completed"
+                run['completed_at'] = self._now()
+                run['usage'] = {
+                    'prompt_tokens': run_state['prompt_tokens'],
+                    'completion_tokens': self._count_tokens(reply_text),
+                    'total_tokens': run_state['prompt_tokens'] + self._count_tokens(reply_text)
+                }
+                events.append(("thread.run.step.created", run_step))
+                events.append(("thread.message.created", message))
+                events.append(("thread.run.completed", run))
+            else:
+                # Waiting for tool outputs, or ended
+                break
+
+        return events
+
+    def _create_run(self, thread_id, assistant_id, tools):
+        run = {
+            'id': self._new_id("run"),
+            'object': "thread.run",
+            'created_at': self._now(),
+            'thread_id': thread_id,
+            'assistant_id': assistant_id,
+            'status': "queued",
+            'required_action': None,
+            'last_error': None,
+            'expires_at': self._now() + 600,
+            'started_at': None,
+            'cancelled_at': None,
+            'failed_at': None,
+            'completed_at': None,
+            'model': self.assistants[assistant_id]['model'],
+            'instructions': self.assistants[assistant_id]['instructions'],
+            'tools': tools if tools is not None else self.assistants[assistant_id]['tools'],
+            'file_ids': [],
+            'metadata': {},
+            'usage': None
+        }
+        user_messages = [message for message in self.messages[thread_id] if message['role'] == "user"]
+        prompt = user_messages[-1]['content'][0]['text']['value'] if len(user_messages) > 0 else ""
+        tool_calls = self.assistant_tool_calls.get(assistant_id, self.tool_calls)
+
+        self.runs[run['id']] = {
+            'run': run,
+            'prompt': prompt,
+            'prompt_tokens': sum(self._count_tokens(message['content'][0]['text']['value']) for message in self.messages[thread_id]),
+            'tool_calls': [list(batch) for batch in tool_calls],
+            'tool_outputs': [],
+            'tool_call_step': None,
+            'phase_end': time.monotonic() + self.queue_time
+        }
+        self.run_steps[run['id']] = []
+
+        return run
+
+    def stream_run(self, run_id, first_events):
+        """Yield the events of a run until it requires action or ends."""
+        for event in first_events:
+            yield event
+
+        while True:
+            with self.lock:
+                events = self._advance_run(run_id)
+                run_state = self.runs[run_id]
+                status = run_state['run']['status']
+                wait_time = run_state['phase_end'] - time.monotonic()
+
+            for event_name, event_data in events:
+                if event_name == "thread.message.created":
+                    yield event_name, dict(event_data, status="in_progress")
+                    text = event_data['content'][0]['text']['value']
+                    for index in range(0, len(text), MockAzureOpenAIServer.STREAM_CHUNK_SIZE):
+                        yield "thread.message.delta", {
+                            'id': event_data['id'],
+                            'object': "thread.message.delta",
+                            'delta': {'content': [{'index': 0, 'type': "text",
+                                                   'text': {'value': text[index:index + MockAzureOpenAIServer.STREAM_CHUNK_SIZE], 'annotations': []}}]}
+                        }
+                    yield "thread.message.completed", event_data
+                else:
+                    yield event_name, event_data
+
+            if status not in ["queued", "in_progress"]:
+                return
+
+            time.sleep(max(0.001, wait_time))
+
+    # OPERATIONS #############################################
+    def handle(self, method, path, query, body, files):
+        """Serve a request. Return the operation name, status, and a JSON body or an event generator."""
+        with self.lock:
+            for route_method, route_pattern, operation in MockAzureOpenAIServer.ROUTES:
+                match = route_pattern.fullmatch(path)
+                if route_method == method and match is not None:
+                    break
+            else:
+                return None, 404, {'error': {'message': f"No route for {method} {path}", 'type': "invalid_request_error"}}
+
+        error_status = self._before_request(operation)
+        if error_status is not None:
+            return operation, error_status, {'error': {'message': f"Injected error for {operation}", 'type': "server_error", 'code': str(error_status)}}
+
+        with self.lock:
+            try:
+                return operation, 200, getattr(self, "_" + operation.replace(".", "_"))(*match.groups(), query=query, body=body, files=files)
+            except KeyError as e:
+                return operation, 404, {'error': {'message': f"Not found: {e}", 'type': "invalid_request_error"}}
+
+    def _assistants_create(self, query, body, files):
+        assistant = {
+            'id': self._new_id("asst"),
+            'object': "assistant",
+            'created_at': self._now(),
+            'name': body.get('name', None),
+            'description': body.get('description', None),
+            'model': body['model'],
+            'instructions': body.get('instructions', None),
+            'tools': body.get('tools', []),
+            'file_ids': body.get('file_ids', []),
+            'metadata': body.get('metadata', {})
+        }
+        self.assistants[assistant['id']] = assistant
+
+        return assistant
+
+    def _assistants_list(self, query, body, files):
+        return self._paginate(sorted(self.assistants.values(), key=lambda assistant: assistant['id']), query)
+
+    def _assistants_retrieve(self, assistant_id, query, body, files):
+        return self.assistants[assistant_id]
+
+    def _assistants_update(self, assistant_id, query, body, files):
+        assistant = self.assistants[assistant_id]
+        for field in ['name', 'description', 'model', 'instructions', 'tools', 'file_ids', 'metadata']:
+            if field in body:
+                assistant[field] = body[field]
+
+        return assistant
+
+    def _assistants_delete(self, assistant_id, query, body, files):
+        del self.assistants[assistant_id]
+
+        return {'id': assistant_id, 'object': "assistant.deleted", 'deleted': True}
+
+    def _assistants_files_create(self, assistant_id, query, body, files):
+        assistant = self.assistants[assistant_id]
+        if body['file_id'] not in self.files:
+            raise KeyError(body['file_id'])
+        assistant['file_ids'].append(body['file_id'])
+
+        return {'id': body['file_id'], 'object': "assistant.file", 'created_at': self._now(), 'assistant_id': assistant_id}
+
+    def _assistants_files_delete(self, assistant_id, file_id, query, body, files):
+        self.assistants[assistant_id]['file_ids'].remove(file_id)
+
+        return {'id': file_id, 'object': "assistant.file.deleted", 'deleted': True}
+
+    def _files_create(self, query, body, files):
+        file_name, file_bytes = files['file']
+        file = {
+            'id': self._new_id("file"),
+            'object': "file",
+            'bytes': len(file_bytes),
+            'created_at': self._now(),
+            'filename': file_name,
+            'purpose': body.get('purpose', "assistants"),
+            'status': "processed",
+            'status_details': None
+        }
+        self.files[file['id']] = file
+
+        return file
+
+    def _files_list(self, query, body, files):
+        return {'object': "list", 'data': list(self.files.values())}
+
+    def _files_retrieve(self, file_id, query, body, files):
+        return self.files[file_id]
+
+    def _files_delete(self, file_id, query, body, files):
+        del self.files[file_id]
+
+        return {'id': file_id, 'object': "file", 'deleted': True}
+
+    def _threads_create(self, query, body, files):
+        thread = {'id': self._new_id("thread"), 'object': "thread", 'created_at': self._now(), 'metadata': body.get('metadata', {})}
+        self.threads[thread['id']] = thread
+        self.messages[thread['id']] = []
+
+        return thread
+
+    def _threads_messages_create(self, thread_id, query, body, files):
+        return self._create_message(thread_id, body['role'], body['content'], body.get('file_ids', []))
+
+    def _threads_messages_list(self, thread_id, query, body, files):
+        return self._paginate(self.messages[thread_id], query)
+
+    def _threads_runs_create(self, thread_id, query, body, files):
+        run = self._create_run(thread_id, body['assistant_id'], body.get('tools', None))
+        if body.get('stream', False):
+            return self.stream_run(run['id'], [("thread.run.created", run)])
+
+        return run
+
+    def _threads_runs_retrieve(self, thread_id, run_id, query, body, files):
+        self._advance_run(run_id)
+
+        return self.runs[run_id]['run']
+
+    def _threads_runs_submit_tool_outputs(self, thread_id, run_id, query, body, files):
+        run_state = self.runs[run_id]
+        run = run_state['run']
+        self._advance_run(run_id)
+        if run['status'] != "requires_action":
+            return {'error': {'message': f"Run {run_id} does not require action", 'type': "invalid_request_error"}}
+
+        tool_call_step = run_state['tool_call_step']
+        tool_outputs = {tool_output['tool_call_id']: tool_output['output'] for tool_output in body['tool_outputs']}
+        for tool_call in tool_call_step['step_details']['tool_calls']:
+            tool_call['function']['output'] = tool_outputs.get(tool_call['id'], None)
+        tool_call_step['status'] = "completed"
+        tool_call_step['completed_at'] = self._now()
+        run_state['tool_outputs'].extend(tool_outputs.values())
+
+        run['status'] = "in_progress"
+        run['required_action'] = None
+        run_state['phase_end'] = time.monotonic() + self.run_time
+        if body.get('stream', False):
+            return self.stream_run(run_id, [("thread.run.step.completed", tool_call_step)])
+
+        return run
+
+    def _threads_runs_cancel(self, thread_id, run_id, query, body, files):
+        run = self.runs[run_id]['run']
+        if run['status'] in ["queued", "in_progress", "requires_action"]:
+            run['status'] = "cancelled"
+            run['cancelled_at'] = self._now()
+
+        return run
+
+    def _threads_runs_steps_list(self, thread_id, run_id, query, body, files):
+        self._advance_run(run_id)
+
+        return self._paginate(self.run_steps[run_id], query)
+
+    def _threads_runs_steps_retrieve(self, thread_id, run_id, step_id, query, body, files):
+        return next(run_step for run_step in self.run_steps[run_id] if run_step['id'] == step_id)
+
+    def _chat_completions_create(self, deployment, query, body, files):
+        prompt = body['messages'][-1]['content']
+        reply_text = self.reply(prompt, [])
+        prompt_tokens = sum(self._count_tokens(str(message['content'])) for message in body['messages'])
+
+        return {
+            'id': self._new_id("chatcmpl"),
+            'object': "chat.completion",
+            'created': self._now(),
+            'model': deployment,
+            'choices': [{'index': 0, 'message': {'role': "assistant", 'content': reply_text}, 'finish_reason': "stop", 'logprobs': None}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': self._count_tokens(reply_text),
+                      'total_tokens': prompt_tokens + self._count_tokens(reply_text)}
+        }
+
+    ROUTES = [(route_method, re.compile(route_path.replace("{id}", "([^/]+)")), operation) for route_method, route_path, operation in [
+        ("POST",   "/openai/assistants",                                    "assistants.create"),
+        ("GET",    "/openai/assistants",                                    "assistants.list"),
+        ("GET",    "/openai/assistants/{id}",                               "assistants.retrieve"),
+        ("POST",   "/openai/assistants/{id}",                               "assistants.update"),
+        ("DELETE", "/openai/assistants/{id}",                               "assistants.delete"),
+        ("POST",   "/openai/assistants/{id}/files",                         "assistants.files.create"),
+        ("DELETE", "/openai/assistants/{id}/files/{id}",                    "assistants.files.delete"),
+        ("POST",   "/openai/files",                                         "files.create"),
+        ("GET",    "/openai/files",                                         "files.list"),
+        ("GET",    "/openai/files/{id}",                                    "files.retrieve"),
+        ("DELETE", "/openai/files/{id}",                                    "files.delete"),
+        ("POST",   "/openai/threads",                                       "threads.create"),
+        ("POST",   "/openai/threads/{id}/messages",                         "threads.messages.create"),
+        ("GET",    "/openai/threads/{id}/messages",                         "threads.messages.list"),
+        ("POST",   "/openai/threads/{id}/runs",                             "threads.runs.create"),
+        ("GET",    "/openai/threads/{id}/runs/{id}",                        "threads.runs.retrieve"),
+        ("POST",   "/openai/threads/{id}/runs/{id}/submit_tool_outputs",    "threads.runs.submit_tool_outputs"),
+        ("POST",   "/openai/threads/{id}/runs/{id}/cancel",                 "threads.runs.cancel"),
+        ("GET",    "/openai/threads/{id}/runs/{id}/steps",                  "threads.runs.steps.list"),
+        ("GET",    "/openai/threads/{id}/runs/{id}/steps/{id}",             "threads.runs.steps.retrieve"),
+        ("POST",   "/openai/deployments/{id}/chat/completions",             "chat.completions.create")
+    ]]
+
+
+class MockAzureOpenAIRequestHandler(BaseHTTPRequestHandler):
+    """Translate HTTP requests to mock operations."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately. Do not let the second write wait for an ACK
+    disable_nagle_algorithm = True
+
+    def _read_body(self):
+        """Parse a JSON or multipart body. Return form fields and uploaded files."""
+        content_length = int(self.headers.get("Content-Length", 0))
+        raw_body = self.rfile.read(content_length) if content_length > 0 else b""
+        content_type = self.headers.get("Content-Type", "")
+
+        if content_type.startswith("multipart/form-data"):
+            multipart_message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                b"Content-Type: " + content_type.encode("utf-8") + b"\r\n\r\n" + raw_body)
+            body, files = {}, {}
+            for part in multipart_message.iter_parts():
+                field_name = part.get_param('name', header='content-disposition')
+                if part.get_filename() is not None:
+                    files[field_name] = (part.get_filename(), part.get_payload(decode=True))
+                else:
+                    body[field_name] = part.get_content()
+            return body, files
+
+        if len(raw_body) == 0:
+            return {}, {}
+
+        return json.loads(raw_body), {}
+
+    def _send_json(self, status, response_body):
+        body = json.dumps(response_body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_events(self, events):
+        """Send events as server-sent events, ending with done."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event_name, event_data in itertools.chain(events, [("done", "[DONE]")]):
+            payload = event_data if isinstance(event_data, str) else json.dumps(event_data)
+            chunk = f"event: {event_name}\ndata: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body, files = self._read_body()
+
+        operation, status, response_body = self.server.mock.handle(self.command, url.path.rstrip("/"), query, body, files)
+        if isinstance(response_body, dict):
+            if status == 200 and 'error' in response_body:
+                status = 400
+            self._send_json(status, response_body)
+        else:
+            self._send_events(response_body)
+
+    do_GET    = _handle
+    do_POST   = _handle
+    do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        """Do not log requests."""
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Azure OpenAI Assistants API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--queue-time", type=float, default=0.0, help="Seconds runs stay queued.")
+    parser.add_argument("--run-time", type=float, default=0.5, help="Seconds runs stay in progress before each action.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with HTTP 500.")
+    parser.add_argument("--tool-calls", default="[]", help='JSON list of tool call batches, e.g. [[{"name": "getItem", "arguments": {"itemId": "1"}}]]')
+    args = parser.parse_args()
+
+    mock_server = MockAzureOpenAIServer(port=args.port, queue_time=args.queue_time, run_time=args.run_time, default_latency=args.latency,
+                                        error_rate=args.error_rate, tool_calls=json.loads(args.tool_calls))
+    print(f"Mock Azure OpenAI listening on {mock_server.url}")
+    mock_server.http_server.serve_forever()
@@ -0,0 +1,31 @@
+"""Tests of the server selection."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from utilities.server_selector import ServerSelector
+
+
+def open_circuit(server_url):
+    for _ in range(ServerSelector.FAILURE_THRESHOLD):
+        ServerSelector.record_failure(server_url, 1.0)
+
+
+def setup_function():
+    ServerSelector._servers.clear()
+
+
+def test_order_skips_open_circuits_while_a_server_is_available():
+    open_circuit("http://a")
+    ServerSelector.record_success("http://b", 0.1)
+
+    assert ServerSelector.order(["http://a", "http://b"]) == ["http://b"]
+
+
+def test_order_returns_open_circuits_when_every_circuit_is_open():
+    open_circuit("http://a")
+    open_circuit("http://b")
+
+    assert ServerSelector.order(["http://a", "http://b"]) == ["http://a", "http://b"]
@@ -0,0 +1,40 @@
+"""Catalog of assistants."""
+
+class AssistantCatalog:
+    """All assistants of the endpoint, indexed by id and name."""
+
+    def __init__(self, assistants):
+        """Build the indexes once per refresh. On duplicated names, the first assistant listed wins."""
+        self.assistants = assistants
+        self.assistants_by_id = {assistant.id: assistant for assistant in assistants}
+        self.assistants_by_name = {}
+        for assistant in assistants:
+            self.assistants_by_name.setdefault(assistant.name, assistant)
+
+    def __len__(self):
+        """Get the number of assistants."""
+        return len(self.assistants)
+
+    def get_by_id(self, assistant_id):
+        """Get an assistant by id."""
+        return self.assistants_by_id.get(assistant_id, None)
+
+    def get_by_name(self, assistant_name):
+        """Get an assistant by name."""
+        return self.assistants_by_name.get(assistant_name, None)
+
+    def has_name(self, assistant_name):
+        """Check if there is an assistant with a name."""
+        return assistant_name in self.assistants_by_name
+
+    def get_names(self):
+        """Get assistant names in listing order."""
+        return [assistant.name for assistant in self.assistants]
+
+    def get_field(self, assistant_name, assistant_field, default=""):
+        """Get a field of the assistant with a name."""
+        assistant = self.get_by_name(assistant_name)
+        if assistant is None:
+            return default
+
+        return getattr(assistant, assistant_field, default)
@@ -0,0 +1,110 @@
+"""Azure OpenAI clients shared across sessions."""
+import threading
+
+import httpx
+from openai import AzureOpenAI
+
+from utilities.traffic_recorder import RecordingTransport, ReplayTransport
+
+class LLMClientRegistry:
+    """The client of the current endpoint, API version and key. All LLM helpers in the process share its HTTP pool.
+
+    A configuration change replaces the client. The replaced one is closed after a grace period,
+    so that requests in flight complete, and the generation tells LLM helpers to switch.
+    """
+
+    # One entry, the current configuration
+    _clients = {}
+    _transports = {}
+    _lock = threading.Lock()
+    generation = 0
+
+    RETIRED_CLIENT_GRACE_PERIOD = 300
+
+    TRAFFIC_MODE_RECORD = "record"
+    TRAFFIC_MODE_REPLAY = "replay"
+
+    @staticmethod
+    def _create_transport(pool_size, traffic_mode, cassette_file, replay_timing_scale):
+        """Create the HTTP transport. Traffic is recorded to or replayed from a cassette if configured."""
+        if traffic_mode == LLMClientRegistry.TRAFFIC_MODE_REPLAY:
+            return ReplayTransport(cassette_file, replay_timing_scale)
+
+        transport = httpx.HTTPTransport(limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size))
+        if traffic_mode == LLMClientRegistry.TRAFFIC_MODE_RECORD:
+            return RecordingTransport(cassette_file, transport)
+
+        return transport
+
+    @staticmethod
+    def _create_client(azure_endpoint, api_version, api_key, pool_size, timeout, connect_timeout, traffic_mode="", cassette_file="", replay_timing_scale=1.0):
+        """Create a client with a bounded keep-alive pool."""
+        transport = LLMClientRegistry._create_transport(pool_size, traffic_mode, cassette_file, replay_timing_scale)
+        http_client = httpx.Client(
+            transport=transport,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout)
+        )
+
+        llm_client = AzureOpenAI(
+            azure_endpoint=azure_endpoint,
+            api_key=api_key,
+            api_version=api_version,
+            http_client=http_client
+        )
+
+        return llm_client, transport
+
+    @staticmethod
+    def get_client(env_helper):
+        """Get the shared client for the configuration of an env helper. Built on first use."""
+        client_key = LLMClientRegistry.get_client_key(env_helper)
+        llm_client = LLMClientRegistry._clients.get(client_key, None)
+        if llm_client is None:
+            with LLMClientRegistry._lock:
+                llm_client = LLMClientRegistry._clients.get(client_key, None)
+                if llm_client is None:
+                    LLMClientRegistry._retire_clients()
+                    llm_client, transport = LLMClientRegistry._create_client(
+                        env_helper.OPENAI_API_BASE,
+                        env_helper.AZURE_OPENAI_API_VERSION,
+                        env_helper.OPENAI_API_KEY,
+                        env_helper.AZURE_OPENAI_HTTP_POOL_SIZE,
+                        env_helper.AZURE_OPENAI_HTTP_TIMEOUT,
+                        env_helper.AZURE_OPENAI_HTTP_CONNECT_TIMEOUT,
+                        env_helper.AZURE_OPENAI_TRAFFIC_MODE,
+                        env_helper.AZURE_OPENAI_CASSETTE_FILE,
+                        env_helper.AZURE_OPENAI_REPLAY_TIMING_SCALE
+                    )
+                    LLMClientRegistry._clients[client_key] = llm_client
+                    LLMClientRegistry._transports[client_key] = transport
+
+        return llm_client
+
+    @staticmethod
+    def _retire_clients():
+        """Drop the clients of previous configurations, closing their connection pools later. Called under the lock."""
+        for llm_client in LLMClientRegistry._clients.values():
+            closing_timer = threading.Timer(LLMClientRegistry.RETIRED_CLIENT_GRACE_PERIOD, llm_client.close)
+            closing_timer.daemon = True
+            closing_timer.start()
+
+        if len(LLMClientRegistry._clients) > 0:
+            LLMClientRegistry.generation += 1
+        LLMClientRegistry._clients.clear()
+        LLMClientRegistry._transports.clear()
+
+    @staticmethod
+    def get_client_key(env_helper):
+        """Get the configuration identifying a client."""
+        return (env_helper.OPENAI_API_BASE, env_helper.AZURE_OPENAI_API_VERSION, env_helper.OPENAI_API_KEY,
+                env_helper.AZURE_OPENAI_TRAFFIC_MODE, env_helper.AZURE_OPENAI_CASSETTE_FILE, env_helper.AZURE_OPENAI_REPLAY_TIMING_SCALE)
+
+    @staticmethod
+    def get_transport(env_helper):
+        """Get the HTTP transport of the client of an env helper, e.g. for recording or replay stats. None if not built."""
+        return LLMClientRegistry._transports.get(LLMClientRegistry.get_client_key(env_helper), None)
+
+    @staticmethod
+    def get_client_count():
+        """Get the number of clients in use. At most one."""
+        return len(LLMClientRegistry._clients)
@@ -8,21 +8,87 @@ class EnvHelper:
 
     ENV_FILE = ".env"
 
+    # Version of the .env file last parsed in the process. Variables stay in os.environ
+    _loaded_env_file_version = None
+
     def __init__(self) -> None:
         """Load ENV."""
         self.load_vars()
 
+    @staticmethod
+    def _get_env_file_version():
+        try:
+            env_file_stat = os.stat(EnvHelper.ENV_FILE)
+            return (env_file_stat.st_mtime_ns, env_file_stat.st_size)
+        except FileNotFoundError:
+            return None
+
     def load_vars(self):
-        load_dotenv(EnvHelper.ENV_FILE, override=True)
+        # Parse .env only if it changed since the last load in the process
+        env_file_version = EnvHelper._get_env_file_version()
+        if env_file_version is None or env_file_version != EnvHelper._loaded_env_file_version:
+            load_dotenv(EnvHelper.ENV_FILE, override=True)
+            EnvHelper._loaded_env_file_version = env_file_version
 
     # Azure OpenAI - TO BE CONFIGURED FROM PAGE
         self.AZURE_OPENAI_RESOURCE_NAME         = os.getenv('AZURE_OPENAI_RESOURCE_NAME', '')
         self.AZURE_OPENAI_KEY                   = os.getenv('AZURE_OPENAI_KEY', '')
         self.AZURE_OPENAI_MODEL_DEPLOYMENT_NAME = os.getenv('AZURE_OPENAI_MODEL_DEPLOYMENT_NAME', '')
         self.AZURE_OPENAI_API_VERSION           = os.getenv('AZURE_OPENAI_API_VERSION', '')
+    # Full endpoint URL. Overrides the resource name, e.g. for a local stand-in server
+        self.AZURE_OPENAI_ENDPOINT              = os.getenv('AZURE_OPENAI_ENDPOINT', '')
+    # Azure OpenAI HTTP connections, shared by all sessions. Timeouts in seconds
+        self.AZURE_OPENAI_HTTP_POOL_SIZE        = int(os.getenv('AZURE_OPENAI_HTTP_POOL_SIZE', '100'))
+        self.AZURE_OPENAI_HTTP_TIMEOUT          = float(os.getenv('AZURE_OPENAI_HTTP_TIMEOUT', '60'))
+        self.AZURE_OPENAI_HTTP_CONNECT_TIMEOUT  = float(os.getenv('AZURE_OPENAI_HTTP_CONNECT_TIMEOUT', '5'))
+    # Traffic capture. '' for none, 'record' or 'replay' of the cassette file. Replay timing 1 is as recorded, 0 immediate
+        self.AZURE_OPENAI_TRAFFIC_MODE          = os.getenv('AZURE_OPENAI_TRAFFIC_MODE', '')
+        self.AZURE_OPENAI_CASSETTE_FILE         = os.getenv('AZURE_OPENAI_CASSETTE_FILE', 'azure_openai_cassette.jsonl.gz')
+        self.AZURE_OPENAI_REPLAY_TIMING_SCALE   = float(os.getenv('AZURE_OPENAI_REPLAY_TIMING_SCALE', '1'))
+
+    # Run execution. 'polling' or 'streaming'. Streaming requires an API version supporting it
+        self.AZURE_OPENAI_RUN_MODE              = os.getenv('AZURE_OPENAI_RUN_MODE', 'polling')
+    # Run time breakdown after each run. One extra run steps call per run, in the background
+        self.RUN_PROFILING_ENABLED              = os.getenv('RUN_PROFILING_ENABLED', 'true').lower() == 'true'
+
+    # User file uploads. Largest file accepted, and bytes a session can upload at once, in MB
+        self.UPLOAD_MAX_FILE_SIZE_MB            = float(os.getenv('UPLOAD_MAX_FILE_SIZE_MB', '512'))
+        self.UPLOAD_SESSION_MAX_IN_FLIGHT_MB    = float(os.getenv('UPLOAD_SESSION_MAX_IN_FLIGHT_MB', '1024'))
+    # Uploaded file contents, reused across sessions. Seconds before a reused file is checked again, age in days
+        self.FILE_HASH_INDEX_FILE               = os.getenv('FILE_HASH_INDEX_FILE', '.file_hash_index.json')
+        self.FILE_HASH_INDEX_VALIDATION_TTL     = float(os.getenv('FILE_HASH_INDEX_VALIDATION_TTL', '300'))
+        self.FILE_HASH_INDEX_MAX_ENTRIES        = int(os.getenv('FILE_HASH_INDEX_MAX_ENTRIES', '10000'))
+        self.FILE_HASH_INDEX_MAX_AGE_DAYS       = float(os.getenv('FILE_HASH_INDEX_MAX_AGE_DAYS', '30'))
+
+    # Threads of each user, resumed after a refresh or restart. An empty file disables it
+        self.THREAD_STORE_FILE                  = os.getenv('THREAD_STORE_FILE', 'thread_store.sqlite3')
+        self.THREAD_STORE_RETENTION_DAYS        = float(os.getenv('THREAD_STORE_RETENTION_DAYS', '30'))
+        self.THREAD_STORE_MAX_THREADS           = int(os.getenv('THREAD_STORE_MAX_THREADS', '10000'))
+
+    # Tool calls. Concurrency limits and timeout in seconds
+        self.TOOL_CALL_SESSION_CONCURRENCY      = int(os.getenv('TOOL_CALL_SESSION_CONCURRENCY', '4'))
+        self.TOOL_CALL_PROCESS_CONCURRENCY      = int(os.getenv('TOOL_CALL_PROCESS_CONCURRENCY', '32'))
+        self.TOOL_CALL_TIMEOUT                  = float(os.getenv('TOOL_CALL_TIMEOUT', '30'))
+
+    # OpenAPI HTTP calls. Connections per host and timeouts in seconds
+        self.OPENAPI_HTTP_POOL_SIZE             = int(os.getenv('OPENAPI_HTTP_POOL_SIZE', '10'))
+        self.OPENAPI_HTTP_KEEP_ALIVE            = os.getenv('OPENAPI_HTTP_KEEP_ALIVE', 'true').lower() == 'true'
+        self.OPENAPI_HTTP_CONNECT_TIMEOUT       = float(os.getenv('OPENAPI_HTTP_CONNECT_TIMEOUT', '3.05'))
+        self.OPENAPI_HTTP_READ_TIMEOUT          = float(os.getenv('OPENAPI_HTTP_READ_TIMEOUT', '20'))
+        self.OPENAPI_HEDGING_ENABLED            = os.getenv('OPENAPI_HEDGING_ENABLED', 'false').lower() == 'true'
+        self.OPENAPI_RESPONSE_CACHE_ENABLED     = os.getenv('OPENAPI_RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+        self.OPENAPI_RESPONSE_CACHE_SIZE        = int(os.getenv('OPENAPI_RESPONSE_CACHE_SIZE', '512'))
+
+    # Metrics. Dump interval in seconds. An empty file or port 0 disables the dump or the endpoint
+        self.METRICS_DUMP_FILE                  = os.getenv('METRICS_DUMP_FILE', '')
+        self.METRICS_DUMP_INTERVAL              = float(os.getenv('METRICS_DUMP_INTERVAL', '60'))
+        self.METRICS_PORT                       = int(os.getenv('METRICS_PORT', '0'))
 
     # Set env for OpenAI SDK
-        self.OPENAI_API_BASE = f"https://{self.AZURE_OPENAI_RESOURCE_NAME}.openai.azure.com/"
+        if self.AZURE_OPENAI_ENDPOINT != '':
+            self.OPENAI_API_BASE = self.AZURE_OPENAI_ENDPOINT
+        else:
+            self.OPENAI_API_BASE = f"https://{self.AZURE_OPENAI_RESOURCE_NAME}.openai.azure.com/"
         self.OPENAI_API_KEY = self.AZURE_OPENAI_KEY
         self.OPENAI_API_VERSION = self.AZURE_OPENAI_API_VERSION
 
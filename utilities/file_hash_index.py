@@ -0,0 +1,131 @@
+"""Index of uploaded file contents."""
+import hashlib
+import json
+import os
+import threading
+import time
+
+class FileHashIndex:
+    """SHA-256 of file contents to the Azure OpenAI file id they were uploaded as. Persisted as JSON.
+
+    Entries are scoped by endpoint, file ids of a resource do not exist in another one.
+    """
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    # Index path -> index. Shared by all sessions in the process
+    _shared_indexes = {}
+    _shared_indexes_lock = threading.Lock()
+
+    def __init__(self, index_path):
+        """Load the index file, if any."""
+        self.index_path = index_path
+        self.lock = threading.Lock()
+        self.entries = {}
+
+        try:
+            with open(index_path, 'r', encoding="utf-8") as file:
+                self.entries = json.load(file)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            # Rebuilt by later uploads
+            self.entries = {}
+
+    @staticmethod
+    def get_shared(index_path):
+        """Get the index of a file, loaded once per process."""
+        index_path = os.path.abspath(index_path)
+        with FileHashIndex._shared_indexes_lock:
+            if index_path not in FileHashIndex._shared_indexes:
+                FileHashIndex._shared_indexes[index_path] = FileHashIndex(index_path)
+            return FileHashIndex._shared_indexes[index_path]
+
+    @staticmethod
+    def hash_file(file_path):
+        """Hash a file on disk without loading it whole."""
+        with open(file_path, 'rb') as file:
+            return FileHashIndex.hash_file_object(file)
+
+    @staticmethod
+    def hash_file_object(file):
+        """Hash a binary file object from its start, one chunk at a time. Left at its start for the upload."""
+        file_hash = hashlib.sha256()
+        file.seek(0)
+        while chunk := file.read(FileHashIndex.HASH_CHUNK_SIZE):
+            file_hash.update(chunk)
+        file.seek(0)
+
+        return file_hash.hexdigest()
+
+    @staticmethod
+    def _get_key(content_hash, scope):
+        return content_hash if scope is None else f"{scope}|{content_hash}"
+
+    def get(self, content_hash, scope=None):
+        """Get the file id of some content. None if it was never uploaded."""
+        entry = self.get_entry(content_hash, scope)
+        return entry['file_id'] if entry is not None else None
+
+    def get_entry(self, content_hash, scope=None):
+        """Get the entry of some content, marked as used. None if it was never uploaded."""
+        with self.lock:
+            entry = self.entries.get(self._get_key(content_hash, scope), None)
+            if entry is None:
+                return None
+            entry['used_at'] = time.time()
+            return dict(entry)
+
+    def set(self, content_hash, file_id, size, scope=None):
+        """Record an upload. Just uploaded, so known to exist."""
+        now = time.time()
+        with self.lock:
+            self.entries[self._get_key(content_hash, scope)] = {'file_id': file_id, 'size': size, 'uploaded_at': now, 'used_at': now, 'validated_at': now}
+
+    def set_validated(self, content_hash, scope=None):
+        """Record that the file of some content still exists."""
+        with self.lock:
+            entry = self.entries.get(self._get_key(content_hash, scope), None)
+            if entry is not None:
+                entry['validated_at'] = time.time()
+
+    def remove(self, content_hash, scope=None):
+        """Drop the entry of some content, e.g. because its file was deleted."""
+        with self.lock:
+            self.entries.pop(self._get_key(content_hash, scope), None)
+
+    def remove_missing(self, existing_file_ids, scope=None):
+        """Drop entries of a scope whose files do not exist anymore. Return the number dropped."""
+        existing_file_ids = set(existing_file_ids)
+        key_prefix = "" if scope is None else f"{scope}|"
+        with self.lock:
+            missing_keys = [key for key, entry in self.entries.items()
+                            if key.startswith(key_prefix) and ("|" in key) == (scope is not None) and entry['file_id'] not in existing_file_ids]
+            for key in missing_keys:
+                del self.entries[key]
+
+        return len(missing_keys)
+
+    def evict(self, max_entries, max_age):
+        """Drop entries unused for max_age seconds, then the least recently used beyond max_entries. Return the number dropped."""
+        oldest_used_at = time.time() - max_age
+        with self.lock:
+            evicted_keys = [key for key, entry in self.entries.items() if entry.get('used_at', entry['uploaded_at']) < oldest_used_at]
+            for key in evicted_keys:
+                del self.entries[key]
+
+            if len(self.entries) > max_entries:
+                least_recently_used_keys = sorted(self.entries, key=lambda key: self.entries[key].get('used_at', self.entries[key]['uploaded_at']))
+                for key in least_recently_used_keys[:len(self.entries) - max_entries]:
+                    del self.entries[key]
+                    evicted_keys.append(key)
+
+        return len(evicted_keys)
+
+    def save(self):
+        """Write the index. Replaced atomically, so readers never see a partial file."""
+        with self.lock:
+            temporary_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary_path, 'w', encoding="utf-8") as file:
+                json.dump(self.entries, file)
+            os.replace(temporary_path, self.index_path)
@@ -0,0 +1,71 @@
+"""Health of the Azure OpenAI endpoint and deployment."""
+import threading
+import time
+
+from utilities.observability_helper import ObservabilityHelper
+
+class HealthHelper:
+    """Cheap endpoint probes. Results are shared by all sessions and refreshed in the background."""
+
+    STATUS_TTL = 15
+
+    # (client key, deployment) -> last status
+    _statuses = {}
+    _refreshing = set()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def probe(llm_client, deployment=None):
+        """Check the endpoint with a lightweight call, and the deployment, if any, with a completion of one token."""
+        start_time = time.monotonic()
+        try:
+            llm_client.beta.assistants.list(limit=1)
+            if deployment is not None:
+                # A mistyped deployment fails here only
+                llm_client.chat.completions.create(model=deployment, messages=[{"role": "user", "content": "ping"}], max_tokens=1)
+            status = {'ok': True, 'error': None}
+        except Exception as e:
+            status = {'ok': False, 'error': str(e)}
+        status['latency'] = time.monotonic() - start_time
+        status['checked_at'] = time.time()
+
+        return status
+
+    @staticmethod
+    def _refresh(status_key, llm_client):
+        """Probe and store the result."""
+        try:
+            status = HealthHelper.probe(llm_client, status_key[1])
+            with HealthHelper._lock:
+                HealthHelper._statuses[status_key] = status
+            if not status['ok']:
+                ObservabilityHelper().log(f"HEALTH HELPER - Endpoint check failed: {status['error']}", True)
+        finally:
+            with HealthHelper._lock:
+                HealthHelper._refreshing.discard(status_key)
+
+    @staticmethod
+    def get_status(client_key, llm_client, refresh=False, deployment=None):
+        """Get the status of the endpoint and deployment. Stale results are returned while a background thread refreshes them.
+
+        Only the first check of a client and deployment, or a forced refresh, waits for the probe.
+        """
+        status_key = (client_key, deployment)
+        with HealthHelper._lock:
+            status = HealthHelper._statuses.get(status_key, None)
+
+        if status is None or refresh:
+            with HealthHelper._lock:
+                HealthHelper._refreshing.add(status_key)
+            HealthHelper._refresh(status_key, llm_client)
+            with HealthHelper._lock:
+                return HealthHelper._statuses[status_key]
+
+        if time.time() - status['checked_at'] > HealthHelper.STATUS_TTL:
+            with HealthHelper._lock:
+                start_refresh = status_key not in HealthHelper._refreshing
+                HealthHelper._refreshing.add(status_key)
+            if start_refresh:
+                threading.Thread(target=HealthHelper._refresh, args=(status_key, llm_client), daemon=True, name="health_refresh").start()
+
+        return status
@@ -0,0 +1,125 @@
+"""Pooled HTTP sessions for calls to OpenAPI servers."""
+import atexit
+import http.cookiejar
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utilities.env_helper import EnvHelper
+from utilities.metrics_helper import MetricsHelper
+
+class HTTPHelper:
+    """Keep-alive sessions, one per host, shared by all sessions in the process."""
+
+    _sessions = {}
+    _request_counts = {}
+    _lock = threading.Lock()
+    _config = None
+    _close_registered = False
+
+    @staticmethod
+    def _get_config():
+        """Load pool and timeout configuration once."""
+        if HTTPHelper._config is None:
+            env_helper = EnvHelper()
+            HTTPHelper._config = {
+                'pool_size': env_helper.OPENAPI_HTTP_POOL_SIZE,
+                'keep_alive': env_helper.OPENAPI_HTTP_KEEP_ALIVE,
+                'timeout': (env_helper.OPENAPI_HTTP_CONNECT_TIMEOUT, env_helper.OPENAPI_HTTP_READ_TIMEOUT)
+            }
+
+        return HTTPHelper._config
+
+    @staticmethod
+    def _get_host(url):
+        url_parts = urlsplit(url)
+        return f"{url_parts.scheme}://{url_parts.netloc}"
+
+    @staticmethod
+    def _create_session():
+        """Create a session with a connection pool."""
+        config = HTTPHelper._get_config()
+        session = requests.Session()
+        # Shared by all users. Cookies set for one must not be sent with the calls of others
+        session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        # Retries are handled by the caller across servers
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config['pool_size'], max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not config['keep_alive']:
+            session.headers['Connection'] = 'close'
+
+        return session
+
+    @staticmethod
+    def get_session(url):
+        """Get the shared session for the host of a URL."""
+        host = HTTPHelper._get_host(url)
+        session = HTTPHelper._sessions.get(host, None)
+        if session is None:
+            with HTTPHelper._lock:
+                session = HTTPHelper._sessions.get(host, None)
+                if session is None:
+                    session = HTTPHelper._create_session()
+                    HTTPHelper._sessions[host] = session
+                    if not HTTPHelper._close_registered:
+                        HTTPHelper._close_registered = True
+                        atexit.register(HTTPHelper.close_all)
+
+        return session
+
+    @staticmethod
+    def request(method, url, deadline=None, **kwargs):
+        """Send a request through the pooled session of the host. Timeouts apply unless given.
+
+        With a deadline, in time.monotonic() seconds, they are shortened so that the request ends by then.
+        """
+        session = HTTPHelper.get_session(url)
+        kwargs.setdefault('timeout', HTTPHelper._get_config()['timeout'])
+        if deadline is not None:
+            remaining_time = max(0.001, deadline - time.monotonic())
+            kwargs['timeout'] = tuple(min(timeout, remaining_time) for timeout in kwargs['timeout'])
+        host = HTTPHelper._get_host(url)
+        with HTTPHelper._lock:
+            # The session can be closed meanwhile. Its counts start again
+            HTTPHelper._request_counts[host] = HTTPHelper._request_counts.get(host, 0) + 1
+
+        return session.request(method, url, **kwargs)
+
+    @staticmethod
+    def get_stats():
+        """Get requests and connections open per host. Estimated reuse = requests minus open connections, closed ones are not counted."""
+        stats = {}
+        with HTTPHelper._lock:
+            sessions = list(HTTPHelper._sessions.items())
+            request_counts = dict(HTTPHelper._request_counts)
+
+        for host, session in sessions:
+            adapter = session.get_adapter(host)
+            connection_pools = adapter.poolmanager.pools
+            with connection_pools.lock:
+                pool_list = [connection_pools[key] for key in connection_pools.keys()]
+            connections = sum(pool.num_connections for pool in pool_list)
+            request_count = request_counts.get(host, 0)
+            stats[host] = {
+                'requests': request_count,
+                'connections': connections,
+                'estimated_reused': max(0, request_count - connections)
+            }
+
+        return stats
+
+    @staticmethod
+    def close_all():
+        """Close all sessions. Called at exit and when the servers go away, e.g. after a benchmark."""
+        with HTTPHelper._lock:
+            for session in HTTPHelper._sessions.values():
+                session.close()
+            HTTPHelper._sessions = {}
+            HTTPHelper._request_counts = {}
+
+
+MetricsHelper.register_stats("http", HTTPHelper.get_stats, label="host")
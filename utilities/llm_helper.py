@@ -1,13 +1,20 @@
 """Module managing LLM interaction."""
 import json
-import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import openai
 from openai import AzureOpenAI
-from openai.pagination import SyncCursorPage
-from openai.types.beta.assistant import ToolFunction
-from openai.types.beta.assistant import ToolCodeInterpreter
+from openai.types.beta import FunctionTool
+from openai.types.beta import CodeInterpreterTool
 
+from utilities.assistant_catalog import AssistantCatalog
+from utilities.cache_helper import CacheHelper
+from utilities.client_registry import LLMClientRegistry
 from utilities.env_helper   import EnvHelper
+from utilities.file_hash_index import FileHashIndex
+from utilities.health_helper import HealthHelper
+from utilities.metrics_helper import MetricsHelper
 from utilities.observability_helper import ObservabilityHelper
 
 class LLMHelper:
@@ -15,33 +22,111 @@ class LLMHelper:
 
     conversation_starter_prefix = "conversation_starter_"
 
+    # Shared by all sessions in the process. Mutating methods keep it coherent
+    ASSISTANT_CACHE_TTL = 30
+    ASSISTANT_CACHE_MAX_SIZE = 256
+    ASSISTANT_CATALOG_CACHE_KEY = "assistant_catalog"
+    ASSISTANT_PAGE_SIZE = 100
+    MESSAGE_PAGE_SIZE = 100
+    RUN_STEP_PAGE_SIZE = 100
+    assistant_cache = CacheHelper(max_size=ASSISTANT_CACHE_MAX_SIZE, ttl=ASSISTANT_CACHE_TTL)
+    # Own slot, so that listing many assistants into the assistant cache cannot evict it
+    catalog_cache = CacheHelper(max_size=1, ttl=ASSISTANT_CACHE_TTL)
+    # File metadata only changes with processing status. Files missing from it are retrieved concurrently,
+    # or with a single list call when there are many
+    FILE_CACHE_TTL = 300
+    FILE_CACHE_MAX_SIZE = 4096
+    FILE_RETRIEVE_CONCURRENCY = 8
+    file_cache = CacheHelper(max_size=FILE_CACHE_MAX_SIZE, ttl=FILE_CACHE_TTL)
+    # (endpoint, content hash) -> event set when its upload ends. Uploads of the same content wait
+    # for each other instead of uploading it twice. Other uploads never wait
+    pending_uploads = {}
+    pending_uploads_lock = threading.Lock()
+
     def __init__(self):
         """Initialize the LLM Helper."""
         self.env_helper = EnvHelper()
         self.observability_helper = ObservabilityHelper()
-        self.llm_client = AzureOpenAI(
-            azure_endpoint=self.env_helper.OPENAI_API_BASE,
-            api_key=self.env_helper.OPENAI_API_KEY,
-            api_version=self.env_helper.AZURE_OPENAI_API_VERSION
-        )
+        self._llm_client = LLMClientRegistry.get_client(self.env_helper)
+        self.llm_client_generation = LLMClientRegistry.generation
+        self.llm_client_key = LLMClientRegistry.get_client_key(self.env_helper)
         self.openai_deployment = self.env_helper.AZURE_OPENAI_MODEL_DEPLOYMENT_NAME
         self.verbose = True
 
     def update_env_related_attributes(self):
-        self.env_helper = EnvHelper()
-
-        self.llm_client = AzureOpenAI(
-            azure_endpoint=self.env_helper.OPENAI_API_BASE,
-            api_key=self.env_helper.OPENAI_API_KEY,
-            api_version=self.env_helper.AZURE_OPENAI_API_VERSION
-        )
+        self.env_helper.load_vars()
         self.openai_deployment = self.env_helper.AZURE_OPENAI_MODEL_DEPLOYMENT_NAME
 
+        client_key = LLMClientRegistry.get_client_key(self.env_helper)
+        if client_key != self.llm_client_key or self.llm_client_generation != LLMClientRegistry.generation:
+            # Single assignment. Requests in flight keep the previous client until it is closed
+            self._llm_client = LLMClientRegistry.get_client(self.env_helper)
+            self.llm_client_generation = LLMClientRegistry.generation
+            self.llm_client_key = client_key
+            # A new endpoint has different assistants and files
+            LLMHelper.assistant_cache.clear()
+            LLMHelper.catalog_cache.clear()
+            LLMHelper.file_cache.clear()
+
+    @property
+    def llm_client(self):
+        """The shared client. Switches to the new one when another session changed the configuration."""
+        if self.llm_client_generation != LLMClientRegistry.generation:
+            self.update_env_related_attributes()
+
+        return self._llm_client
+
+    @staticmethod
+    def _assistant_cache_key(assistant_id):
+        return ("assistant", assistant_id)
+
+    def _cache_assistant(self, assistant):
+        """Write an updated assistant through to the cache. The list is refreshed on next read."""
+        LLMHelper.assistant_cache.set(self._assistant_cache_key(assistant.id), assistant)
+        LLMHelper.catalog_cache.invalidate(LLMHelper.ASSISTANT_CATALOG_CACHE_KEY)
+
+    def _invalidate_assistant(self, assistant_id):
+        """Drop an assistant from the cache."""
+        LLMHelper.assistant_cache.invalidate(self._assistant_cache_key(assistant_id))
+        LLMHelper.catalog_cache.invalidate(LLMHelper.ASSISTANT_CATALOG_CACHE_KEY)
+
+    @staticmethod
+    def _file_cache_key(file_id):
+        return ("file", file_id)
+
+    @staticmethod
+    def _list_all_pages(list_function, limit, **list_args):
+        """Get the items of all pages of a cursor paginated list.
+
+        Follows has_more. Iterating the SDK page would request one more, empty, page after the last one.
+        """
+        items = []
+        while True:
+            page = list_function(limit=limit, **list_args)
+            items.extend(page.data)
+            has_more = getattr(page, 'has_more', None)
+            if has_more is None:
+                # Not in the response. A full page may have more
+                has_more = len(page.data) >= limit
+            if not has_more or len(page.data) == 0:
+                return items
+            list_args['after'] = page.data[-1].id
+
+    def _timed(self, operation, assistant_id=None):
+        """Time an Azure OpenAI call in the process metrics."""
+        return MetricsHelper.timed(operation, assistant_id=assistant_id)
+
+    @staticmethod
+    def get_assistant_cache_stats():
+        """Get hit and miss counters of the assistant and catalog caches, by cache."""
+        return {
+            'assistant': LLMHelper.assistant_cache.get_stats(),
+            'catalog': LLMHelper.catalog_cache.get_stats()
+        }
+
     def is_duplicated_assistant(self, new_assistant_name):
         """Check if the assistant is duplicated."""
-        existing_assistant_names = [assistant.name for assistant in self.get_assistants()]
-
-        return new_assistant_name in existing_assistant_names
+        return self.get_assistant_catalog().has_name(new_assistant_name)
 
     def create_assistant(self, assistant_name, assistant_description, assistant_instructions):
         """Crate assistants. Public."""
@@ -49,13 +134,15 @@ class LLMHelper:
 
     def _create_assistant(self, assistant_name: str, description: str, instructions: str, tools: list):
         """Crate assistants. Private."""
-        assistant = self.llm_client.beta.assistants.create(
-            name=assistant_name,
-            description=description,
-            instructions=instructions,
-            tools=tools,
-            model=self.openai_deployment
-        )
+        with self._timed("assistants.create"):
+            assistant = self.llm_client.beta.assistants.create(
+                name=assistant_name,
+                description=description,
+                instructions=instructions,
+                tools=tools,
+                model=self.openai_deployment
+            )
+        self._cache_assistant(assistant)
 
         return assistant
 
@@ -95,9 +182,12 @@ class LLMHelper:
 
     def create_assistant_file(self, assistant_id, file_id):
         """Upload the file to OpenAI."""
-        file_upload_to_assistant_response = self.llm_client.beta.assistants.files.create(
-            assistant_id, file_id=file_id
-        )
+        with self._timed("assistants.files.create", assistant_id):
+            file_upload_to_assistant_response = self.llm_client.beta.assistants.files.create(
+                assistant_id, file_id=file_id
+            )
+
+        self._invalidate_assistant(assistant_id)
 
         if file_upload_to_assistant_response.id is not None:
             self.observability_helper.log("LLM HELPER - Uploading file to assistant OK", self.verbose)
@@ -106,14 +196,34 @@ class LLMHelper:
         self.observability_helper.log("LLM HELPER - Uploading file to assistant failed", self.verbose)
         return False
 
-    def get_assistants(self):
-        """List Assistants."""
+    def get_assistant_catalog(self):
+        """Get all assistants indexed by id and name. None if the endpoint does not respond."""
+        assistant_catalog = LLMHelper.catalog_cache.get(LLMHelper.ASSISTANT_CATALOG_CACHE_KEY)
+        if assistant_catalog is not None:
+            return assistant_catalog
+
         try:
-            assistant_list = self.llm_client.beta.assistants.list().data
-            return assistant_list
+            with self._timed("assistants.list"):
+                assistant_list = self._list_all_pages(self.llm_client.beta.assistants.list, LLMHelper.ASSISTANT_PAGE_SIZE)
         except:
             return None
 
+        assistant_catalog = AssistantCatalog(assistant_list)
+        LLMHelper.catalog_cache.set(LLMHelper.ASSISTANT_CATALOG_CACHE_KEY, assistant_catalog)
+        # Listed assistants are complete objects. Later retrieves are not needed
+        for assistant in assistant_list:
+            LLMHelper.assistant_cache.set(self._assistant_cache_key(assistant.id), assistant)
+
+        return assistant_catalog
+
+    def get_assistants(self):
+        """List Assistants."""
+        assistant_catalog = self.get_assistant_catalog()
+        if assistant_catalog is None:
+            return None
+
+        return assistant_catalog.assistants
+
     def get_assistant_files(self, assistant_id):
         """List Assistants files."""
         assistant_list = self.llm_client.beta.assistants.files(assistant_id)
@@ -122,7 +232,13 @@ class LLMHelper:
 
     def get_assistant(self, assistant_id):
         """Get Assistants."""
-        assistant = self.llm_client.beta.assistants.retrieve(assistant_id)
+        assistant = LLMHelper.assistant_cache.get(self._assistant_cache_key(assistant_id))
+        if assistant is not None:
+            return assistant
+
+        with self._timed("assistants.retrieve", assistant_id):
+            assistant = self.llm_client.beta.assistants.retrieve(assistant_id)
+        LLMHelper.assistant_cache.set(self._assistant_cache_key(assistant_id), assistant)
         return assistant
 
     def get_assistant_file(self, assistant_id, file_id):
@@ -131,20 +247,24 @@ class LLMHelper:
 
     def modify_assistant_metadata(self, assistant_id, assistant_medatata):
         """Modify assistant medatata."""
-        self.observability_helper.log(f"LLM HELPER - For assistant {assistant_id}, update conv starter {assistant_medatata}", self.verbose)
+        self.observability_helper.log("LLM HELPER - For assistant %s, update conv starter %s", self.verbose, assistant_id, assistant_medatata)
 
-        self.llm_client.beta.assistants.update(
-            assistant_id,
-            metadata=assistant_medatata
-        )
+        with self._timed("assistants.update", assistant_id):
+            assistant = self.llm_client.beta.assistants.update(
+                assistant_id,
+                metadata=assistant_medatata
+            )
+        self._cache_assistant(assistant)
 
     def delete_assistant(self, assistant_id):
         """Delete assistant."""
         try:
             self.observability_helper.log(f"LLM HELPER - Deleting assistant {assistant_id}", self.verbose)
-            self.llm_client.beta.assistants.delete(assistant_id)
+            with self._timed("assistants.delete", assistant_id):
+                self.llm_client.beta.assistants.delete(assistant_id)
         except openai.NotFoundError:
             self.observability_helper.log(f"LLM HELPER - Assistant {assistant_id} does not exist", self.verbose)
+        self._invalidate_assistant(assistant_id)
 
     def delete_assistant_file(self, assistant_id, file_id):
         """To be done."""
@@ -152,7 +272,8 @@ class LLMHelper:
 
     def create_assistant_thread(self):
         """Create Assistant Thread."""
-        thread = self.llm_client.beta.threads.create()
+        with self._timed("threads.create"):
+            thread = self.llm_client.beta.threads.create()
 
         return thread.id
 
@@ -170,18 +291,20 @@ class LLMHelper:
 
     def add_message_to_assistant_thread(self, thread_id, message_role, message_content, file_ids):
         """Add message to Assistant thread."""
-        self.observability_helper.log(f"LLM HELPER - Message, content: {message_content} role: {message_role} to thread {thread_id}, file ids:  {file_ids}", self.verbose)
-
-        self.llm_client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role=message_role,
-            content=message_content,
-            file_ids=file_ids
-        )
+        self.observability_helper.log("LLM HELPER - Message, content: %s role: %s to thread %s, file ids:  %s", self.verbose, message_content, message_role, thread_id, file_ids)
+
+        with self._timed("threads.messages.create"):
+            self.llm_client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role=message_role,
+                content=message_content,
+                file_ids=file_ids
+            )
 
     def get_messages_in_assistant_thread(self, thread_id):
         """List messages in thread."""
-        messages = self.llm_client.beta.threads.messages.list(thread_id=thread_id)
+        with self._timed("threads.messages.list"):
+            messages = self.llm_client.beta.threads.messages.list(thread_id=thread_id)
 
         return messages
 
@@ -206,15 +329,32 @@ class LLMHelper:
         assistant_data  = self.get_assistant(assistant_id)
         assistant_tools = self._tools_to_json(assistant_data.tools)
 
-        run = self.llm_client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=assistant_id,
-            #instructions=run_instructions, #Mind this would override Assistant instructions. use carefully. Need to change the method signature
-            tools=assistant_tools
-        )
+        with self._timed("threads.runs.create", assistant_id):
+            run = self.llm_client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                #instructions=run_instructions, #Mind this would override Assistant instructions. use carefully. Need to change the method signature
+                tools=assistant_tools
+            )
 
         return run
 
+    def create_assistant_thread_run_stream(self, thread_id, assistant_id):
+        """Run Assistant streaming run events."""
+        assistant_data  = self.get_assistant(assistant_id)
+        assistant_tools = self._tools_to_json(assistant_data.tools)
+
+        # Time to the stream opening. The events are timed by the consumer
+        with self._timed("threads.runs.create_stream", assistant_id):
+            run_stream = self.llm_client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                tools=assistant_tools,
+                stream=True
+            )
+
+        return run_stream
+
     def create_assistant_thread_run_and_run_it(self, metadata):
         """To be done."""
         return None
@@ -224,21 +364,33 @@ class LLMHelper:
         return None
 
     def get_assistant_thread_run_steps(self, thread_id, run_id):
-        """To be done."""
-        return None
+        """Get the steps of a thread run, oldest first. All pages."""
+        with self._timed("threads.runs.steps.list"):
+            run_steps = self._list_all_pages(self.llm_client.beta.threads.runs.steps.list, LLMHelper.RUN_STEP_PAGE_SIZE,
+                                             run_id=run_id, thread_id=thread_id, order="asc")
+
+        return run_steps
 
     def get_assistant_thread_run(self, thread_id, run_id):
         """Create Thread run."""
-        run = self.llm_client.beta.threads.runs.retrieve(
-            thread_id=thread_id,
-            run_id=run_id
-        )
+        with self._timed("threads.runs.retrieve"):
+            run = self.llm_client.beta.threads.runs.retrieve(
+                thread_id=thread_id,
+                run_id=run_id
+            )
 
         return run
 
     def get_assistant_thread_run_step(self, thread_id, run_id, step_id):
-        """To be done."""
-        return None
+        """Get a step of a thread run."""
+        with self._timed("threads.runs.steps.retrieve"):
+            run_step = self.llm_client.beta.threads.runs.steps.retrieve(
+                step_id,
+                thread_id=thread_id,
+                run_id=run_id
+            )
+
+        return run_step
 
     def modify_assistant_thread_run(self, thread_id, run_id, metadata):
         """To be done."""
@@ -246,36 +398,62 @@ class LLMHelper:
 
     def submit_tool_outputs_to_assistant_thread_run(self, thread_id, run_id, tool_output_list):
         """Submit tool output to thread run."""
-        self.llm_client.beta.threads.runs.submit_tool_outputs(
-            thread_id=thread_id,
-            run_id=run_id,
-            tool_outputs=tool_output_list
-            )
+        with self._timed("threads.runs.submit_tool_outputs"):
+            self.llm_client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread_id,
+                run_id=run_id,
+                tool_outputs=tool_output_list
+                )
+
+    def submit_tool_outputs_to_assistant_thread_run_stream(self, thread_id, run_id, tool_output_list):
+        """Submit tool output to thread run streaming the resumed run events."""
+        with self._timed("threads.runs.submit_tool_outputs_stream"):
+            run_stream = self.llm_client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread_id,
+                run_id=run_id,
+                tool_outputs=tool_output_list,
+                stream=True
+                )
+
+        return run_stream
 
     def cancel_assistant_thread_runs(self, thread_id, run_id):
-        """To be done."""
-        return None
+        """Cancel thread run."""
+        try:
+            with self._timed("threads.runs.cancel"):
+                run = self.llm_client.beta.threads.runs.cancel(
+                    thread_id=thread_id,
+                    run_id=run_id
+                )
+            return run
+        except openai.APIStatusError as e:
+            self.observability_helper.log(f"LLM HELPER - Cancelling run {run_id} failed with status {e.status_code}", self.verbose)
+            return None
 
-    def get_assistant_thread_messages(self, thread_id):
-        """Get assistant thread messages."""
+    def get_assistant_thread_messages(self, thread_id, after=None, order="desc"):
+        """Get assistant thread messages. All pages, only those after a message id if given."""
+        list_args = {'thread_id': thread_id, 'order': order}
+        if after is not None:
+            list_args['after'] = after
         try:
-            messages = self.llm_client.beta.threads.messages.list(thread_id=thread_id)
-            if isinstance(messages, SyncCursorPage):
-                return messages.data
-            else:
-                return messages
+            with self._timed("threads.messages.list"):
+                return self._list_all_pages(self.llm_client.beta.threads.messages.list, LLMHelper.MESSAGE_PAGE_SIZE, **list_args)
         except Exception:
             return []
 
 # INSTRUCTIONS
     def update_assistant_instructions(self, assistant_id, updated_instructions):
         """Update instructions."""
-        self.llm_client.beta.assistants.update(assistant_id, instructions=updated_instructions)
+        with self._timed("assistants.update", assistant_id):
+            assistant = self.llm_client.beta.assistants.update(assistant_id, instructions=updated_instructions)
+        self._cache_assistant(assistant)
 
 # DESCRIPTION
     def update_assistant_description(self, assistant_id, updated_description):
         """Update description."""
-        self.llm_client.beta.assistants.update(assistant_id, description=updated_description)
+        with self._timed("assistants.update", assistant_id):
+            assistant = self.llm_client.beta.assistants.update(assistant_id, description=updated_description)
+        self._cache_assistant(assistant)
 
 # FUNCTIONS
     def _tools_to_json(self, assistant_tools):
@@ -311,9 +489,22 @@ class LLMHelper:
         new_tool = {"type": "function", "function": new_function_data}
         existing_assistant_tools.append(new_tool)
 
-        self.observability_helper.log(f"LLM HELPER - Adding a tool {new_tool['function']} to assistant {assistant_id}", self.verbose)
+        self.observability_helper.log("LLM HELPER - Adding a tool %s to assistant %s", self.verbose, new_tool['function'], assistant_id)
         self.update_assistant_tools(assistant_id, existing_assistant_tools)
 
+    def upsert_assistant_functions(self, assistant_id, new_function_data_list):
+        """Create or update several assistant functions with a single update."""
+        assistant_data  = self.get_assistant(assistant_id)
+        assistant_tools = self._tools_to_json(assistant_data.tools)
+
+        # Functions replaced by name. Other tools are kept
+        new_function_names = {new_function_data['name'] for new_function_data in new_function_data_list}
+        updated_tools = [tool for tool in assistant_tools if tool['type'] != "function" or tool['function']['name'] not in new_function_names]
+        updated_tools.extend({"type": "function", "function": new_function_data} for new_function_data in new_function_data_list)
+
+        self.observability_helper.log("LLM HELPER - Upserting functions %s in assistant %s", self.verbose, new_function_names, assistant_id)
+        self.update_assistant_tools(assistant_id, updated_tools)
+
     def update_assistant_function(self, assistant_id, updated_function_json):
         """Update assistant function."""
         assistant_data  = self.get_assistant(assistant_id)
@@ -325,9 +516,8 @@ class LLMHelper:
         updated_tool = {"type": "function", "function": updated_function_json}
         existing_tools.append(updated_tool)
 
-        existing_tool_names = [tool['function']['name'] for tool in existing_tools]
-
-        self.observability_helper.log(f"LLM HELPER - Adding a tool {updated_tool['function']} to assistant {assistant_id} with tools {existing_tool_names}", self.verbose)
+        self.observability_helper.log(lambda: f"LLM HELPER - Adding a tool {updated_tool['function']} to assistant {assistant_id} with tools {[tool['function']['name'] for tool in existing_tools]}",
+                                      self.verbose)
         self.update_assistant_tools(assistant_id, existing_tools)
 
     def update_assistant_code_interpreter_tool(self, assistant_id, is_code_interpreter_enabled):
@@ -342,7 +532,9 @@ class LLMHelper:
 
     def update_assistant_tools(self, assistant_id, assistant_tools):
         """Update assistant tools."""
-        self.llm_client.beta.assistants.update(assistant_id, tools=assistant_tools)
+        with self._timed("assistants.update", assistant_id):
+            assistant = self.llm_client.beta.assistants.update(assistant_id, tools=assistant_tools)
+        self._cache_assistant(assistant)
 
     def is_duplicated_function(self, assistant_id, new_function_body):
         """Check if an assistant is duplicated."""
@@ -353,22 +545,95 @@ class LLMHelper:
         return new_function_name in assistant_function_names
 
 # FILES
-    def upload_file(self, file_byte_data):
-        """Upload the file to OpenAI."""
-        file_upload_response = self.llm_client.files.create(
-            file=io.BytesIO(file_byte_data),
-            purpose='assistants'
-        )
+    def upload_file(self, file_data, file_name=None):
+        """Upload the file to OpenAI. Bytes or a binary file object, streamed in chunks without a copy."""
+        with self._timed("files.create"):
+            file_upload_response = self.llm_client.files.create(
+                file=(file_name, file_data) if file_name is not None else file_data,
+                purpose='assistants'
+            )
         if file_upload_response.status == 'processed':
+            LLMHelper.file_cache.set(self._file_cache_key(file_upload_response.id), file_upload_response)
             return True, file_upload_response.id
         else:
             self.observability_helper.log(f"LLM HELPER - Uploading failed with status {file_upload_response.status}", self.verbose)
             return False, None
 
+    def _get_file_hash_index(self):
+        return FileHashIndex.get_shared(self.env_helper.FILE_HASH_INDEX_FILE)
+
+    def _save_file_hash_index(self):
+        """Evict stale entries and persist the index. Not persisting only costs later uploads."""
+        file_hash_index = self._get_file_hash_index()
+        file_hash_index.evict(self.env_helper.FILE_HASH_INDEX_MAX_ENTRIES, self.env_helper.FILE_HASH_INDEX_MAX_AGE_DAYS * 24 * 3600)
+        try:
+            file_hash_index.save()
+        except OSError as e:
+            self.observability_helper.log(f"LLM HELPER - File hash index not saved: {e}", self.verbose, level="WARNING")
+
+    def get_uploaded_file_id(self, content_hash):
+        """Get the id of a file uploaded before with the same content. None if there is none or it does not exist anymore."""
+        file_hash_index = self._get_file_hash_index()
+        scope = self.env_helper.OPENAI_API_BASE
+        entry = file_hash_index.get_entry(content_hash, scope)
+        if entry is None:
+            return None
+
+        if time.time() - entry.get('validated_at', 0) > self.env_helper.FILE_HASH_INDEX_VALIDATION_TTL:
+            try:
+                file = self.get_file(entry['file_id'])
+            except openai.NotFoundError:
+                file = None
+            except openai.APIError as e:
+                # Not known to exist. Uploaded again
+                self.observability_helper.log(f"LLM HELPER - File {entry['file_id']} not validated: {e}", self.verbose, level="WARNING")
+                return None
+
+            if file is None or file.status in ['error', 'deleted']:
+                self.observability_helper.log(f"LLM HELPER - File {entry['file_id']} does not exist anymore. Dropped from the index", self.verbose)
+                file_hash_index.remove(content_hash, scope)
+                LLMHelper.file_cache.invalidate(self._file_cache_key(entry['file_id']))
+                self._save_file_hash_index()
+                return None
+            file_hash_index.set_validated(content_hash, scope)
+
+        return entry['file_id']
+
+    def upload_file_once(self, file, file_name=None, file_size=None):
+        """Upload a binary file object unless a file with the same content exists. Return success and file id."""
+        content_hash = FileHashIndex.hash_file_object(file)
+        pending_upload_key = (self.env_helper.OPENAI_API_BASE, content_hash)
+        while True:
+            with LLMHelper.pending_uploads_lock:
+                upload_done = LLMHelper.pending_uploads.get(pending_upload_key, None)
+                if upload_done is None:
+                    upload_done = threading.Event()
+                    LLMHelper.pending_uploads[pending_upload_key] = upload_done
+                    break
+            # Reused once uploaded, or uploaded here if that upload failed
+            upload_done.wait()
+
+        try:
+            file_id = self.get_uploaded_file_id(content_hash)
+            if file_id is not None:
+                self.observability_helper.log(f"LLM HELPER - Same content already uploaded as file {file_id}. Reused", self.verbose)
+                return True, file_id
+
+            upload_success, file_id = self.upload_file(file, file_name=file_name)
+            if upload_success:
+                self._get_file_hash_index().set(content_hash, file_id, file_size, self.env_helper.OPENAI_API_BASE)
+                self._save_file_hash_index()
+        finally:
+            with LLMHelper.pending_uploads_lock:
+                del LLMHelper.pending_uploads[pending_upload_key]
+            upload_done.set()
+
+        return upload_success, file_id
+
     def delete_all_files(self):
         """Delete all files."""
         print("Listing assistants")
-        for assistant_data in self.llm_client.beta.assistants.list().data:
+        for assistant_data in self._list_all_pages(self.llm_client.beta.assistants.list, LLMHelper.ASSISTANT_PAGE_SIZE):
             if len(assistant_data.file_ids) == 0:
                 print(f"Assistant {assistant_data.name} with id {assistant_data.id} has no files ")
             else:
@@ -377,68 +642,103 @@ class LLMHelper:
                     self.llm_client.beta.assistants.files.delete(file_id, assistant_id=assistant_data.id, )
                     print(f"Deleting file {file_id} for Assistant {assistant_data.name} with id {assistant_data.id} ")
 
+        LLMHelper.assistant_cache.clear()
+        LLMHelper.catalog_cache.clear()
+
         file_list = self.llm_client.files.list()
         file_data = [file.id for file in file_list.data]
         for file_id in file_data:
             print(f"Deleting file  with id {file_id}")
             self.llm_client.files.delete(file_id)
 
+        LLMHelper.file_cache.clear()
+        self._get_file_hash_index().remove_missing([], self.env_helper.OPENAI_API_BASE)
+        self._save_file_hash_index()
+
     def get_completion(self, messages):
         """Get completion."""
-        completion = self.llm_client.chat.completions.create(
-            model=self.openai_deployment,
-            messages=messages
-        )
+        with self._timed("chat.completions.create"):
+            completion = self.llm_client.chat.completions.create(
+                model=self.openai_deployment,
+                messages=messages
+            )
+        MetricsHelper.add_token_usage(completion.usage, source="completion")
 
         completion_text = completion.choices[0].message.content
 
         return completion_text
 
+    def get_endpoint_health(self, refresh=False):
+        """Get the status of the OpenAI endpoint and model deployment, and the last check latency. Cached process-wide."""
+        return HealthHelper.get_status(self.llm_client_key, self.llm_client, refresh, self.openai_deployment)
+
     def check_openai_endpoint_from_settings(self):
         """Check OpenAI endpoint."""
-        try:
-            self.llm_client.chat.completions.create(
-                model=self.openai_deployment,
-                messages=[{"role": "assistant", "content": "ping"}]
-            )
-            return True
-        except:
-            return False
-
+        return self.get_endpoint_health()['ok']
 
     def check_openai_endpoint(self, az_openai_service_endpoint, az_openai_service_key, az_openai_service_deployment, az_openai_api_version):
-        """Check OpenAI endpoint."""
+        """Check OpenAI endpoint and deployment. Raise an exception if not working."""
         llm_client = AzureOpenAI(
             azure_endpoint=az_openai_service_endpoint,
             api_key=az_openai_service_key,
             api_version=az_openai_api_version
         )
 
-        llm_client.chat.completions.create(
-            model=az_openai_service_deployment,
-            messages=[{"role": "assistant", "content": "ping"}]
-        )
+        status = HealthHelper.probe(llm_client, az_openai_service_deployment)
+        if not status['ok']:
+            raise ConnectionError(status['error'])
 
     def get_file(self, file_id):
-        """Get a file."""
-        file = self.llm_client.files.retrieve(file_id)
+        """Get a file. Not cached, e.g. to check that it still exists."""
+        with self._timed("files.retrieve"):
+            file = self.llm_client.files.retrieve(file_id)
         return file
 
+    def _get_file_or_none(self, file_id):
+        try:
+            return self.get_file(file_id)
+        except openai.NotFoundError:
+            return None
+
+    def get_files(self, file_ids):
+        """Get files by id, in order. Served from the process-wide cache. Files that do not exist are left out."""
+        files = {file_id: LLMHelper.file_cache.get(self._file_cache_key(file_id)) for file_id in file_ids}
+        missing_file_ids = [file_id for file_id, file in files.items() if file is None]
+
+        if len(missing_file_ids) > LLMHelper.FILE_RETRIEVE_CONCURRENCY:
+            # One request instead of one per file
+            with self._timed("files.list"):
+                listed_files = {file.id: file for file in self.llm_client.files.list()}
+            for file in listed_files.values():
+                LLMHelper.file_cache.set(self._file_cache_key(file.id), file)
+            files.update({file_id: listed_files.get(file_id, None) for file_id in missing_file_ids})
+        elif len(missing_file_ids) > 1:
+            with ThreadPoolExecutor(max_workers=len(missing_file_ids), thread_name_prefix="file_retrieve") as executor:
+                files.update(zip(missing_file_ids, executor.map(self._get_file_or_none, missing_file_ids)))
+        elif len(missing_file_ids) == 1:
+            files[missing_file_ids[0]] = self._get_file_or_none(missing_file_ids[0])
+
+        for file_id in missing_file_ids:
+            if files[file_id] is not None:
+                LLMHelper.file_cache.set(self._file_cache_key(file_id), files[file_id])
+
+        return [files[file_id] for file_id in file_ids if files[file_id] is not None]
+
 # OBJECT OPERATIONS
     def get_functions_from_assistant(self, assistant_instance):
         """Get function from assistant."""
-        tool_functions = [tool for tool in assistant_instance.tools if isinstance(tool, ToolFunction)]
+        tool_functions = [tool for tool in assistant_instance.tools if isinstance(tool, FunctionTool)]
         return tool_functions
 
     def assistant_has_code_interpreter(self, assistant_id):
         """Check if an assistant has code interpreter."""
         assistant_instance = self.get_assistant(assistant_id)
-        tool_code_interpreter = [tool for tool in assistant_instance.tools if isinstance(tool, ToolCodeInterpreter)]
+        tool_code_interpreter = [tool for tool in assistant_instance.tools if isinstance(tool, CodeInterpreterTool)]
         return len(tool_code_interpreter) > 0
 
     def get_files_from_assistant(self, assistant_instance):
-        """Get files from assistant."""
-        assistant_files = [self.get_file(file_id) for file_id in assistant_instance.file_ids]
+        """Get files from assistant. Only call it when the files are shown."""
+        assistant_files = self.get_files(assistant_instance.file_ids)
         return assistant_files
 
     def validate_function_json(self, function_text):
@@ -449,3 +749,6 @@ class LLMHelper:
             return True  # Parsing succeeded, the string is valid JSON
         except json.JSONDecodeError:
             return False  # Parsing failed, the string is not valid JSON
+
+
+MetricsHelper.register_stats("assistant_cache", LLMHelper.get_assistant_cache_stats, label="cache")
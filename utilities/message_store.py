@@ -0,0 +1,80 @@
+"""Local history of thread messages."""
+import threading
+
+from utilities.cache_helper import CacheHelper
+
+class ThreadMessageStore:
+    """Per-thread message history, synced incrementally from the last message seen."""
+
+    MAX_THREADS = 1000
+
+    # Shared by all sessions in the process. Least recently used threads are dropped
+    _threads = CacheHelper(max_size=MAX_THREADS, ttl=None)
+    _lock = threading.Lock()
+
+    def __init__(self, llm_helper, thread_store=None):
+        """Initialize the store on top of an LLM helper. Histories are persisted in the thread store, if any."""
+        self.llm_helper = llm_helper
+        self.thread_store = thread_store
+
+    @staticmethod
+    def _message_to_dict(message):
+        """Keep the fields used for rendering."""
+        message_value = "\n".join(content.text.value for content in message.content if content.type == "text")
+        return {'message_id': message.id, 'message_value': message_value, 'message_role': message.role}
+
+    @staticmethod
+    def _is_final(message):
+        """Check if a message is fully written. Without a status, as in older API versions, assistant messages are empty until written."""
+        status = getattr(message, 'status', None)
+        if status is not None:
+            # Incomplete messages are final too, their run ended
+            return status != "in_progress"
+
+        return message.role != "assistant" or len(message.content) > 0
+
+    def _get_thread_entry(self, thread_id):
+        with ThreadMessageStore._lock:
+            thread_entry = ThreadMessageStore._threads.get(thread_id)
+            if thread_entry is None:
+                thread_entry = {'messages': [], 'last_message_id': None, 'lock': threading.Lock(), 'synced': False}
+                stored_messages = self.thread_store.get_messages(thread_id) if self.thread_store is not None else None
+                if stored_messages is not None:
+                    thread_entry.update(stored_messages, synced=True)
+                ThreadMessageStore._threads.set(thread_id, thread_entry)
+
+        return thread_entry
+
+    def sync(self, thread_id):
+        """Fetch the messages newer than the last one seen, across all pages. Stops before messages still being written."""
+        thread_entry = self._get_thread_entry(thread_id)
+        with thread_entry['lock']:
+            new_messages = self.llm_helper.get_assistant_thread_messages(thread_id, after=thread_entry['last_message_id'], order="asc")
+            # Fetched again by the next sync, once written
+            for index, message in enumerate(new_messages):
+                if not self._is_final(message):
+                    new_messages = new_messages[:index]
+                    break
+            thread_entry['synced'] = True
+            if len(new_messages) > 0:
+                new_message_dicts = [self._message_to_dict(message) for message in new_messages]
+                thread_entry['messages'].extend(new_message_dicts)
+                thread_entry['last_message_id'] = new_messages[-1].id
+                if self.thread_store is not None:
+                    # Only the new messages are written
+                    self.thread_store.add_messages(thread_id, new_message_dicts)
+
+            return list(thread_entry['messages'])
+
+    def get_messages(self, thread_id):
+        """Get messages oldest first. Only fetched if the thread was never synced nor persisted."""
+        thread_entry = self._get_thread_entry(thread_id)
+        if not thread_entry['synced']:
+            return self.sync(thread_id)
+
+        with thread_entry['lock']:
+            return list(thread_entry['messages'])
+
+    def invalidate(self, thread_id):
+        """Drop the history of a thread."""
+        ThreadMessageStore._threads.invalidate(thread_id)
@@ -0,0 +1,220 @@
+"""Process-wide latency, error and token metrics."""
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utilities.observability_helper import ObservabilityHelper
+
+class MetricsHelper:
+    """Histograms and counters rendered in Prometheus text format.
+
+    Exposed with a periodic dump to a file and/or a local /metrics endpoint. No external service needed.
+    Labels must have few values, e.g. operations or assistants. Never sessions or users: series are never removed.
+    """
+
+    LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+    # (operation, labels) -> {'buckets': [...], 'sum': float, 'count': int}
+    _latencies = {}
+    # (operation, labels) -> count
+    _errors = {}
+    # (token type, labels) -> count
+    _tokens = {}
+    # name -> (function returning stats, label of the keys of per-key stats or None)
+    _stats_sources = {}
+    _lock = threading.Lock()
+
+    _exporters_started = False
+
+    @staticmethod
+    def _get_labels(labels):
+        """Labels as a hashable, ordered key. Empty labels are left out."""
+        return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+    @staticmethod
+    def observe(operation, latency, **labels):
+        """Record the latency of an operation in seconds."""
+        key = (operation, MetricsHelper._get_labels(labels))
+        with MetricsHelper._lock:
+            histogram = MetricsHelper._latencies.get(key, None)
+            if histogram is None:
+                histogram = {'buckets': [0] * len(MetricsHelper.LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+                MetricsHelper._latencies[key] = histogram
+
+            for index, bucket in enumerate(MetricsHelper.LATENCY_BUCKETS):
+                if latency <= bucket:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += latency
+            histogram['count'] += 1
+
+    @staticmethod
+    def increment_error(operation, **labels):
+        """Count a failed operation."""
+        key = (operation, MetricsHelper._get_labels(labels))
+        with MetricsHelper._lock:
+            MetricsHelper._errors[key] = MetricsHelper._errors.get(key, 0) + 1
+
+    @staticmethod
+    def add_token_usage(usage, **labels):
+        """Count tokens from the usage of a run or completion. Usage can be missing."""
+        if usage is None:
+            return
+
+        label_key = MetricsHelper._get_labels(labels)
+        with MetricsHelper._lock:
+            for token_type in ['prompt_tokens', 'completion_tokens', 'total_tokens']:
+                key = (token_type, label_key)
+                MetricsHelper._tokens[key] = MetricsHelper._tokens.get(key, 0) + (getattr(usage, token_type, 0) or 0)
+
+    @staticmethod
+    def register_stats(name, stats_function, label=None):
+        """Export the numbers returned by a function, e.g. cache counters, as gauges. With a label, it returns them per key."""
+        with MetricsHelper._lock:
+            MetricsHelper._stats_sources[name] = (stats_function, label)
+
+    @staticmethod
+    def get_stats():
+        """Get the stats of all sources, by name. None for a disabled source."""
+        with MetricsHelper._lock:
+            stats_sources = sorted(MetricsHelper._stats_sources.items())
+
+        # Sources take their own locks
+        return {name: stats_function() for name, (stats_function, _) in stats_sources}
+
+    @staticmethod
+    @contextmanager
+    def timed(operation, **labels):
+        """Time a block. Exceptions are counted as errors and raised again."""
+        start_time = time.monotonic()
+        try:
+            yield
+        except Exception:
+            MetricsHelper.increment_error(operation, **labels)
+            raise
+        finally:
+            MetricsHelper.observe(operation, time.monotonic() - start_time, **labels)
+
+    @staticmethod
+    def _format_labels(labels, extra_labels=()):
+        all_labels = list(labels) + list(extra_labels)
+        if len(all_labels) == 0:
+            return ""
+        label_text = ",".join('{}="{}"'.format(key, value.replace('\\', '\\\\').replace('"', '\\"')) for key, value in all_labels)
+        return "{" + label_text + "}"
+
+    @staticmethod
+    def render_prometheus():
+        """Render all metrics in Prometheus text exposition format."""
+        with MetricsHelper._lock:
+            latencies = {key: {'buckets': list(value['buckets']), 'sum': value['sum'], 'count': value['count']} for key, value in MetricsHelper._latencies.items()}
+            errors = dict(MetricsHelper._errors)
+            tokens = dict(MetricsHelper._tokens)
+
+        lines = ["# TYPE assistants_operation_latency_seconds histogram"]
+        for (operation, labels), histogram in sorted(latencies.items()):
+            operation_labels = (("operation", operation),) + labels
+            for bucket, bucket_count in zip(MetricsHelper.LATENCY_BUCKETS, histogram['buckets']):
+                lines.append(f"assistants_operation_latency_seconds_bucket{MetricsHelper._format_labels(operation_labels, [('le', str(bucket))])} {bucket_count}")
+            lines.append(f"assistants_operation_latency_seconds_bucket{MetricsHelper._format_labels(operation_labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"assistants_operation_latency_seconds_sum{MetricsHelper._format_labels(operation_labels)} {histogram['sum']}")
+            lines.append(f"assistants_operation_latency_seconds_count{MetricsHelper._format_labels(operation_labels)} {histogram['count']}")
+
+        lines.append("# TYPE assistants_operation_errors_total counter")
+        for (operation, labels), error_count in sorted(errors.items()):
+            lines.append(f"assistants_operation_errors_total{MetricsHelper._format_labels((('operation', operation),) + labels)} {error_count}")
+
+        lines.append("# TYPE assistants_tokens_total counter")
+        for (token_type, labels), token_count in sorted(tokens.items()):
+            lines.append(f"assistants_tokens_total{MetricsHelper._format_labels((('type', token_type),) + labels)} {token_count}")
+
+        lines += MetricsHelper._render_stats()
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_stats():
+        """Render the numbers of the stats sources as gauges named after the source and the stat."""
+        with MetricsHelper._lock:
+            stats_sources = sorted(MetricsHelper._stats_sources.items())
+
+        gauges = {}
+        for name, (stats_function, label) in stats_sources:
+            stats = stats_function()
+            if stats is None:
+                continue
+
+            keyed_stats = sorted(stats.items()) if label is not None else [(None, stats)]
+            for key, key_stats in keyed_stats:
+                labels = ((label, str(key)),) if label is not None else ()
+                for stat_name, value in sorted(key_stats.items()):
+                    # Non-numeric stats, e.g. states, are only in the reports
+                    if isinstance(value, (int, float)):
+                        gauges.setdefault(f"assistants_{name}_{stat_name}", []).append(f"{MetricsHelper._format_labels(labels)} {value}")
+
+        lines = []
+        for gauge_name, gauge_values in gauges.items():
+            lines.append(f"# TYPE {gauge_name} gauge")
+            lines += [f"{gauge_name}{gauge_value}" for gauge_value in gauge_values]
+
+        return lines
+
+    @staticmethod
+    def reset():
+        """Drop all metrics."""
+        with MetricsHelper._lock:
+            MetricsHelper._latencies = {}
+            MetricsHelper._errors = {}
+            MetricsHelper._tokens = {}
+
+    @staticmethod
+    def _dump_periodically(file_path, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                with open(file_path, 'w', encoding="utf-8") as file:
+                    file.write(MetricsHelper.render_prometheus())
+            except OSError:
+                continue
+
+    @staticmethod
+    def start_exporters(env_helper):
+        """Start the dump and endpoint configured in the environment. Only once per process."""
+        with MetricsHelper._lock:
+            if MetricsHelper._exporters_started:
+                return
+            MetricsHelper._exporters_started = True
+
+        if env_helper.METRICS_DUMP_FILE != "":
+            threading.Thread(target=MetricsHelper._dump_periodically, args=(env_helper.METRICS_DUMP_FILE, env_helper.METRICS_DUMP_INTERVAL),
+                             daemon=True, name="metrics_dump").start()
+
+        if env_helper.METRICS_PORT > 0:
+            try:
+                metrics_server = ThreadingHTTPServer(("127.0.0.1", env_helper.METRICS_PORT), MetricsRequestHandler)
+            except OSError as e:
+                # Metrics never stop the app
+                ObservabilityHelper.log(f"METRICS HELPER - Cannot serve metrics on port {env_helper.METRICS_PORT}: {e}", True)
+                return
+            threading.Thread(target=metrics_server.serve_forever, daemon=True, name="metrics_endpoint").start()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serve metrics on /metrics."""
+
+    def do_GET(self):
+        """Return the Prometheus text."""
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = MetricsHelper.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Do not log scrapes."""
+        return None
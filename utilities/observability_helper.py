@@ -1,8 +1,110 @@
 """Page observability tooling."""
+import atexit
 import datetime
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
 
 class ObservabilityHelper:
-    """Abstract logging, metrics and traces."""
+    """Abstract logging, metrics and traces.
+
+    Log records are filtered by level and their messages built on the caller thread, so they show
+    args as they were at the call. They are serialized and written as JSON lines by a background
+    thread. Messages can take %-style args, or be a callable, so they are only built when enabled.
+    """
+
+    LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+    QUEUE_SIZE = 10000
+
+    _threshold = None
+    _log_file = None
+    _queue = None
+    _writer = None
+    _dropped = 0
+    _config_lock = threading.Lock()
+
+    @staticmethod
+    def configure(level=None, log_file=None):
+        """Set level and sink. Defaults come from LOG_LEVEL and LOG_FILE. Stdout if there is no file."""
+        with ObservabilityHelper._config_lock:
+            level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+            ObservabilityHelper._log_file = log_file or os.getenv('LOG_FILE', None)
+
+            if ObservabilityHelper._writer is None:
+                ObservabilityHelper._queue = queue.Queue(maxsize=ObservabilityHelper.QUEUE_SIZE)
+                ObservabilityHelper._writer = threading.Thread(target=ObservabilityHelper._write_records, daemon=True, name="log_writer")
+                ObservabilityHelper._writer.start()
+                atexit.register(ObservabilityHelper.flush)
+
+            # Last. Other threads log as soon as it is set
+            ObservabilityHelper._threshold = ObservabilityHelper.LEVELS.get(level, ObservabilityHelper.LEVELS['INFO'])
+
+    @staticmethod
+    def is_enabled(level):
+        """Check if records of a level are written."""
+        if ObservabilityHelper._threshold is None:
+            ObservabilityHelper.configure()
+
+        return ObservabilityHelper.LEVELS[level] >= ObservabilityHelper._threshold
+
+    @staticmethod
+    def _format_message(message, args):
+        """Build the message of a record. Runs in the caller thread."""
+        try:
+            if callable(message):
+                message = message()
+            elif len(args) > 0:
+                message = message % args
+        except Exception as e:
+            message = f"{message} - LOG FORMAT ERROR {e}"
+
+        return str(message)
+
+    @staticmethod
+    def _format_record(record):
+        """Build the JSON line of a record. Runs in the writer thread."""
+        created, level, message, fields = record
+        log_line = {'timestamp': datetime.datetime.fromtimestamp(created).isoformat(timespec='milliseconds'), 'level': level, 'message': message}
+        log_line.update(fields)
+
+        return json.dumps(log_line, default=str)
+
+    @staticmethod
+    def _write_records():
+        """Write queued records in batches."""
+        while True:
+            records = [ObservabilityHelper._queue.get()]
+            while not ObservabilityHelper._queue.empty() and len(records) < 1000:
+                records.append(ObservabilityHelper._queue.get_nowait())
+
+            log_lines = [ObservabilityHelper._format_record(record) for record in records if record is not None]
+            try:
+                if ObservabilityHelper._log_file is not None:
+                    with open(ObservabilityHelper._log_file, 'a', encoding="utf-8") as file:
+                        file.write("\n".join(log_lines) + "\n")
+                elif len(log_lines) > 0:
+                    sys.stdout.write("\n".join(log_lines) + "\n")
+                    sys.stdout.flush()
+            except Exception:
+                pass
+
+            for _ in records:
+                ObservabilityHelper._queue.task_done()
+
+    @staticmethod
+    def flush():
+        """Wait until queued records are written."""
+        if ObservabilityHelper._queue is not None:
+            ObservabilityHelper._queue.join()
+
+    @staticmethod
+    def get_dropped_count():
+        """Get the number of records dropped because the queue was full."""
+        return ObservabilityHelper._dropped
 
     def log_completion(self, completion, user_sid, active_tool,  active_step):
         """Log completion data. Not used here."""
@@ -12,17 +114,29 @@ class ObservabilityHelper:
         total_tokens      = completion_usage['total_tokens']
 
         message = f'''
-            Logging - for user {user_sid} in tool {active_tool} and step {active_step} {prompt_tokens} prompt tokens, 
+            Logging - for user {user_sid} in tool {active_tool} and step {active_step} {prompt_tokens} prompt tokens,
             {completion_tokens} completion_tokens, {total_tokens} total_tokens'''
 
         self.log(message, verbose=True)
 
-    def log(self, message, verbose=False):
-        """Log messages."""
-        # Time format
-        now = datetime.datetime.now()
-        milliseconds = now.microsecond // 1000
-        timestamp = f"{now.strftime('%Y-%m-%d %H:%M:%S')}.{milliseconds:03d}"
-        
-        if verbose:
-            print(f"LOG - {timestamp} - {message}")
+    @staticmethod
+    def log(message, verbose=False, *args, level=None, sample_rate=None, **fields):
+        """Log messages. Verbose messages are INFO, others DEBUG, unless a level is given.
+
+        A sample_rate below 1 keeps only that fraction of records, for high volume events.
+        Extra keyword fields are added to the JSON line.
+        """
+        if level is None:
+            level = "INFO" if verbose else "DEBUG"
+
+        if not ObservabilityHelper.is_enabled(level):
+            return
+
+        if sample_rate is not None and random.random() >= sample_rate:
+            return
+
+        try:
+            ObservabilityHelper._queue.put_nowait((time.time(), level, ObservabilityHelper._format_message(message, args), fields))
+        except queue.Full:
+            # Never block the request path on logging
+            ObservabilityHelper._dropped += 1
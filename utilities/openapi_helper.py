@@ -1,10 +1,16 @@
 """This module is useful for OpenAPI interoworking."""
 import json
 import os
-import random
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 
+from utilities.cache_helper import CacheHelper
+from utilities.env_helper import EnvHelper
+from utilities.http_helper import HTTPHelper
+from utilities.metrics_helper import MetricsHelper
 from utilities.observability_helper import ObservabilityHelper
+from utilities.openapi_registry import CompiledOpenAPISpec, OpenAPISpecRegistry
+from utilities.server_selector import ServerSelector
 
 class OpenAPIHelper:
     """This class abstract OpenAPI operations."""
@@ -16,6 +22,14 @@ class OpenAPIHelper:
 
     OPENAPI_SPEC_MANDATORY_KEYS = [ "info", "openapi", "servers", "paths"]
 
+    # Hedging sends a second request when a server is slower than its usual latency
+    HEDGING_ENABLED = None
+    # Opt-in cache of GET responses. TTL from x-cache-ttl in the operation or Cache-Control max-age
+    RESPONSE_CACHE_MAX_ENTRY_SIZE = 256 * 1024
+    response_cache = None
+    _config_loaded = False
+    hedging_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="openapi_hedging")
+
 # INITIALIZATION METHODS ########################################
     @staticmethod
     def _get_openapi_spec_file_path(assistant_id):
@@ -33,6 +47,12 @@ class OpenAPIHelper:
         
         return None
 
+    @staticmethod
+    def get_compiled_openapi_spec(assistant_id):
+        """Return OpenAPI spec for assistant compiled for dispatch. Parsed once per file version."""
+        file_path = OpenAPIHelper._get_openapi_spec_file_path(assistant_id)
+        return OpenAPISpecRegistry.get(assistant_id, file_path)
+
     @staticmethod
     def save_openapi_spec(assistant_id, openapi_spec):
         """Save a spec for an assistant."""
@@ -41,23 +61,7 @@ class OpenAPIHelper:
         with open(file_path, 'w', encoding="utf-8") as file:
             json.dump(openapi_spec, file, indent=4)
 
-    @staticmethod
-    def _create_function_dict_from_openapi_spec(openapi_spec):
-        """Create a dict out of specs."""
-        #openapi_spec = json.loads(openapi_spec)
-        function_dict = {}
-        for path in openapi_spec['paths']:
-            for http_method in ['get', 'post', 'put', 'delete', 'patch']:
-                if http_method in openapi_spec['paths'][path]:
-                    function_name = openapi_spec['paths'][path][http_method]['operationId']
-
-                    function_dict[function_name] = {}
-                    function_dict[function_name]['path'] = path
-                    function_dict[function_name]['method'] = http_method
-                    if 'parameters' in openapi_spec['paths'][path][http_method]:
-                        function_dict[function_name]['parameters'] = openapi_spec['paths'][path][http_method]['parameters']
-
-        return function_dict
+        OpenAPISpecRegistry.register(assistant_id, CompiledOpenAPISpec(openapi_spec), os.stat(file_path).st_mtime_ns)
 
 # PRIVATE METHODS ########################################
     @staticmethod
@@ -103,32 +107,110 @@ class OpenAPIHelper:
         return openai_functions
 
     @staticmethod
-    def _construct_call_fqdns(function_data, function_args, server_list):
+    def _construct_call_fqdns(operation, function_args, server_urls):
         """Construct function FQDNs."""
-        params = function_data.get('parameters', None)
-        path   = function_data['path']
+        path  = operation.build_path(function_args)
+        fqdns = [server_url + path for server_url in server_urls]
 
-        if params is not None:
-            params_in_path  = [param for param in params if param['in'] == "path"]
-            params_in_query = [param for param in params if param['in'] == "query"]
+        return fqdns
 
-            for param_in_path in params_in_path:
-                param_name  = param_in_path['name']
-                param_value = str(function_args[param_name])
+    @staticmethod
+    def _load_config():
+        """Load hedging and response cache configuration once."""
+        if not OpenAPIHelper._config_loaded:
+            env_helper = EnvHelper()
+            OpenAPIHelper.HEDGING_ENABLED = env_helper.OPENAPI_HEDGING_ENABLED
+            if env_helper.OPENAPI_RESPONSE_CACHE_ENABLED:
+                OpenAPIHelper.response_cache = CacheHelper(max_size=env_helper.OPENAPI_RESPONSE_CACHE_SIZE, ttl=None)
+            OpenAPIHelper._config_loaded = True
 
-                path = path.replace(param_name, param_value)
+    @staticmethod
+    def _get_response_cache_key(operation, function_args_dict, server_urls):
+        """Key a GET call by API, operation and normalized arguments."""
+        return (tuple(server_urls), operation.path, operation.operation_id, json.dumps(function_args_dict, sort_keys=True))
 
-            if len(params_in_query) > 0:
-                query_params = [f"{param_in_query['name']}={str(function_args[param_in_query['name']])}" for param_in_query in params_in_query]
-                query_params_string = "&".join(query_params)
-                path += "?" + query_params_string
+    @staticmethod
+    def _get_response_ttl(operation, response):
+        """Get how long a response can be cached. None if it cannot."""
+        if operation.cache_ttl is not None:
+            return operation.cache_ttl if operation.cache_ttl > 0 else None
+
+        cache_control = response.headers.get('Cache-Control', "").lower()
+        directives = [directive.strip() for directive in cache_control.split(",")]
+        if any(directive in ['no-store', 'no-cache', 'private'] for directive in directives):
+            return None
 
-            path = path.replace("{", "")
-            path = path.replace("}", "")
+        for directive in directives:
+            if directive.startswith("max-age="):
+                try:
+                    max_age = int(directive[len("max-age="):])
+                except ValueError:
+                    return None
+                return max_age if max_age > 0 else None
 
-        fqdns = [server['url'][0:-1] + path for server in server_list]
+        return None
 
-        return fqdns
+    @staticmethod
+    def get_response_cache_stats():
+        """Get response cache hit and miss counters. None if the cache is disabled."""
+        if OpenAPIHelper.response_cache is None:
+            return None
+
+        return OpenAPIHelper.response_cache.get_stats()
+
+    @staticmethod
+    def _call_server(function_method, server_url, call_fqdn, function_args_dict, deadline=None):
+        """Call a server and record its latency and errors. Return the response if OK."""
+        start_time = time.monotonic()
+        try:
+            if function_method == 'get':
+                req = HTTPHelper.request('get', call_fqdn, deadline=deadline)
+            else:
+                req = HTTPHelper.request(function_method, call_fqdn, deadline=deadline, json=function_args_dict)
+        except Exception as e:
+            ServerSelector.record_failure(server_url, time.monotonic() - start_time)
+            MetricsHelper.observe("tool.http", time.monotonic() - start_time, server=server_url)
+            MetricsHelper.increment_error("tool.http", server=server_url)
+            ObservabilityHelper.log(f"OPENAPI HELPER - ERROR - Calling {call_fqdn} failed with {e}", OpenAPIHelper.VERBOSE)
+            return None
+
+        MetricsHelper.observe("tool.http", time.monotonic() - start_time, server=server_url)
+        if req.status_code != 200:
+            MetricsHelper.increment_error("tool.http", server=server_url)
+
+        # Client errors do not tell anything about server health
+        if req.status_code >= 500:
+            ServerSelector.record_failure(server_url, time.monotonic() - start_time)
+        else:
+            ServerSelector.record_success(server_url, time.monotonic() - start_time)
+
+        if req.status_code == 200:
+            return req
+
+        return None
+
+    @staticmethod
+    def _call_servers_hedged(function_method, server_urls, call_fqdns, function_args_dict, hedge_delay, deadline=None):
+        """Call the first server. If it is slower than the hedge delay, call the second too and take the first response."""
+        primary_future = OpenAPIHelper.hedging_executor.submit(OpenAPIHelper._call_server, function_method, server_urls[0], call_fqdns[0],
+                                                               function_args_dict, deadline)
+        try:
+            response = primary_future.result(timeout=hedge_delay)
+            if response is not None:
+                return response
+            pending_futures = []
+        except FutureTimeoutError:
+            pending_futures = [primary_future]
+
+        ObservabilityHelper.log(f"OPENAPI HELPER - Hedging request to {server_urls[1]}", OpenAPIHelper.VERBOSE)
+        pending_futures.append(OpenAPIHelper.hedging_executor.submit(OpenAPIHelper._call_server, function_method, server_urls[1], call_fqdns[1],
+                                                                    function_args_dict, deadline))
+        for future in as_completed(pending_futures):
+            response = future.result()
+            if response is not None:
+                return response
+
+        return None
 
 # PUBLIC METHODS ########################################
     @staticmethod
@@ -150,39 +232,72 @@ class OpenAPIHelper:
         return openai_functions
 
     @staticmethod
-    def call_function(function_name, function_args, openapi_spec):
-        """Execute a function."""
-        function_dict   = OpenAPIHelper._create_function_dict_from_openapi_spec(openapi_spec)
-        function_data   = function_dict.get(function_name, None)
+    def call_function(function_name, function_args, openapi_spec, deadline=None):
+        """Execute a function. The spec can be compiled or a raw spec dict.
+
+        With a deadline, in time.monotonic() seconds, no server is called after it and requests are cut at it.
+        """
+        if openapi_spec is None:
+            ObservabilityHelper.log(f"OPENAPI HELPER - ERROR - No spec for function {function_name}", OpenAPIHelper.VERBOSE)
+            return None
+
+        if not isinstance(openapi_spec, CompiledOpenAPISpec):
+            openapi_spec = CompiledOpenAPISpec(openapi_spec)
 
-        if function_data == None:
+        operation = openapi_spec.get_operation(function_name)
+
+        if operation is None:
             ObservabilityHelper.log(f"OPENAPI HELPER - ERROR - Function {function_name} not in spec", OpenAPIHelper.VERBOSE)
             return None
 
-        function_method = function_data['method']
+        function_method = operation.method
 
         function_args_dict = json.loads(function_args)
 
-        # GET FQDNs We avoid calling always the first element
-        call_fqdns = OpenAPIHelper._construct_call_fqdns(function_data, function_args_dict, openapi_spec['servers'])
-        random.shuffle(call_fqdns)
+        OpenAPIHelper._load_config()
+
+        response_cache_key = None
+        if OpenAPIHelper.response_cache is not None and function_method == 'get':
+            response_cache_key = OpenAPIHelper._get_response_cache_key(operation, function_args_dict, openapi_spec.server_urls)
+            cached_response = OpenAPIHelper.response_cache.get(response_cache_key)
+            if cached_response is not None:
+                return cached_response
+
+        # GET FQDNs Fastest healthy server first
+        server_urls = ServerSelector.order(openapi_spec.server_urls)
+        call_fqdns = OpenAPIHelper._construct_call_fqdns(operation, function_args_dict, server_urls)
 
         # Call FQDNS until proper response
-        for call_fqdn in call_fqdns:
-            try:
-                if function_method == 'get':
-                    req = requests.get(call_fqdn)
-                elif function_method == 'post':
-                    req = requests.post(call_fqdn, json=function_args_dict)
-                else:
-                    ObservabilityHelper.log(f"OPENAPI HELPER - ERROR - Method {function_method} not implemented", OpenAPIHelper.VERBOSE)
-
-                if req.status_code == 200:
-                    response = req.text
-                    return response
-            except Exception:
-                continue
+        index = 0
+        while index < len(call_fqdns):
+            if deadline is not None and time.monotonic() >= deadline:
+                ObservabilityHelper.log(f"OPENAPI HELPER - ERROR - Function {function_name} deadline expired", OpenAPIHelper.VERBOSE)
+                return None
+
+            hedge_delay = None
+            # A hedged request can reach both servers. Only for operations safe to run twice
+            if OpenAPIHelper.HEDGING_ENABLED and operation.idempotent and index + 1 < len(call_fqdns):
+                hedge_delay = ServerSelector.get_hedge_delay(server_urls[index])
+
+            if hedge_delay is None:
+                response = OpenAPIHelper._call_server(function_method, server_urls[index], call_fqdns[index], function_args_dict, deadline)
+                index += 1
+            else:
+                response = OpenAPIHelper._call_servers_hedged(function_method, server_urls[index:index + 2], call_fqdns[index:index + 2],
+                                                              function_args_dict, hedge_delay, deadline)
+                index += 2
+
+            if response is not None:
+                if response_cache_key is not None and len(response.content) <= OpenAPIHelper.RESPONSE_CACHE_MAX_ENTRY_SIZE:
+                    response_ttl = OpenAPIHelper._get_response_ttl(operation, response)
+                    if response_ttl is not None:
+                        OpenAPIHelper.response_cache.set(response_cache_key, response.text, ttl=response_ttl)
+
+                return response.text
 
         ObservabilityHelper.log("OPENAPI HELPER - ERROR - No response from functions", OpenAPIHelper.VERBOSE)
 
         return None
+
+
+MetricsHelper.register_stats("response_cache", OpenAPIHelper.get_response_cache_stats)
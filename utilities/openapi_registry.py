@@ -0,0 +1,130 @@
+"""Compiled OpenAPI specs shared by all sessions."""
+import json
+import math
+import os
+import re
+import threading
+from urllib.parse import quote, urlencode
+
+from utilities.observability_helper import ObservabilityHelper
+
+class CompiledOperation:
+    """An OpenAPI operation with its URL templates parsed once."""
+
+    PATH_PARAMETER_PATTERN = re.compile(r"\{([^}]+)\}")
+    IDEMPOTENT_METHODS = ['get', 'head']
+
+    def __init__(self, operation_id, path, method, operation_spec):
+        """Parse path and query templates of the operation."""
+        self.operation_id = operation_id
+        self.path   = path
+        self.method = method
+        self.spec   = operation_spec
+
+        # Seconds GET responses can be cached. Extension field, None when not set
+        self.cache_ttl = CompiledOperation._parse_cache_ttl(operation_id, operation_spec.get('x-cache-ttl', None))
+        # Safe to send twice, e.g. when hedging. Other methods can opt in with x-idempotent
+        self.idempotent = method in CompiledOperation.IDEMPOTENT_METHODS or operation_spec.get('x-idempotent', False) is True
+
+        parameters = operation_spec.get('parameters', [])
+        self.query_parameters = [(parameter['name'], parameter.get('required', False)) for parameter in parameters if parameter['in'] == "query"]
+
+        # Literal and parameter segments, e.g. /items/{id} -> [(False, "/items/"), (True, "id")]
+        self.path_segments = []
+        last_end = 0
+        for match in CompiledOperation.PATH_PARAMETER_PATTERN.finditer(path):
+            self.path_segments.append((False, path[last_end:match.start()]))
+            self.path_segments.append((True, match.group(1)))
+            last_end = match.end()
+        self.path_segments.append((False, path[last_end:]))
+
+    @staticmethod
+    def _parse_cache_ttl(operation_id, cache_ttl):
+        """Get x-cache-ttl as a number of seconds. Specs often have it as a string. Invalid values disable the cache."""
+        if cache_ttl is None:
+            return None
+
+        try:
+            if isinstance(cache_ttl, bool):
+                raise ValueError("not a number")
+            cache_ttl = float(cache_ttl)
+            if not math.isfinite(cache_ttl):
+                raise ValueError("not finite")
+        except (TypeError, ValueError) as e:
+            ObservabilityHelper.log(f"OPENAPI REGISTRY - Invalid x-cache-ttl {cache_ttl!r} of {operation_id}, not cached: {e}", True, level="WARNING")
+            return 0.0
+
+        return cache_ttl
+
+    def build_path(self, function_args):
+        """Render path and query string with the call arguments."""
+        path = "".join(quote(str(function_args[segment]), safe='') if is_parameter else segment
+                       for is_parameter, segment in self.path_segments)
+
+        query_args = [(name, str(function_args[name])) for name, required in self.query_parameters
+                      if required or name in function_args]
+        if len(query_args) > 0:
+            path += "?" + urlencode(query_args)
+
+        return path
+
+
+class CompiledOpenAPISpec:
+    """OpenAPI spec compiled into an operationId indexed dispatch table."""
+
+    HTTP_METHODS = ['get', 'post', 'put', 'delete', 'patch']
+
+    def __init__(self, openapi_spec):
+        """Compile all operations of the spec."""
+        self.spec = openapi_spec
+        self.server_urls = [server['url'].rstrip("/") for server in openapi_spec['servers']]
+
+        self.operations = {}
+        for path, path_spec in openapi_spec['paths'].items():
+            for http_method in CompiledOpenAPISpec.HTTP_METHODS:
+                if http_method in path_spec:
+                    operation_id = path_spec[http_method]['operationId']
+                    self.operations[operation_id] = CompiledOperation(operation_id, path, http_method, path_spec[http_method])
+
+    def get_operation(self, operation_id):
+        """Get an operation by operationId."""
+        return self.operations.get(operation_id, None)
+
+
+class OpenAPISpecRegistry:
+    """Parse each spec file once. Reload only when the file changes."""
+
+    _specs = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(assistant_id, file_path):
+        """Get the compiled spec of an assistant. None if there is no spec file."""
+        try:
+            file_mtime = os.stat(file_path).st_mtime_ns
+        except FileNotFoundError:
+            OpenAPISpecRegistry.invalidate(assistant_id)
+            return None
+
+        registry_entry = OpenAPISpecRegistry._specs.get(assistant_id, None)
+        if registry_entry is not None and registry_entry[0] == file_mtime:
+            return registry_entry[1]
+
+        with open(file_path, 'r', encoding="utf-8") as file:
+            compiled_spec = CompiledOpenAPISpec(json.load(file))
+
+        OpenAPISpecRegistry.register(assistant_id, compiled_spec, file_mtime)
+
+        return compiled_spec
+
+    @staticmethod
+    def register(assistant_id, compiled_spec, file_mtime):
+        """Store a compiled spec for the file version it comes from."""
+        with OpenAPISpecRegistry._lock:
+            OpenAPISpecRegistry._specs[assistant_id] = (file_mtime, compiled_spec)
+
+    @staticmethod
+    def invalidate(assistant_id):
+        """Drop the compiled spec of an assistant."""
+        with OpenAPISpecRegistry._lock:
+            OpenAPISpecRegistry._specs.pop(assistant_id, None)
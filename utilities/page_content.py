@@ -1,5 +1,15 @@
 """All user facing text should be modeled in this file."""
 
+# ALL PAGES
+HEALTH_STATUS_OK = "Azure OpenAI and model deployment reachable. Last check {latency_ms} ms"
+HEALTH_STATUS_KO = "Azure OpenAI or model deployment not reachable"
+
+def get_health_status_text(endpoint_health):
+    """Get the endpoint status line shown in the sidebar."""
+    if endpoint_health['ok']:
+        return HEALTH_STATUS_OK.format(latency_ms=round(endpoint_health['latency'] * 1000))
+    return HEALTH_STATUS_KO
+
 # MAIN PAGE
 MAIN_TITLE_TEXT = "Azure OpenAI Assistants"
 MAIN_ASSISTANT_CHAT_WELCOME = "How can I help you?"
@@ -10,6 +20,14 @@ MAIN_FILE_UPLOAD_OK = "File uploaded to OpenAI successfully!"
 MAIN_ASSISTANT_CONV_STARTERS = "Suggested conversation starters:"
 MAIN_NO_ASSISTANT_TEXT = "No Assistants created. Create your first Assistant"
 MAIN_NO_AZ_OPEN_AI_CONNECTION = "No Connection to Azure OpenAI. Configure Azure Service settings"
+MAIN_RUN_FAILED = "The assistant could not answer. Run {status}"
+MAIN_RUN_FAILED_ERROR = "The assistant could not answer. Run {status}: {error_message}"
+
+def get_run_failed_text(run_error):
+    """Get the message shown instead of an answer when a run did not complete."""
+    if run_error.last_error is not None:
+        return MAIN_RUN_FAILED_ERROR.format(status=run_error.status, error_message=run_error.last_error.message)
+    return MAIN_RUN_FAILED.format(status=run_error.status)
 
 # ASSISTANT MANAGEMENT PAGE
 MANAGE_TITLE_TEXT = "Manage your Azure OpenAI Assistants"
@@ -23,6 +41,7 @@ MANAGE_ASSISTANT_ACTION_BODY = "Action definition"
 MANAGE_SELECTED_ASSISTANT_CAPABILITIES = "Capabilities"
 MANAGE_SELECTED_ASSISTANT_CAPABILITIES_CODE_INTERPRETER = "Code Interpreter"
 MANAGE_SELECTED_ASSISTANT_FILES = "Files"
+MANAGE_SELECTED_ASSISTANT_SHOW_FILES = "Show files"
 MANAGE_SELECTED_ASSISTANT_FUNCTIONS = "Existing Functions"
 MANAGE_SELECTED_ASSISTANT_ID = "Assistant Id"
 MANAGE_SELECTED_ASSISTANT_INSTRUCTIONS = "Assistant Instructions"
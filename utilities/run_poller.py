@@ -0,0 +1,109 @@
+"""Polling of Assistant thread runs."""
+import random
+import time
+from collections import deque
+
+from utilities.observability_helper import ObservabilityHelper
+
+class RunFailedError(Exception):
+    """A run that did not complete, because it failed, expired, was cancelled or was given up on."""
+
+    def __init__(self, run_id, status, last_error=None):
+        """Keep the status and last error of the run. Its error has a code and a message."""
+        self.run_id = run_id
+        self.status = status
+        self.last_error = last_error
+        error_text = f": {self.last_error.code} {self.last_error.message}" if self.last_error is not None else ""
+        super().__init__(f"Run {self.run_id} ended with status {self.status}{error_text}")
+
+
+class RunPoller:
+    """Poll a run until it reaches a terminal state, with exponential backoff and jitter.
+
+    Usable outside the app, e.g. from scripts:
+        poller = RunPoller()
+        run = poller.poll(lambda: llm_helper.get_assistant_thread_run(thread_id, run_id))
+    """
+
+    TERMINAL_STATUSES = ["completed", "failed", "cancelled", "expired"]
+    HISTORY_SIZE = 100
+
+    def __init__(self, initial_interval=0.05, max_interval=2.0, backoff_factor=2.0, jitter=0.2, deadline=300, verbose=False):
+        """Initialize the poller. Intervals and deadline are in seconds."""
+        self.initial_interval = initial_interval
+        self.max_interval     = max_interval
+        self.backoff_factor   = backoff_factor
+        self.jitter           = jitter
+        self.deadline         = deadline
+        self.verbose          = verbose
+
+        self.observability_helper = ObservabilityHelper()
+        self.history = deque(maxlen=RunPoller.HISTORY_SIZE)
+
+    @staticmethod
+    def is_terminal(run):
+        """Check if a run will not change status anymore."""
+        return run.status in RunPoller.TERMINAL_STATUSES
+
+    def _sleep_time(self, interval, remaining_time):
+        """Get the jittered interval, never beyond the deadline."""
+        jittered_interval = interval * (1 + random.uniform(-self.jitter, self.jitter))
+        return max(0, min(jittered_interval, remaining_time))
+
+    def poll(self, retrieve_run, on_requires_action=None, run=None):
+        """Poll until the run ends or the deadline expires. Return the last run retrieved.
+
+        retrieve_run is called without arguments and returns the current run.
+        on_requires_action is called with the run once per required action.
+        """
+        start_time = time.monotonic()
+        poll_count = 0
+        interval = self.initial_interval
+        handled_actions = set()
+
+        if run is None:
+            run = retrieve_run()
+            poll_count += 1
+
+        while not self.is_terminal(run):
+            # One record per poll. Sampled
+            self.observability_helper.log("RUN POLLER - Run status is %s", self.verbose, run.status, sample_rate=0.1)
+
+            if run.status == "requires_action" and on_requires_action is not None:
+                # Status only changes once the outputs are processed. Never submit twice
+                action_key = tuple(tool_call.id for tool_call in run.required_action.submit_tool_outputs.tool_calls)
+                if action_key not in handled_actions:
+                    handled_actions.add(action_key)
+                    on_requires_action(run)
+                    # The run resumes right after the outputs. Poll fast again
+                    interval = self.initial_interval
+
+            remaining_time = self.deadline - (time.monotonic() - start_time)
+            if remaining_time <= 0:
+                self.observability_helper.log(f"RUN POLLER - Run {run.id} deadline of {self.deadline}s expired with status {run.status}", True)
+                break
+
+            time.sleep(self._sleep_time(interval, remaining_time))
+            interval = min(self.max_interval, interval * self.backoff_factor)
+
+            run = retrieve_run()
+            poll_count += 1
+
+        wall_time = time.monotonic() - start_time
+        self.history.append({
+            'run_id': run.id,
+            'status': run.status,
+            'polls': poll_count,
+            'wall_time': wall_time,
+            'timed_out': not self.is_terminal(run)
+        })
+        self.observability_helper.log(f"RUN POLLER - Run {run.id} ended with status {run.status} after {poll_count} polls in {wall_time:.3f}s", self.verbose)
+
+        return run
+
+    def get_last_stats(self):
+        """Get polls and wall time of the last run polled."""
+        if len(self.history) == 0:
+            return None
+
+        return self.history[-1]
@@ -0,0 +1,121 @@
+"""Latency breakdown of Assistant thread runs."""
+import threading
+from collections import deque
+
+from utilities.metrics_helper import MetricsHelper
+from utilities.observability_helper import ObservabilityHelper
+
+class RunProfiler:
+    """Split the time of a run turn into queueing, model generation, tool execution and polling overhead.
+
+    Queueing and model generation come from the run and run step timestamps of the service,
+    tool execution and total time are measured on our side. Polling overhead is what remains:
+    the time the service waited for us beyond our tool calls, plus the time between the end of
+    the run and us noticing it. In streaming mode it is the overhead of handling the stream.
+    Service timestamps are in whole seconds, so components are approximate for short runs.
+    """
+
+    COMPONENTS = ["queueing", "model_generation", "tool_execution", "polling_overhead"]
+    HISTORY_SIZE = 100
+
+    def __init__(self, llm_helper, verbose=False):
+        """Initialize the profiler. Run steps are read with the LLM helper."""
+        self.llm_helper = llm_helper
+        self.verbose    = verbose
+
+        self.observability_helper = ObservabilityHelper()
+        self.history = deque(maxlen=RunProfiler.HISTORY_SIZE)
+        self.history_lock = threading.Lock()
+
+    @staticmethod
+    def _end_time(run_object):
+        """Get the time a run or run step ended. None if it did not end."""
+        for end_time in [run_object.completed_at, run_object.failed_at, run_object.cancelled_at]:
+            if end_time is not None:
+                return end_time
+
+        return None
+
+    @staticmethod
+    def get_breakdown(run, run_steps, wall_time, tool_time):
+        """Get the breakdown of a run in seconds. The components add up to the wall time."""
+        run_end_time = RunProfiler._end_time(run)
+        if run_end_time is None:
+            # Timed out on our side. Only our measures are meaningful
+            server_time = wall_time - tool_time
+        else:
+            server_time = run_end_time - run.created_at
+
+        queueing = 0
+        if run.started_at is not None:
+            queueing = run.started_at - run.created_at
+
+        # The service is idle waiting for tool outputs while a tool calls step is open
+        tool_wait = 0
+        for run_step in run_steps:
+            run_step_end_time = RunProfiler._end_time(run_step)
+            if run_step.type == "tool_calls" and run_step_end_time is not None:
+                tool_wait += run_step_end_time - run_step.created_at
+
+        model_generation = max(0, server_time - queueing - tool_wait)
+        polling_overhead = max(0, wall_time - queueing - model_generation - tool_time)
+
+        return {
+            'run_id': run.id,
+            'status': run.status,
+            'steps': len(run_steps),
+            'wall_time': wall_time,
+            'server_time': server_time,
+            'queueing': queueing,
+            'model_generation': model_generation,
+            'tool_execution': tool_time,
+            'polling_overhead': polling_overhead
+        }
+
+    def profile(self, thread_id, run, wall_time, tool_time, session_id=None, assistant_id=None):
+        """Break down a finished run, log it with its session and add it to the metrics. Return the breakdown, None if steps are not available."""
+        try:
+            run_steps = self.llm_helper.get_assistant_thread_run_steps(thread_id, run.id)
+        except Exception as e:
+            self.observability_helper.log(f"RUN PROFILER - Steps of run {run.id} not available: {e}", self.verbose)
+            return None
+
+        breakdown = RunProfiler.get_breakdown(run, run_steps, wall_time, tool_time)
+        with self.history_lock:
+            self.history.append(breakdown)
+
+        for component in RunProfiler.COMPONENTS:
+            MetricsHelper.observe(f"run.{component}", breakdown[component], assistant_id=assistant_id)
+
+        self.observability_helper.log(lambda: f"RUN PROFILER - Run {run.id} took {wall_time:.3f}s: " +
+                                      ", ".join(f"{component} {breakdown[component]:.3f}s" for component in RunProfiler.COMPONENTS),
+                                      self.verbose, session=session_id, **{component: breakdown[component] for component in RunProfiler.COMPONENTS})
+
+        return breakdown
+
+    def profile_in_background(self, thread_id, run, wall_time, tool_time, session_id=None, assistant_id=None):
+        """Profile a run without delaying the turn."""
+        threading.Thread(target=self.profile, args=(thread_id, run, wall_time, tool_time, session_id, assistant_id),
+                         daemon=True, name="run_profiler").start()
+
+    def get_last_breakdown(self):
+        """Get the breakdown of the last run profiled."""
+        with self.history_lock:
+            if len(self.history) == 0:
+                return None
+
+            return self.history[-1]
+
+    def get_summary(self):
+        """Get the average of each component over the runs profiled."""
+        with self.history_lock:
+            breakdowns = list(self.history)
+
+        if len(breakdowns) == 0:
+            return None
+
+        summary = {'runs': len(breakdowns)}
+        for component in ["wall_time"] + RunProfiler.COMPONENTS:
+            summary[component] = sum(breakdown[component] for breakdown in breakdowns) / len(breakdowns)
+
+        return summary
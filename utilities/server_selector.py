@@ -0,0 +1,144 @@
+"""Latency-aware selection of OpenAPI servers."""
+import threading
+import time
+from collections import deque
+
+from utilities.metrics_helper import MetricsHelper
+
+class ServerHealth:
+    """Latency and error tracking of a server, with a circuit breaker."""
+
+    STATE_CLOSED    = "closed"
+    STATE_OPEN      = "open"
+    STATE_HALF_OPEN = "half_open"
+
+    def __init__(self, url, latency_window):
+        """Initialize a server without samples."""
+        self.url = url
+        self.ewma_latency = None
+        self.ewma_error_rate = 0.0
+        self.consecutive_failures = 0
+        self.state = ServerHealth.STATE_CLOSED
+        self.opened_at = None
+        self.probe_started_at = None
+        self.latencies = deque(maxlen=latency_window)
+
+    def get_score(self, error_penalty):
+        """Expected cost of calling the server. Servers without samples go first to learn their latency."""
+        if self.ewma_latency is None:
+            return 0.0
+
+        return self.ewma_latency * (1 + error_penalty * self.ewma_error_rate)
+
+    def get_latency_percentile(self, percentile):
+        """Get a percentile of recent successful latencies."""
+        sorted_latencies = sorted(self.latencies)
+        index = min(len(sorted_latencies) - 1, int(len(sorted_latencies) * percentile / 100))
+        return sorted_latencies[index]
+
+
+class ServerSelector:
+    """Order servers by EWMA latency and error rate. Skip servers with an open circuit."""
+
+    EWMA_ALPHA = 0.3
+    ERROR_PENALTY = 10
+    FAILURE_THRESHOLD = 3
+    OPEN_INTERVAL = 30
+    LATENCY_WINDOW = 100
+    HEDGE_PERCENTILE = 95
+    HEDGE_MIN_SAMPLES = 20
+
+    _servers = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _get_server(url):
+        server = ServerSelector._servers.get(url, None)
+        if server is None:
+            server = ServerHealth(url, ServerSelector.LATENCY_WINDOW)
+            ServerSelector._servers[url] = server
+
+        return server
+
+    @staticmethod
+    def order(server_urls):
+        """Get the servers to try, best first. Servers with an open circuit only when no other server is available."""
+        now = time.monotonic()
+        available_servers = []
+        open_servers = []
+        with ServerSelector._lock:
+            for server_url in server_urls:
+                server = ServerSelector._get_server(server_url)
+                if server.state == ServerHealth.STATE_OPEN and now - server.opened_at >= ServerSelector.OPEN_INTERVAL:
+                    server.state = ServerHealth.STATE_HALF_OPEN
+
+                probe_expired = server.probe_started_at is None or now - server.probe_started_at >= ServerSelector.OPEN_INTERVAL
+                if server.state == ServerHealth.STATE_HALF_OPEN and probe_expired:
+                    # A single request probes whether the server is back. Probes not sent expire
+                    server.probe_started_at = now
+                    available_servers.append(server)
+                elif server.state == ServerHealth.STATE_CLOSED:
+                    available_servers.append(server)
+                else:
+                    open_servers.append(server)
+
+            available_servers.sort(key=lambda server: server.get_score(ServerSelector.ERROR_PENALTY))
+            open_servers.sort(key=lambda server: server.opened_at)
+
+        # Open circuits are only tried when there is nothing else. Their failures would cost a full timeout each
+        if len(available_servers) > 0:
+            return [server.url for server in available_servers]
+
+        return [server.url for server in open_servers]
+
+    @staticmethod
+    def record_success(server_url, latency):
+        """Record a successful call. Closes the circuit."""
+        with ServerSelector._lock:
+            server = ServerSelector._get_server(server_url)
+            alpha = ServerSelector.EWMA_ALPHA
+            server.ewma_latency = latency if server.ewma_latency is None else alpha * latency + (1 - alpha) * server.ewma_latency
+            server.ewma_error_rate = (1 - alpha) * server.ewma_error_rate
+            server.latencies.append(latency)
+            server.consecutive_failures = 0
+            server.state = ServerHealth.STATE_CLOSED
+            server.probe_started_at = None
+
+    @staticmethod
+    def record_failure(server_url, latency):
+        """Record a failed call. Opens the circuit on repeated failures or a failed probe."""
+        with ServerSelector._lock:
+            server = ServerSelector._get_server(server_url)
+            alpha = ServerSelector.EWMA_ALPHA
+            server.ewma_latency = latency if server.ewma_latency is None else alpha * latency + (1 - alpha) * server.ewma_latency
+            server.ewma_error_rate = alpha + (1 - alpha) * server.ewma_error_rate
+            server.consecutive_failures += 1
+            if server.state == ServerHealth.STATE_HALF_OPEN or server.consecutive_failures >= ServerSelector.FAILURE_THRESHOLD:
+                server.state = ServerHealth.STATE_OPEN
+                server.opened_at = time.monotonic()
+            server.probe_started_at = None
+
+    @staticmethod
+    def get_hedge_delay(server_url):
+        """Get how long to wait for a server before hedging to another one. None without enough samples."""
+        with ServerSelector._lock:
+            server = ServerSelector._get_server(server_url)
+            if len(server.latencies) < ServerSelector.HEDGE_MIN_SAMPLES:
+                return None
+
+            return server.get_latency_percentile(ServerSelector.HEDGE_PERCENTILE)
+
+    @staticmethod
+    def get_stats():
+        """Get health data per server."""
+        with ServerSelector._lock:
+            return {server.url: {
+                        'state': server.state,
+                        'circuit_open': 1 if server.state == ServerHealth.STATE_OPEN else 0,
+                        'ewma_latency': server.ewma_latency,
+                        'ewma_error_rate': server.ewma_error_rate,
+                        'consecutive_failures': server.consecutive_failures
+                    } for server in ServerSelector._servers.values()}
+
+
+MetricsHelper.register_stats("openapi_server", ServerSelector.get_stats, label="server")
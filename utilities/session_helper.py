@@ -0,0 +1,35 @@
+"""Streamlit session initialization shared by all pages."""
+import uuid
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import streamlit as st
+
+from manager import Manager
+from utilities.observability_helper import ObservabilityHelper
+
+class SessionHelper:
+    """Create the manager and logger of a browser session on whichever page it starts."""
+
+    USER_QUERY_PARAMETER = "user"
+
+    @staticmethod
+    def get_user_key():
+        """Get the user key. Kept in the URL, so refreshes and new tabs with it resume the threads of the user."""
+        if SessionHelper.USER_QUERY_PARAMETER not in st.query_params:
+            st.query_params[SessionHelper.USER_QUERY_PARAMETER] = uuid.uuid4().hex
+
+        return st.query_params[SessionHelper.USER_QUERY_PARAMETER]
+
+    @staticmethod
+    def init_session(log_prefix, verbose):
+        """Initialize the session state once per session."""
+        if 'session_id' in st.session_state:
+            return
+
+        ctx = get_script_run_ctx()
+        st.session_state['session_id'] = ctx.session_id
+        st.session_state['user_key'] = SessionHelper.get_user_key()
+        st.session_state['manager'] = Manager(st.session_state['session_id'], st.session_state['user_key'])
+
+        st.session_state['logger'] = ObservabilityHelper()
+        st.session_state['logger'].log(f"{log_prefix} - New session {st.session_state['session_id']}", verbose=verbose)
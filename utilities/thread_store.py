@@ -0,0 +1,151 @@
+"""Durable mapping of users to their threads."""
+import os
+import sqlite3
+import threading
+import time
+
+class ThreadStore:
+    """Thread of each user and assistant, with its uploaded files and message history. Persisted in SQLite.
+
+    Lets a refreshed page, a new tab or a restarted app resume its threads without API calls.
+    WAL journaling keeps reads from waiting on writes. Threads unused for the retention time,
+    then the least recently used beyond the maximum, are dropped.
+    """
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS threads (
+               user_key     TEXT NOT NULL,
+               assistant_id TEXT NOT NULL,
+               thread_id    TEXT NOT NULL,
+               updated_at   REAL NOT NULL,
+               PRIMARY KEY (user_key, assistant_id))""",
+        "CREATE INDEX IF NOT EXISTS threads_updated_at ON threads (updated_at)",
+        "CREATE INDEX IF NOT EXISTS threads_thread_id ON threads (thread_id)",
+        """CREATE TABLE IF NOT EXISTS thread_files (
+               thread_id     TEXT NOT NULL,
+               local_file_id TEXT NOT NULL,
+               file_id       TEXT NOT NULL,
+               PRIMARY KEY (thread_id, local_file_id))""",
+        """CREATE TABLE IF NOT EXISTS messages (
+               thread_id     TEXT NOT NULL,
+               message_id    TEXT NOT NULL,
+               position      INTEGER NOT NULL,
+               message_value TEXT NOT NULL,
+               message_role  TEXT NOT NULL,
+               PRIMARY KEY (thread_id, message_id))""",
+        "CREATE INDEX IF NOT EXISTS messages_position ON messages (thread_id, position)"
+    ]
+    PRUNE_INTERVAL = 3600
+
+    # Database path -> store. Shared by all sessions in the process
+    _shared_stores = {}
+    _shared_stores_lock = threading.Lock()
+
+    def __init__(self, db_path, retention_days=30, max_threads=10000):
+        """Open the database, creating it if needed, and drop expired threads."""
+        self.db_path = db_path
+        self.retention_time = retention_days * 24 * 3600
+        self.max_threads = max_threads
+        self.lock = threading.Lock()
+        self.last_prune_time = 0
+
+        # Used from the threads of all sessions, one statement at a time under the lock
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA busy_timeout=5000")
+        with self.lock:
+            for statement in ThreadStore.SCHEMA:
+                self.connection.execute(statement)
+
+        self.prune()
+
+    @staticmethod
+    def get_shared(env_helper):
+        """Get the store of the configured database, opened once per process. None if disabled."""
+        if env_helper.THREAD_STORE_FILE == '':
+            return None
+
+        db_path = os.path.abspath(env_helper.THREAD_STORE_FILE)
+        with ThreadStore._shared_stores_lock:
+            if db_path not in ThreadStore._shared_stores:
+                ThreadStore._shared_stores[db_path] = ThreadStore(db_path, env_helper.THREAD_STORE_RETENTION_DAYS, env_helper.THREAD_STORE_MAX_THREADS)
+            return ThreadStore._shared_stores[db_path]
+
+    def get_thread(self, user_key, assistant_id):
+        """Get the thread id and the (local file id, file id) uploaded to it. None if there is none."""
+        with self.lock:
+            row = self.connection.execute("SELECT thread_id FROM threads WHERE user_key = ? AND assistant_id = ?",
+                                          (user_key, assistant_id)).fetchone()
+            if row is None:
+                return None
+            thread_id = row[0]
+            files = self.connection.execute("SELECT local_file_id, file_id FROM thread_files WHERE thread_id = ?", (thread_id,)).fetchall()
+            self.connection.execute("UPDATE threads SET updated_at = ? WHERE user_key = ? AND assistant_id = ?",
+                                    (time.time(), user_key, assistant_id))
+
+        return {'thread_id': thread_id, 'files': {tuple(file_row) for file_row in files}}
+
+    def set_thread(self, user_key, assistant_id, thread_id):
+        """Record the thread of a user with an assistant. Replaces any previous one."""
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO threads (user_key, assistant_id, thread_id, updated_at) VALUES (?, ?, ?, ?)",
+                                    (user_key, assistant_id, thread_id, time.time()))
+        self._prune_periodically()
+
+    def add_file(self, thread_id, local_file_id, file_id):
+        """Record a file uploaded to a thread."""
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO thread_files (thread_id, local_file_id, file_id) VALUES (?, ?, ?)",
+                                    (thread_id, local_file_id, file_id))
+
+    def get_messages(self, thread_id):
+        """Get the message history of a thread, oldest first, and its last message id. None if none was saved."""
+        with self.lock:
+            rows = self.connection.execute("SELECT message_id, message_value, message_role FROM messages WHERE thread_id = ? ORDER BY position",
+                                           (thread_id,)).fetchall()
+
+        if len(rows) == 0:
+            return None
+
+        messages = [{'message_id': row[0], 'message_value': row[1], 'message_role': row[2]} for row in rows]
+        return {'last_message_id': messages[-1]['message_id'], 'messages': messages}
+
+    def add_messages(self, thread_id, messages):
+        """Append messages, oldest first, to the history of a thread. Messages already saved are skipped."""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                last_position = self.connection.execute("SELECT COALESCE(MAX(position), -1) FROM messages WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+                self.connection.executemany("""INSERT OR IGNORE INTO messages (thread_id, message_id, position, message_value, message_role)
+                                               VALUES (?, ?, ?, ?, ?)""",
+                                            [(thread_id, message['message_id'], last_position + 1 + index, message['message_value'], message['message_role'])
+                                             for index, message in enumerate(messages)])
+                self.connection.execute("COMMIT")
+            except sqlite3.Error:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def _prune_periodically(self):
+        if time.time() - self.last_prune_time > ThreadStore.PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self):
+        """Drop threads past the retention time or beyond the maximum, with their files and messages. Return the number dropped."""
+        with self.lock:
+            self.last_prune_time = time.time()
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                pruned_count = self.connection.execute("DELETE FROM threads WHERE updated_at < ?", (time.time() - self.retention_time,)).rowcount
+                pruned_count += self.connection.execute("""DELETE FROM threads WHERE rowid IN (
+                                                               SELECT rowid FROM threads ORDER BY updated_at DESC LIMIT -1 OFFSET ?)""",
+                                                        (self.max_threads,)).rowcount
+                # Files and messages of the threads dropped
+                self.connection.execute("DELETE FROM thread_files WHERE thread_id NOT IN (SELECT thread_id FROM threads)")
+                self.connection.execute("DELETE FROM messages WHERE thread_id NOT IN (SELECT thread_id FROM threads)")
+                self.connection.execute("COMMIT")
+            except sqlite3.Error:
+                self.connection.execute("ROLLBACK")
+                raise
+
+        return pruned_count
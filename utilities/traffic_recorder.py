@@ -0,0 +1,265 @@
+"""Record and replay of Azure OpenAI HTTP traffic."""
+import base64
+import gzip
+import json
+import re
+import threading
+import time
+from collections import deque
+
+import httpx
+
+from utilities.observability_helper import ObservabilityHelper
+
+class Cassette:
+    """Recorded interactions, one JSON line each. Gzipped when the file name ends with .gz."""
+
+    REDACTED = "REDACTED"
+    SECRET_KEYS = ["api_key", "api-key", "apikey", "key", "password", "secret", "token", "authorization"]
+    RECORDED_RESPONSE_HEADERS = ["content-type", "content-encoding"]
+
+    @staticmethod
+    def open(file_path, mode):
+        """Open a cassette file for text reading or appending."""
+        if file_path.endswith(".gz"):
+            return gzip.open(file_path, mode + "t", encoding="utf-8")
+
+        return open(file_path, mode, encoding="utf-8")
+
+    @staticmethod
+    def redact(value):
+        """Replace secret fields of a JSON value."""
+        if isinstance(value, dict):
+            return {key: Cassette.REDACTED if key.lower() in Cassette.SECRET_KEYS else Cassette.redact(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [Cassette.redact(item) for item in value]
+
+        return value
+
+    @staticmethod
+    def get_path(url):
+        """Path used to match requests. Endpoints with or without a trailing slash give the same path."""
+        return re.sub("/+", "/", url.path)
+
+    @staticmethod
+    def get_query(url):
+        """Query parameters used to match requests. The API version is not part of the match."""
+        return sorted((key, Cassette.REDACTED if key.lower() in Cassette.SECRET_KEYS else value)
+                      for key, value in url.params.multi_items() if key != "api-version")
+
+    @staticmethod
+    def get_match_key(method, path, query):
+        return (method, path, json.dumps(query))
+
+    @staticmethod
+    def encode_chunk(chunk):
+        """Text when possible, base64 otherwise."""
+        try:
+            return {'text': chunk.decode("utf-8")}
+        except UnicodeDecodeError:
+            return {'base64': base64.b64encode(chunk).decode("ascii")}
+
+    @staticmethod
+    def decode_chunk(encoded_chunk):
+        if 'text' in encoded_chunk:
+            return encoded_chunk['text'].encode("utf-8")
+
+        return base64.b64decode(encoded_chunk['base64'])
+
+
+class RecordingStream(httpx.SyncByteStream):
+    """Pass response chunks through, keeping them with their time offsets. Saved on close."""
+
+    def __init__(self, inner_stream, on_close, start_time):
+        self.inner_stream = inner_stream
+        self.on_close = on_close
+        self.start_time = start_time
+        self.chunks = []
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.inner_stream:
+            self.chunks.append((time.monotonic() - self.start_time, chunk))
+            yield chunk
+
+    def close(self):
+        self.inner_stream.close()
+        if not self.closed:
+            self.closed = True
+            self.on_close(self.chunks)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Forward requests to a transport and append each interaction to a cassette.
+
+    Only method, path, query and JSON bodies of requests are kept, with secrets redacted.
+    Headers, hosts and uploaded file contents are never written.
+    """
+
+    def __init__(self, cassette_path, transport=None):
+        self.cassette_path = cassette_path
+        self.transport = transport or httpx.HTTPTransport()
+        self.lock = threading.Lock()
+        self.recorded_count = 0
+
+    @staticmethod
+    def _get_request_data(request):
+        content_type = request.headers.get("content-type", "")
+        request_data = {'method': request.method, 'path': Cassette.get_path(request.url), 'query': Cassette.get_query(request.url)}
+        if content_type.startswith("application/json"):
+            request_data['body'] = Cassette.redact(json.loads(request.read() or b"null"))
+        else:
+            # Uploads. Size only
+            request_data['body_size'] = int(request.headers.get("content-length", 0))
+
+        return request_data
+
+    def _save(self, request_data, response, start_time, chunks):
+        interaction = {
+            'request': request_data,
+            'response': {
+                'status': response.status_code,
+                'headers': {name: response.headers[name] for name in Cassette.RECORDED_RESPONSE_HEADERS if name in response.headers},
+                'chunks': [dict(Cassette.encode_chunk(chunk), offset=round(offset, 4)) for offset, chunk in chunks]
+            },
+            'elapsed': round(time.monotonic() - start_time, 4)
+        }
+        with self.lock:
+            with Cassette.open(self.cassette_path, "a") as file:
+                file.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+            self.recorded_count += 1
+
+    def handle_request(self, request):
+        request_data = self._get_request_data(request)
+        start_time = time.monotonic()
+        response = self.transport.handle_request(request)
+        # Time to headers. Later chunks have their own offsets
+        response_time = time.monotonic() - start_time
+
+        def save_interaction(chunks):
+            if len(chunks) == 0:
+                chunks = [(response_time, b"")]
+            self._save(request_data, response, start_time, chunks)
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=RecordingStream(response.stream, save_interaction, start_time),
+            extensions=response.extensions
+        )
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayStream(httpx.SyncByteStream):
+    """Yield recorded chunks at their scaled time offsets."""
+
+    def __init__(self, chunks, timing_scale, start_time):
+        self.chunks = chunks
+        self.timing_scale = timing_scale
+        self.start_time = start_time
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            wait_time = chunk['offset'] * self.timing_scale - (time.monotonic() - self.start_time)
+            if wait_time > 0:
+                time.sleep(wait_time)
+            yield Cassette.decode_chunk(chunk)
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """Serve recorded interactions without network access.
+
+    Requests are matched by method, path and query. Interactions with the same match are served in
+    recorded order, and the last one is repeated when they run out, e.g. for extra run polls.
+    Objects created or updated in the cassette can be read even if the recording never read them,
+    e.g. because the app served them from its cache.
+    A timing scale of 1 keeps the recorded latencies, 0 answers immediately.
+    """
+
+    def __init__(self, cassette_path, timing_scale=1.0):
+        self.timing_scale = timing_scale
+        self.lock = threading.Lock()
+        self.interactions = {}
+        self.last_interactions = {}
+        self.object_interactions = {}
+        self.stats = {'matched': 0, 'repeated': 0, 'derived': 0, 'unmatched': 0}
+
+        with Cassette.open(cassette_path, "r") as file:
+            for line in file:
+                if line.strip() == "":
+                    continue
+                interaction = json.loads(line)
+                request_data = interaction['request']
+                match_key = Cassette.get_match_key(request_data['method'], request_data['path'], [list(item) for item in request_data['query']])
+                self.interactions.setdefault(match_key, deque()).append(interaction)
+                self._index_object(interaction)
+
+    def _index_object(self, interaction):
+        """Keep the last state of an object written with POST, as its GET would return it."""
+        request_data, response_data = interaction['request'], interaction['response']
+        if request_data['method'] != "POST" or response_data['status'] != 200 or \
+           not response_data['headers'].get("content-type", "").startswith("application/json"):
+            return
+
+        try:
+            response_body = json.loads(b"".join(Cassette.decode_chunk(chunk) for chunk in response_data['chunks']))
+        except ValueError:
+            return
+        if not isinstance(response_body, dict) or not isinstance(response_body.get('id', None), str):
+            return
+
+        # Create on the collection, update on the object itself
+        object_path = request_data['path'] if request_data['path'].endswith("/" + response_body['id']) else request_data['path'] + "/" + response_body['id']
+        self.object_interactions[Cassette.get_match_key("GET", object_path, [])] = {
+            'request': {'method': "GET", 'path': object_path, 'query': []},
+            'response': dict(response_data, chunks=[{'text': json.dumps(response_body), 'offset': response_data['chunks'][0]['offset']}]),
+            'elapsed': interaction['elapsed']
+        }
+
+    def _next_interaction(self, request):
+        match_key = Cassette.get_match_key(request.method, Cassette.get_path(request.url), [list(item) for item in Cassette.get_query(request.url)])
+        with self.lock:
+            pending_interactions = self.interactions.get(match_key, None)
+            if pending_interactions:
+                interaction = pending_interactions.popleft()
+                self.last_interactions[match_key] = interaction
+                self.stats['matched'] += 1
+            elif match_key in self.last_interactions:
+                interaction = self.last_interactions[match_key]
+                self.stats['repeated'] += 1
+            elif match_key in self.object_interactions:
+                interaction = self.object_interactions[match_key]
+                self.stats['derived'] += 1
+            else:
+                interaction = None
+                self.stats['unmatched'] += 1
+
+        return interaction
+
+    def handle_request(self, request):
+        start_time = time.monotonic()
+        interaction = self._next_interaction(request)
+        if interaction is None:
+            ObservabilityHelper.log(f"REPLAY TRANSPORT - No recorded interaction for {request.method} {request.url.path}", True, level="WARNING")
+            return httpx.Response(404, json={'error': {'message': f"No recorded interaction for {request.method} {request.url.path}",
+                                                       'type': "invalid_request_error"}})
+
+        # Wait for the headers as recorded. The body follows its own offsets
+        response_data = interaction['response']
+        first_offset = response_data['chunks'][0]['offset'] if len(response_data['chunks']) > 0 else interaction['elapsed']
+        wait_time = first_offset * self.timing_scale - (time.monotonic() - start_time)
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+        return httpx.Response(
+            status_code=response_data['status'],
+            headers=response_data['headers'],
+            stream=ReplayStream(response_data['chunks'], self.timing_scale, start_time)
+        )
+
+    def get_stats(self):
+        """Get the number of requests matched, served with a repeated or derived interaction, or not matched."""
+        with self.lock:
+            return dict(self.stats)